@@ -1,14 +1,21 @@
-def wait_for_prompt(streamer):
+from rag_client import RAGPipeline
+
+def wait_for_prompt(streamer, rag_factory=None):
+    """質問を受け付け、回答は裏で生成して streamer.add_speech へ文ごとに流す（入力はブロックしない）"""
+    pipeline = RAGPipeline(streamer.add_speech, rag_factory=rag_factory)
     try:
         while True:
             user_input = input("質問があれば入力してください (Enterでスキップ): ")
             if not user_input.strip():
                 break
             print(f"質問: {user_input}")
-            from rag_client import ask_rag
-            answer = ask_rag(user_input)
-            print(f"回答: {answer}")
-            # TODO: streamer に新しいシーンとして追加し、音声合成して再生
+            future = pipeline.ask(user_input)
+            future.add_done_callback(
+                lambda f, q=user_input: print(f"回答: {f.result()}" if not f.exception() else f"回答エラー({q}): {f.exception()}")
+            )
     except KeyboardInterrupt:
         print("\n質問受付終了")
-
+    finally:
+        pipeline.close()  # 回答待ちの質問を終えてから集計する
+        print(f"RAG遅延: {pipeline.latency_report()}")
+    return pipeline
@@ -1,6 +1,169 @@
-from rag_system import RAGSearchSystem
+"""RAG 質問応答 - 常駐インスタンス・回答キャッシュ・文単位で発話キューへ流す非同期パイプライン"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
+from src.zundamon_streaming.audio.scheduler import normalize_text
+from src.zundamon_streaming.utils.metrics import FrameTimeStats
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?\n])")
+
+_rag = None
+_rag_lock = threading.Lock()
+
+
+def _default_factory():
+    from rag_system import RAGSearchSystem
+    return RAGSearchSystem()
+
+
+def get_rag(factory: Optional[Callable] = None):
+    """RAGSearchSystem を一度だけ生成して使い回す"""
+    global _rag
+    if _rag is None:
+        with _rag_lock:
+            if _rag is None:
+                _rag = (factory or _default_factory)()
+    return _rag
+
 
 def ask_rag(question: str) -> str:
-    rag = RAGSearchSystem()
-    return rag.search_and_answer(question)
-                                                                                                  
+    return get_rag().search_and_answer(question)
+
+
+def split_sentences(chunks: Iterable[str]) -> Iterator[str]:
+    """文字列の断片列を受け取り、句点などで区切れた文から順に返す"""
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        parts = _SENTENCE_END.split(pending)
+        pending = parts.pop()
+        for part in parts:
+            if part.strip():
+                yield part.strip()
+    if pending.strip():
+        yield pending.strip()
+
+
+class AnswerCache:
+    """正規化した質問 → 回答の LRU"""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, question: str) -> Optional[str]:
+        key = normalize_text(question)
+        with self._lock:
+            answer = self._entries.get(key)
+            if answer is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return answer
+
+    def put(self, question: str, answer: str):
+        key = normalize_text(question)
+        with self._lock:
+            self._entries[key] = answer
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RAGPipeline:
+    """質問を受け付けて裏で回答し、できた文から speak(文, priority, on_start) へ渡す
+
+    speak は ZundamonAnimator.add_speech / ZundamonLayerAnimator.add_speech 互換。
+    RAG 側に stream_answer(question) があれば断片ごとに、無ければ
+    search_and_answer(question) の結果を文に分けて流す。
+    """
+
+    def __init__(self, speak: Callable, rag_factory: Optional[Callable] = None, cache_size: int = 128,
+                 priority: str = "operator", prewarm: bool = True):
+        self.speak = speak
+        self.rag_factory = rag_factory
+        self.priority = priority
+        self.cache = AnswerCache(cache_size)
+        self.answer_latency = FrameTimeStats()   # 質問 → 最初の文ができるまで（秒）
+        self.first_spoken = FrameTimeStats()     # 質問 → 最初の文の再生開始まで（秒）
+        self.questions = 0
+        self.first_dropped = 0     # 最初の文が発話キューに入らなかった（統合・間引き）質問
+        self.sentences_dropped = 0
+        self._rag = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag")
+        if prewarm:
+            self._executor.submit(self._get_rag)
+
+    def _get_rag(self):
+        if self._rag is None:
+            self._rag = get_rag() if self.rag_factory is None else self.rag_factory()
+        return self._rag
+
+    def ask(self, question: str) -> Future:
+        """非同期に回答する。Future の結果は回答全文（RAG が返したままの文字列）"""
+        return self._executor.submit(self._answer, question, time.monotonic())
+
+    def _chunks(self, question: str) -> Iterable[str]:
+        rag = self._get_rag()
+        if hasattr(rag, "stream_answer"):
+            return rag.stream_answer(question)
+        return [rag.search_and_answer(question)]
+
+    def _answer(self, question: str, asked_at: float) -> str:
+        cached = self.cache.get(question)
+        chunks = [cached] if cached is not None else self._chunks(question)
+        raw = []  # 分割前の断片。改行などの区切りを残したままキャッシュし、命中時も同じ分割を通す
+        first = [True]
+
+        def record(chunks):
+            for chunk in chunks:
+                raw.append(chunk)
+                yield chunk
+
+        def on_start():
+            if first[0]:
+                first[0] = False
+                self.first_spoken.record(time.monotonic() - asked_at)
+
+        self.questions += 1
+        sentences = []
+        for sentence in split_sentences(record(chunks)):
+            if not sentences:
+                self.answer_latency.record(time.monotonic() - asked_at)
+            sentences.append(sentence)
+            if not self.speak(sentence, self.priority, on_start=on_start):
+                # 統合・間引きされた文は on_start が来ない。first_spoken から黙って抜けないよう数える
+                self.sentences_dropped += 1
+                if len(sentences) == 1:
+                    self.first_dropped += 1
+        answer = "".join(raw)
+        if cached is None and answer.strip():
+            self.cache.put(question, answer)
+        return answer
+
+    def latency_report(self) -> dict:
+        """ミリ秒単位の p50/p95/p99、最初の文を言えなかった数、キャッシュ命中数
+
+        first_spoken_ms の count が questions より少なければ、その差は最初の文が
+        再生されなかった質問（first_dropped は発話キューが受け付けなかった分）。
+        """
+        return {
+            "answer_ready_ms": self.answer_latency.summary(),
+            "first_spoken_ms": self.first_spoken.summary(),
+            "questions": self.questions,
+            "first_dropped": self.first_dropped,
+            "sentences_dropped": self.sentences_dropped,
+            "cache": {"hits": self.cache.hits, "misses": self.cache.misses},
+        }
+
+    def close(self, wait: bool = True):
+        """wait=True なら受け付け済みの質問の回答（発話キューへの投入）まで待つ"""
+        self._executor.shutdown(wait=wait)
@@ -12,17 +12,8 @@ const config = {
     port: 8000,
     mediaroot: './media',
     allow_origin: '*'
-  },
-  relay: {
-    ffmpeg: 'ffmpeg',
-    tasks: [
-      {
-        app: 'live',
-        mode: 'push',
-        edge: 'rtmp://localhost:1935/live'
-      }
-    ]
   }
+  // relay は置かない（以前は live を自分自身の rtmp://localhost:1935/live へ push し直していた）
 };
 
 const nms = new NodeMediaServer(config);
@@ -1,7 +1,20 @@
 """ずんだもんライブ配信システム エントリーポイント"""
-from .core.animator import ZundamonAnimator
+import sys
+
+def build_assets(argv):
+    """assets build [layer_dir] [out_path]: レイヤーツリーをアセットパックにコンパイル"""
+    from .image.pack import build_asset_pack
+    layer_dir = argv[0] if argv else "assets/zundamon"
+    out_path = argv[1] if len(argv) > 1 else None
+    path = build_asset_pack(layer_dir, out_path)
+    print(f"アセットパック生成完了: {path}")
 
 def main():
+    if sys.argv[1:3] == ["assets", "build"]:
+        build_assets(sys.argv[3:])
+        return
+    
+    from .core.animator import ZundamonAnimator
     background_video = "D:/Bandicam/CharaStudio 2025-04-01 11-45-21-752.mp4"
     animator = ZundamonAnimator(layer_dir="assets/zundamon", fps=30)
     
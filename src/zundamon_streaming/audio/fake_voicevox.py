@@ -0,0 +1,269 @@
+"""VOICEVOX 互換の偽サーバー - 実エンジンなしで TTS 経路の遅延・負荷試験をする
+
+/audio_query, /synthesis, /speakers を実装し、文字数に比例した長さの
+決定的な WAV（サイン波または無音）とモーラタイミングを返す。
+合成遅延・ゆらぎ・エラー率は指定でき、乱数は seed で固定される。
+
+    python -m src.zundamon_streaming.audio.fake_voicevox --port 50121 --latency 0.3 --error-rate 0.05
+    VOICEVOX_URL=http://127.0.0.1:50121 python -m src.zundamon_streaming
+"""
+import argparse
+import json
+import math
+import random
+import struct
+import threading
+import time
+import unicodedata
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+SAMPLE_RATE = 24000
+CONSONANT_LENGTH = 0.05
+VOICED_VOWEL_LENGTH = 0.10
+PAUSE_LENGTH = 0.3
+PAUSE_CHARS = set("、。，．,.!?！？…　 ")
+_VOWELS = ("A", "I", "U", "E", "O")
+
+SPEAKERS = [
+    {
+        "name": "ずんだもん",
+        "speaker_uuid": "388f246b-8c41-4ac1-8e2d-5d79f3ff56d9",
+        "styles": [{"name": "ノーマル", "id": 3}, {"name": "あまあま", "id": 1},
+                   {"name": "ツンツン", "id": 7}, {"name": "セクシー", "id": 5}],
+        "version": "fake",
+    },
+]
+
+
+def _mora(char: str) -> Dict:
+    """1文字 → 1モーラ（かなは母音を文字名から推定、それ以外は a 扱い）"""
+    try:
+        name = unicodedata.name(char)
+    except ValueError:
+        name = ""
+    syllable = name.rsplit(" ", 1)[-1] if ("HIRAGANA" in name or "KATAKANA" in name) else "A"
+    if syllable == "N":
+        return {"text": char, "consonant": None, "consonant_length": None,
+                "vowel": "N", "vowel_length": VOICED_VOWEL_LENGTH, "pitch": 5.5}
+    vowel = syllable[-1].lower() if syllable[-1] in _VOWELS else "a"
+    consonant = syllable[:-1].lower() or None
+    return {"text": char, "consonant": consonant,
+            "consonant_length": CONSONANT_LENGTH if consonant else None,
+            "vowel": vowel, "vowel_length": VOICED_VOWEL_LENGTH, "pitch": 5.5}
+
+
+def build_audio_query(text: str, speaker: int) -> Dict:
+    """VOICEVOX の AudioQuery 形式（句読点で区切ったアクセント句 + モーラ列）"""
+    phrases: List[Dict] = []
+    moras: List[Dict] = []
+    for char in text:
+        if char in PAUSE_CHARS:
+            if moras:
+                phrases.append({"moras": moras, "accent": 1, "is_interrogative": char in "?？",
+                                "pause_mora": {"text": "、", "consonant": None, "consonant_length": None,
+                                               "vowel": "pau", "vowel_length": PAUSE_LENGTH, "pitch": 0.0}})
+                moras = []
+            continue
+        moras.append(_mora(char))
+    if moras:
+        phrases.append({"moras": moras, "accent": 1, "pause_mora": None, "is_interrogative": False})
+    return {
+        "accent_phrases": phrases,
+        "speedScale": 1.0, "pitchScale": 0.0, "intonationScale": 1.0, "volumeScale": 1.0,
+        "prePhonemeLength": 0.1, "postPhonemeLength": 0.1,
+        "outputSamplingRate": SAMPLE_RATE, "outputStereo": False,
+        "kana": text, "speaker": speaker,
+    }
+
+
+def mora_timings(query: Dict) -> List[Dict]:
+    """AudioQuery からモーラごとの開始・終了秒を計算（口パク検証用）"""
+    speed = query.get("speedScale", 1.0) or 1.0
+    t = query.get("prePhonemeLength", 0.0) / speed
+    timings = []
+    for phrase in query.get("accent_phrases", []):
+        moras = list(phrase["moras"]) + ([phrase["pause_mora"]] if phrase.get("pause_mora") else [])
+        for mora in moras:
+            length = ((mora.get("consonant_length") or 0.0) + mora["vowel_length"]) / speed
+            timings.append({"text": mora["text"], "vowel": mora["vowel"], "start": t, "end": t + length})
+            t += length
+    return timings
+
+
+def query_duration(query: Dict) -> float:
+    timings = mora_timings(query)
+    end = timings[-1]["end"] if timings else query.get("prePhonemeLength", 0.0)
+    return end + query.get("postPhonemeLength", 0.0) / (query.get("speedScale", 1.0) or 1.0)
+
+
+def render_wav(query: Dict, waveform: str = "sine") -> bytes:
+    """モーラ区間は 220Hz サイン波（pau は無音）、16bit モノラル WAV"""
+    rate = int(query.get("outputSamplingRate", SAMPLE_RATE))
+    total = int(query_duration(query) * rate)
+    samples = np.zeros(total, dtype=np.int16)
+    if waveform == "sine":
+        volume = 0.3 * query.get("volumeScale", 1.0)
+        for timing in mora_timings(query):
+            if timing["vowel"] == "pau":
+                continue
+            idx = np.arange(int(timing["start"] * rate), min(total, int(timing["end"] * rate)))
+            samples[idx] = (32767 * volume * np.sin(2 * math.pi * 220 * idx / rate)).astype(np.int16)
+    data = samples.tobytes()
+    header = struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + len(data), b"WAVE", b"fmt ", 16,
+                         1, 1, rate, rate * 2, 2, 16, b"data", len(data))
+    return header + data
+
+
+class FakeVoiceVoxServer:
+    """偽 VOICEVOX エンジン（別スレッドで HTTP を受ける）"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 50121, query_latency: float = 0.0,
+                 synthesis_latency: float = 0.0, realtime_factor: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, waveform: str = "sine", seed: int = 0):
+        """synthesis の遅延 = synthesis_latency + 音声長 * realtime_factor ± jitter"""
+        self.host = host
+        self.port = port
+        self.query_latency = query_latency
+        self.synthesis_latency = synthesis_latency
+        self.realtime_factor = realtime_factor
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.waveform = waveform
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._wav_cache: Dict[str, bytes] = {}
+        self._server = None
+        self.stats = {"audio_query": 0, "synthesis": 0, "speakers": 0, "errors": 0, "in_flight": 0,
+                      "max_in_flight": 0}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def _roll(self) -> tuple:
+        """(エラーにするか, ゆらぎ) を seed 固定の乱数から引く"""
+        with self._lock:
+            return self._random.random() < self.error_rate, self._random.uniform(-self.jitter, self.jitter)
+
+    def _count(self, key: str, delta: int = 1):
+        with self._lock:
+            self.stats[key] += delta
+            if key == "in_flight":
+                self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+    def synthesize(self, query: Dict) -> bytes:
+        key = json.dumps(query, sort_keys=True, ensure_ascii=False)
+        wav = self._wav_cache.get(key)
+        if wav is None:
+            if len(self._wav_cache) >= 256:
+                self._wav_cache.clear()
+            wav = self._wav_cache[key] = render_wav(query, self.waveform)
+        return wav
+
+    def start(self) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive（クライアント側の接続プールを試せる）
+
+            def _send(self, status: int, payload: bytes, ctype: str):
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_json(self, status: int, obj):
+                self._send(status, json.dumps(obj, ensure_ascii=False).encode("utf-8"), "application/json")
+
+            def do_GET(self):
+                if urlparse(self.path).path == "/speakers":
+                    fake._count("speakers")
+                    self._send_json(200, SPEAKERS)
+                else:
+                    self._send_json(404, {"detail": "Not Found"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if url.path not in ("/audio_query", "/synthesis"):
+                    self._send_json(404, {"detail": "Not Found"})
+                    return
+                fake._count("in_flight")
+                try:
+                    fail, jitter = fake._roll()
+                    if url.path == "/audio_query":
+                        fake._count("audio_query")
+                        time.sleep(max(0.0, fake.query_latency + jitter))
+                        if fail:
+                            fake._count("errors")
+                            self._send_json(500, {"detail": "fake audio_query error"})
+                            return
+                        self._send_json(200, build_audio_query(params.get("text", ""), int(params.get("speaker", 3))))
+                    else:
+                        fake._count("synthesis")
+                        try:
+                            query = json.loads(body or b"{}")
+                        except ValueError:
+                            self._send_json(422, {"detail": "invalid AudioQuery"})
+                            return
+                        delay = fake.synthesis_latency + query_duration(query) * fake.realtime_factor + jitter
+                        time.sleep(max(0.0, delay))
+                        if fail:
+                            fake._count("errors")
+                            self._send_json(500, {"detail": "fake synthesis error"})
+                            return
+                        self._send(200, fake.synthesize(query), "audio/wav")
+                finally:
+                    fake._count("in_flight", -1)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m src.zundamon_streaming.audio.fake_voicevox")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=50121)
+    parser.add_argument("--query-latency", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="合成の固定遅延（秒）")
+    parser.add_argument("--realtime-factor", type=float, default=0.0, help="音声1秒あたりの追加遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--waveform", choices=("sine", "silence"), default="sine")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = FakeVoiceVoxServer(args.host, args.port, args.query_latency, args.latency,
+                                args.realtime_factor, args.jitter, args.error_rate, args.waveform, args.seed)
+    print(f"偽VOICEVOX起動: {server.start()}  (Ctrl+C で停止)")
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(f"統計: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import pyaudio
 import wave
 import io
 import os
+from ..utils.metrics import REGISTRY
 
 class AudioPlayer:
     def __init__(self):
@@ -56,7 +57,8 @@ class AudioPlayer:
                     chunk_count += 1
                     
                     # 音声出力
-                    stream.write(chunk)
+                    with REGISTRY.timer("playback"):
+                        stream.write(chunk)
                     
                     # 振幅計算（口パク判定）
                     if self.mouth_callback:
@@ -0,0 +1,201 @@
+"""発話スケジューラ - 優先度・TTL・重複統合・バックログ上限つきの音声キュー
+
+queue.Queue の代わりに speech_queue として使う（get は queue.Empty を投げる）。
+
+    優先度:   operator > superchat > chat（高い順に取り出し、同順位は到着順）
+    TTL:      期限切れの項目は取り出し時に捨てる（expired）
+    統合:     待機中・直近発話と同一/ほぼ同一の文は捨てて既存項目に数える（coalesced）
+    上限:     推定音声秒数の合計が max_backlog_seconds を超える分は
+              低優先度・古い順に捨てる。入れる余地がなければ新規を拒否（shed）
+"""
+import difflib
+import queue
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+from ..utils.metrics import REGISTRY
+
+PRIORITIES = ("operator", "superchat", "chat")
+DEFAULT_TTL = {"operator": None, "superchat": 300.0, "chat": 60.0}
+
+
+def normalize_text(text: str) -> str:
+    """比較用：NFKC・小文字化・空白/記号除去・同じ文字の3連以上を2つに（ｗｗｗ / 888 対策）"""
+    t = unicodedata.normalize("NFKC", text).lower()
+    t = re.sub(r"[\s\W_]+", "", t)
+    return re.sub(r"(.)\1{2,}", r"\1\1", t)
+
+
+class SpeechItem:
+    __slots__ = ("text", "priority", "enqueued_at", "deadline", "est_seconds", "key", "count", "on_start")
+
+    def __init__(self, text: str, priority: str, enqueued_at: float, deadline: Optional[float],
+                 est_seconds: float, key: str, on_start: Optional[Callable[[], None]] = None):
+        self.text = text
+        self.priority = priority
+        self.enqueued_at = enqueued_at
+        self.deadline = deadline
+        self.est_seconds = est_seconds
+        self.key = key
+        self.count = 1  # 統合された件数
+        self.on_start = on_start  # 再生開始時にワーカーが呼ぶ
+
+
+class SpeechScheduler:
+    def __init__(self, max_backlog_seconds: float = 30.0, ttl: Optional[Dict[str, Optional[float]]] = None,
+                 chars_per_second: float = 7.0, similarity: float = 0.85, recent_seconds: float = 30.0):
+        self.max_backlog_seconds = max_backlog_seconds
+        self.ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self.chars_per_second = chars_per_second
+        self.similarity = similarity
+        self.recent_seconds = recent_seconds
+        self._queues: Dict[str, Deque[SpeechItem]] = {p: deque() for p in PRIORITIES}
+        self._recent: Deque[tuple] = deque(maxlen=64)  # (発話時刻, 正規化キー)
+        self._backlog = 0.0
+        self._unfinished = 0
+        self._cond = threading.Condition()
+        self.counters = {"accepted": 0, "coalesced": 0, "shed": 0, "expired": 0, "dispatched": 0}
+
+    # ---------- 内部 ----------
+    def estimate_seconds(self, text: str) -> float:
+        """文字数から音声長を推定（前後の無音ぶん 0.3 秒を足す）"""
+        return len(text) / self.chars_per_second + 0.3
+
+    def _similar(self, a: str, b: str) -> bool:
+        if a == b:
+            return True
+        if not a or not b or self.similarity >= 1.0:
+            return False
+        return difflib.SequenceMatcher(None, a, b).ratio() >= self.similarity
+
+    def _find_duplicate(self, key: str) -> Optional[SpeechItem]:
+        for items in self._queues.values():
+            for item in items:
+                if self._similar(item.key, key):
+                    return item
+        return None
+
+    def _recently_spoken(self, key: str, now: float) -> bool:
+        return any(now - at <= self.recent_seconds and self._similar(k, key) for at, k in self._recent)
+
+    def _remove(self, priority: str, item: SpeechItem, counter: str):
+        self._queues[priority].remove(item)
+        self._backlog -= item.est_seconds
+        self._unfinished -= 1
+        self.counters[counter] += 1
+
+    def _purge_expired(self, now: float):
+        for priority, items in self._queues.items():
+            for item in [i for i in items if i.deadline is not None and i.deadline <= now]:
+                self._remove(priority, item, "expired")
+
+    def _make_room(self, needed: float, priority: str) -> bool:
+        """needed 秒入るまで、priority 以下の項目を低優先度・古い順に捨てる"""
+        rank = PRIORITIES.index(priority)
+        victims = []
+        freed = self.max_backlog_seconds - self._backlog
+        for p in reversed(PRIORITIES[rank:]):
+            for item in self._queues[p]:
+                if freed >= needed:
+                    break
+                victims.append((p, item))
+                freed += item.est_seconds
+        if freed < needed:
+            return False
+        for p, item in victims:
+            self._remove(p, item, "shed")
+        return True
+
+    def _publish_gauges(self):
+        REGISTRY.set_gauge("speech_backlog_seconds", round(self._backlog, 3))
+        REGISTRY.set_gauge("speech_queue_depth", sum(len(items) for items in self._queues.values()))
+
+    # ---------- 公開API ----------
+    def put(self, text: str, priority: str = "chat", ttl: Optional[float] = None,
+            on_start: Optional[Callable[[], None]] = None) -> bool:
+        """追加。統合・破棄された場合は False"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"未知の優先度: {priority}")
+        now = time.monotonic()
+        key = normalize_text(text)
+        ttl = ttl if ttl is not None else self.ttl.get(priority)
+        est = self.estimate_seconds(text)
+        with self._cond:
+            self._purge_expired(now)
+            duplicate = self._find_duplicate(key)
+            if duplicate is not None or (priority != "operator" and self._recently_spoken(key, now)):
+                if duplicate is not None:
+                    duplicate.count += 1
+                    if PRIORITIES.index(priority) < PRIORITIES.index(duplicate.priority):
+                        # 高い優先度で同じ文が来たら既存項目を繰り上げる
+                        self._queues[duplicate.priority].remove(duplicate)
+                        duplicate.priority = priority
+                        self._queues[priority].append(duplicate)
+                self.counters["coalesced"] += 1
+                return False
+            if priority != "operator" and self._backlog + est > self.max_backlog_seconds:
+                if not self._make_room(est, priority):
+                    self.counters["shed"] += 1
+                    self._publish_gauges()
+                    return False
+            item = SpeechItem(text, priority, now, now + ttl if ttl is not None else None, est, key, on_start)
+            self._queues[priority].append(item)
+            self._backlog += est
+            self._unfinished += 1
+            self.counters["accepted"] += 1
+            self._publish_gauges()
+            self._cond.notify()
+        return True
+
+    def get(self, timeout: Optional[float] = None) -> SpeechItem:
+        """最も優先度の高い項目を取り出す（期限切れは捨てる）。空なら queue.Empty"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._purge_expired(now)
+                for priority in PRIORITIES:
+                    if self._queues[priority]:
+                        item = self._queues[priority].popleft()
+                        self._backlog -= item.est_seconds
+                        self._recent.append((now, item.key))
+                        self.counters["dispatched"] += 1
+                        self._publish_gauges()
+                        return item
+                remaining = deadline - now if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._cond.wait(remaining)
+
+    def task_done(self):
+        with self._cond:
+            self._unfinished = max(0, self._unfinished - 1)
+            self._publish_gauges()
+
+    def qsize(self) -> int:
+        """待機中の件数"""
+        with self._cond:
+            return sum(len(items) for items in self._queues.values())
+
+    def backlog_seconds(self) -> float:
+        with self._cond:
+            return self._backlog
+
+    def clear(self):
+        with self._cond:
+            for priority, items in self._queues.items():
+                self._unfinished -= len(items)
+                items.clear()
+            self._backlog = 0.0
+            self._publish_gauges()
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            result = dict(self.counters)
+            result.update(depth={p: len(items) for p, items in self._queues.items()},
+                          backlog_seconds=self._backlog)
+        return result
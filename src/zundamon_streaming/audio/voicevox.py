@@ -1,10 +1,12 @@
 """VOICEVOX API クライアント"""
 import requests
 from typing import Optional
+from ..utils.config import VOICEVOX_URL
+from ..utils.metrics import REGISTRY
 
 class VoiceVoxClient:
-    def __init__(self, base_url: str = "http://localhost:50021"):
-        self.base_url = base_url
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = base_url or VOICEVOX_URL
     
     def generate_voice(self, text: str, speaker_id: int = 3) -> Optional[bytes]:
         """音声データ生成"""
@@ -12,20 +14,22 @@ class VoiceVoxClient:
             print(f"VOICEVOX音声生成開始: '{text}' (speaker={speaker_id})")
             
             # クエリ生成
-            query_response = requests.post(
-                f"{self.base_url}/audio_query",
-                params={"text": text, "speaker": speaker_id}
-            )
+            with REGISTRY.timer("tts_query"):
+                query_response = requests.post(
+                    f"{self.base_url}/audio_query",
+                    params={"text": text, "speaker": speaker_id}
+                )
             query_response.raise_for_status()
             print(f"クエリ生成成功: {query_response.status_code}")
             
             # 音声合成
-            synthesis_response = requests.post(
-                f"{self.base_url}/synthesis",
-                params={"speaker": speaker_id},
-                json=query_response.json(),
-                headers={"Content-Type": "application/json"}
-            )
+            with REGISTRY.timer("tts_synth"):
+                synthesis_response = requests.post(
+                    f"{self.base_url}/synthesis",
+                    params={"speaker": speaker_id},
+                    json=query_response.json(),
+                    headers={"Content-Type": "application/json"}
+                )
             synthesis_response.raise_for_status()
             
             audio_data = synthesis_response.content
@@ -47,7 +51,7 @@ class VoiceVoxClient:
             return audio_data
             
         except requests.exceptions.ConnectionError:
-            print("VOICEVOXサーバーに接続できません (http://localhost:50021)")
+            print(f"VOICEVOXサーバーに接続できません ({self.base_url})")
             return None
         except requests.exceptions.HTTPError as e:
             print(f"VOICEVOX APIエラー: {e}")
@@ -0,0 +1,78 @@
+"""ベンチマーク実行: python -m src.zundamon_streaming.bench [--quick] [--out results.json]
+
+    --baseline PATH        比較する基準値（既定: bench/baseline.json）
+    --update-baseline      今回の結果を基準値として保存（--repeat 回の中央値）
+    --repeat 5             繰り返し回数（結果は指標ごとの中央値。既定: 基準値更新時 5、それ以外 1）
+    --threshold 0.10       この割合以上悪化したら regression（省略時は指標ごとの許容幅）
+    --only index,tts       一部だけ実行（index / lookup / compose / tts / ingest）
+
+基準値とマシン（CPU 数・OS・Python）か設定（--quick か・試行回数）が違う場合は比較しない。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from .suite import DEFAULT_BASELINE, compare, machine_mismatch, median_results, run_suite, settings_mismatch
+
+def _run_isolated(args) -> dict:
+    """1回分を別プロセスで実行する（前の回の確保済みメモリなどを持ち越さない）"""
+    cmd = [sys.executable, "-m", __spec__.parent, "--layer-dir", args.layer_dir, "--only", args.only,
+           "--baseline", "", "--repeat", "1", *(["--quick"] if args.quick else [])]
+    completed = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.zundamon_streaming.bench")
+    parser.add_argument("--layer-dir", default="assets/zundamon")
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--only", default="")
+    parser.add_argument("--out")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float)
+    parser.add_argument("--repeat", type=int)
+    args = parser.parse_args(argv)
+
+    repeat = args.repeat or (5 if args.update_baseline else 1)
+    only = [s for s in args.only.split(",") if s] or None
+    if repeat > 1:
+        # 同じプロセスで繰り返すと2回目以降は大きなフレームの確保が速くなり、1回だけの実行と比べられない
+        reports = [_run_isolated(args) for _ in range(repeat)]
+        report = reports[-1]
+        report["results"] = median_results(reports)
+        report["runs"] = repeat
+    else:
+        report = run_suite(args.layer_dir, args.quick, only)
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        mismatch = (machine_mismatch(report["machine"], baseline.get("machine"))
+                    or settings_mismatch(report["settings"], baseline.get("settings")))
+        if mismatch:
+            report["comparison_skipped"] = f"基準値とマシンか設定が違う: {mismatch}"
+            print(f"[WARN] 比較しない: {mismatch}（--update-baseline で取り直す）", file=sys.stderr)
+        else:
+            report["comparison"] = compare(report["results"], baseline["results"], args.threshold)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({k: report[k] for k in ("created_at", "machine", "settings", "runs", "results") if k in report}, f,
+                      ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"基準値を更新: {args.baseline}", file=sys.stderr)
+
+    regressions = [k for k, v in report.get("comparison", {}).items() if v["regression"]]
+    if regressions:
+        print(f"[WARN] 性能劣化: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
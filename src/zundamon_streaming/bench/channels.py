@@ -0,0 +1,151 @@
+"""チャンネル追加の限界コスト - ChannelManager の N チャンネル目と単独プロセスを比べる
+
+単独: 別プロセスで ZundamonAnimator を1つパイプ配信し、起動前後の RSS 増分・スレッド数・
+      プロセス CPU 使用率（ffmpeg は別に計る）を測る。
+複数: 1プロセスの ChannelManager にチャンネルを1つずつ足し、各段階で同じ値を測る。
+      2チャンネル目以降の1チャンネルあたりの増分を「限界コスト」として単独と比べる。
+
+どちらもローカル受け口（port=0）へ送り、まばたきを止めずに表情を時々変える。
+
+    python -m src.zundamon_streaming.bench.channels --channels 4 --seconds 5
+"""
+import argparse
+import contextlib
+import io
+import json
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from ..utils.metrics import CPUMeter, rss_bytes
+from .suite import EXPRESSIONS
+
+
+def _measure(encoder_pids, seconds: float, animators) -> Dict:
+    """seconds 秒のプロセス CPU・ffmpeg CPU。途中で表情を切り替える"""
+    process = CPUMeter()
+    encoders = [CPUMeter(pid) for pid in encoder_pids]
+    steps = max(1, int(seconds))
+    for i in range(steps):
+        mouth, eyes = EXPRESSIONS[i % len(EXPRESSIONS)]
+        for animator in animators:
+            animator.change_expression(mouth, eyes)
+        time.sleep(seconds / steps)
+    return {"process_cpu_percent": process.percent(),
+            "encoder_cpu_percent": sum(meter.percent() or 0.0 for meter in encoders),
+            "rss_bytes": rss_bytes(), "threads": threading.active_count()}
+
+
+def _encoder_pid(animator) -> Optional[int]:
+    process = getattr(animator.ffmpeg_streamer, "process", None)
+    return process.pid if process is not None else None
+
+
+def run_standalone(layer_dir: str, fps: int, seconds: float, frame_format: str) -> Dict:
+    """単独のアニメーター1つ（このプロセスで。run_bench からは別プロセスで呼ぶ）"""
+    from ..core.animator import ZundamonAnimator
+    from ..rtmp.ingest import LocalRTMPServer
+    from .chat_flood import SimulatedAudioPlayer
+
+    before = {"rss_bytes": rss_bytes(), "threads": threading.active_count()}
+    animator = ZundamonAnimator(layer_dir, fps, audio_player=SimulatedAudioPlayer(),
+                                rtmp_server=LocalRTMPServer(port=0))
+    try:
+        if not animator.start_pipe_stream(frame_format=frame_format):
+            return {"error": "配信開始失敗"}
+        time.sleep(1.0)
+        after = _measure([_encoder_pid(animator)], seconds, [animator])
+    finally:
+        animator.stop_stream()
+    return {"rss_bytes": after["rss_bytes"] - before["rss_bytes"], "threads": after["threads"] - before["threads"],
+            "process_cpu_percent": after["process_cpu_percent"],
+            "encoder_cpu_percent": after["encoder_cpu_percent"]}
+
+
+def run_channels(layer_dir: str, fps: int, channels: int, seconds: float, frame_format: str,
+                 workers: int = None) -> Dict:
+    from ..core.channels import ChannelManager
+    from ..rtmp.ingest import LocalRTMPServer
+    from .chat_flood import SimulatedAudioPlayer
+
+    before = {"rss_bytes": rss_bytes(), "threads": threading.active_count()}
+    manager = ChannelManager(layer_dir, fps, workers=workers, rtmp_server=LocalRTMPServer(port=0),
+                             audio_player_factory=SimulatedAudioPlayer)
+    steps: List[Dict] = []
+    try:
+        for n in range(1, channels + 1):
+            if manager.add_channel(f"ch{n}", frame_format=frame_format) is None:
+                return {"error": f"ch{n} 開始失敗", "steps": steps}
+            time.sleep(1.0)
+            animators = [entry.animator for entry in manager.channels.values()]
+            sample = _measure([_encoder_pid(a) for a in animators], seconds, animators)
+            sample.update(channels=n, rss_bytes=sample["rss_bytes"] - before["rss_bytes"],
+                          threads=sample["threads"] - before["threads"])
+            steps.append(sample)
+        stats = manager.stats()
+    finally:
+        final = manager.stop()
+    result = {"steps": steps, "shared_assets_bytes": stats["shared_assets"]["size_bytes"],
+              "skipped_ticks": sum(s["skipped_ticks"] for s in final.values() if s),
+              "channel_render_cpu_percent": {name: s["render_cpu_percent"] for name, s in stats["channels"].items()}}
+    if len(steps) > 1:
+        first, last = steps[0], steps[-1]
+        added = len(steps) - 1
+        result["marginal"] = {key: (last[key] - first[key]) / added
+                              for key in ("rss_bytes", "threads", "process_cpu_percent", "encoder_cpu_percent")}
+    return result
+
+
+def run_bench(layer_dir: str = "assets/zundamon", fps: int = 30, channels: int = 4, seconds: float = 5.0,
+              frame_format: str = "rgba", workers: int = None) -> Dict:
+    cmd = [sys.executable, "-m", __spec__.name, "--standalone", "--layer-dir", layer_dir, "--fps", str(fps),
+           "--seconds", str(seconds), "--frame-format", frame_format]
+    completed = subprocess.run(cmd, capture_output=True, text=True)
+    try:
+        standalone = json.loads(completed.stdout)
+    except ValueError:
+        standalone = {"error": f"単独計測失敗（終了コード {completed.returncode}）"}
+    report = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "channels": channels,
+              "frame_format": frame_format, "standalone": standalone,
+              "manager": run_channels(layer_dir, fps, channels, seconds, frame_format, workers)}
+    marginal = report["manager"].get("marginal")
+    if marginal and "error" not in standalone:
+        # 単独に対する N チャンネル目の比（1/N を十分下回るのが目標）
+        report["marginal_ratio"] = {key: marginal[key] / standalone[key] if standalone[key] else None
+                                    for key in ("rss_bytes", "threads", "process_cpu_percent")}
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.zundamon_streaming.bench.channels")
+    parser.add_argument("--layer-dir", default="assets/zundamon")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--frame-format", default="rgba")
+    parser.add_argument("--standalone", action="store_true", help="単独アニメーターだけ計測（内部用）")
+    parser.add_argument("--out")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(out):
+        if args.standalone:
+            report = run_standalone(args.layer_dir, args.fps, args.seconds, args.frame_format)
+        else:
+            report = run_bench(args.layer_dir, args.fps, args.channels, args.seconds, args.frame_format,
+                               args.workers)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    failed = "error" in report or "error" in report.get("standalone", {}) or "error" in report.get("manager", {})
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""チャット洪水の負荷試験 - add_speech から再生開始までの遅延とフレーム時間への影響
+
+偽VOICEVOX・実時間で待つだけの音声プレイヤー・何もしない出力先を注入した
+アニメーターに、ポアソン到着やバーストでコメントを投げ続ける。
+
+    python -m src.zundamon_streaming.bench.chat_flood --rate 5 --duration 30 --out flood.json --csv flood.csv
+    python -m src.zundamon_streaming.bench.chat_flood --pattern burst --burst-size 30 --burst-interval 10
+    python -m src.zundamon_streaming.bench.chat_flood --target layer   # 旧 ZundamonLayerAnimator
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import random
+import sys
+import tempfile
+import time
+import wave
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from ..audio.fake_voicevox import FakeVoiceVoxServer
+from ..utils.metrics import FrameTimeStats
+
+COMMENTS = [
+    "こんにちは", "ずんだもん可愛い", "今日は何を食べたの？", "初見です！",
+    "枝豆おいしいよね", "なのだ！", "配信ありがとう", "その話もう少し詳しく聞きたいです",
+    "ずんだ餅とずんだシェイクならどっちが好き？", "草", "今来た", "8888888",
+]
+
+
+class SimulatedAudioPlayer:
+    """WAV の長さだけ実時間で待ち、0.1秒チャンクごとに mouth_callback を呼ぶ"""
+
+    CHUNK_SECONDS = 0.1
+
+    def __init__(self):
+        self.mouth_callback = None
+        self.volume_callback = None
+        self.played = 0
+
+    def play_audio_data(self, audio_data, stop_event):
+        with wave.open(io.BytesIO(audio_data), "rb") as wav:
+            rate = wav.getframerate()
+            chunk_frames = int(rate * self.CHUNK_SECONDS)
+            while not stop_event.is_set():
+                chunk = wav.readframes(chunk_frames)
+                if not chunk:
+                    break
+                if self.mouth_callback:
+                    samples = np.frombuffer(chunk, dtype=np.int16)
+                    amplitude = float(np.max(np.abs(samples))) / 32767 * 100 if len(samples) else 0.0
+                    self.mouth_callback(amplitude > 1.0, amplitude)
+                stop_event.wait(len(chunk) / 2 / rate)
+        self.played += 1
+
+
+class NullRTMPServer:
+    rtmp_url = "null://"
+
+    def start(self, *args, **kwargs) -> bool:
+        return True
+
+    def stop(self):
+        pass
+
+
+class NullFFmpegStreamer:
+    """ffmpeg の代わりにフレームを捨てる（書き込み数だけ数える）"""
+
+    def __init__(self):
+        self.frames = 0
+
+    def start_rawvideo(self, *args, **kwargs) -> bool:
+        return True
+
+    def start_3stream(self, *args, **kwargs) -> bool:
+        return True
+
+    def write_frame(self, data) -> bool:
+        self.frames += 1
+        return True
+
+    def wait_first_packet(self, timeout: float = 10.0) -> bool:
+        return True
+
+    def stop(self):
+        pass
+
+
+def arrivals(pattern: str, rate: float, duration: float, burst_size: int = 20,
+             burst_interval: float = 10.0, seed: int = 0) -> Iterator[float]:
+    """開始からの到着時刻（秒）を昇順に返す"""
+    rng = random.Random(seed)
+    times: List[float] = []
+    if rate > 0:
+        t = rng.expovariate(rate)
+        while t < duration:
+            times.append(t)
+            t += rng.expovariate(rate)
+    if pattern == "burst":
+        t = burst_interval / 2
+        while t < duration:
+            times.extend(t + rng.uniform(0, 0.5) for _ in range(burst_size))
+            t += burst_interval
+    return iter(sorted(times))
+
+
+def _queue_depth(animator) -> int:
+    return animator.speech_queue.qsize()
+
+
+def _build_target(target: str, layer_dir: str, fps: int, voicevox_url: str, out_dir: str):
+    player = SimulatedAudioPlayer()
+    if target == "layer":
+        from zundamon_layer_animator import ZundamonLayerAnimator
+        animator = ZundamonLayerAnimator(layer_dir, fps, out_dir=out_dir, voicevox_url=voicevox_url,
+                                         audio_player=player)
+        animator.start_render_loop()
+    else:
+        from ..core.animator import ZundamonAnimator
+        animator = ZundamonAnimator(layer_dir, fps, voicevox_url=voicevox_url, audio_player=player,
+                                    rtmp_server=NullRTMPServer(), ffmpeg_streamer=NullFFmpegStreamer())
+        animator.start_pipe_stream(supervise=False)  # 監視する ffmpeg プロセスがない
+    return animator
+
+
+def run_flood(target: str = "animator", layer_dir: str = "assets/zundamon", fps: int = 30,
+              pattern: str = "poisson", rate: float = 5.0, duration: float = 30.0,
+              burst_size: int = 20, burst_interval: float = 10.0, idle_seconds: float = 3.0,
+              drain_seconds: float = 0.0, tts_latency: float = 0.1, tts_realtime_factor: float = 0.05,
+              sample_interval: float = 0.25, seed: int = 0, quiet: bool = True,
+              superchat_ratio: float = 0.0) -> Dict:
+    """負荷を掛けてレポート dict を返す"""
+    tts = FakeVoiceVoxServer(port=0, synthesis_latency=tts_latency, realtime_factor=tts_realtime_factor,
+                             jitter=tts_latency * 0.2, seed=seed)
+    url = tts.start()
+    out = io.StringIO() if quiet else sys.stdout
+    series = []
+    offered = 0
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(out):
+        animator = _build_target(target, layer_dir, fps, url, tmp)
+        try:
+            # 無負荷区間のフレーム時間
+            animator.frame_times = FrameTimeStats()
+            time.sleep(idle_seconds)
+            idle_frames = animator.frame_times.summary()
+            animator.frame_times = FrameTimeStats()
+
+            rng = random.Random(seed)
+            start = time.monotonic()
+            next_sample = 0.0
+            for at in arrivals(pattern, rate, duration, burst_size, burst_interval, seed):
+                while True:
+                    now = time.monotonic() - start
+                    if now >= next_sample:
+                        series.append({"t": round(next_sample, 3), "depth": _queue_depth(animator),
+                                       "spoken": animator.speech_latency.count, "offered": offered})
+                        next_sample += sample_interval
+                    wait = min(at, next_sample) - now
+                    if wait <= 0 and now >= at:
+                        break
+                    time.sleep(max(0.0, wait))
+                animator.add_speech(rng.choice(COMMENTS),
+                                    "superchat" if rng.random() < superchat_ratio else "chat")
+                offered += 1
+            while time.monotonic() - start < duration + drain_seconds:
+                series.append({"t": round(next_sample, 3), "depth": _queue_depth(animator),
+                               "spoken": animator.speech_latency.count, "offered": offered})
+                next_sample += sample_interval
+                time.sleep(max(0.0, start + next_sample - time.monotonic()))
+            load_frames = animator.frame_times.summary()
+        finally:
+            final_depth = _queue_depth(animator)
+            animator.stop_stream()
+            tts.stop()
+
+    depths = [row["depth"] for row in series] or [0]
+    latency = animator.speech_latency.summary()
+    return {
+        "config": {"target": target, "pattern": pattern, "rate": rate, "duration": duration,
+                   "burst_size": burst_size, "burst_interval": burst_interval, "fps": fps,
+                   "tts_latency": tts_latency, "tts_realtime_factor": tts_realtime_factor,
+                   "superchat_ratio": superchat_ratio, "seed": seed},
+        "offered": offered,
+        "spoken": latency["count"],
+        "outstanding": final_depth,
+        "latency_ms": latency,
+        "queue_depth": {"max": max(depths), "mean": sum(depths) / len(depths), "final": final_depth},
+        "frame_time_ms": {"idle": idle_frames, "load": load_frames},
+        "pacing": animator.pacer.stats(),
+        "scheduler": animator.speech_queue.stats(),
+        "tts_server": dict(tts.stats),
+        "series": series,
+    }
+
+
+def write_csv(report: Dict, path: str):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["t", "depth", "spoken", "offered"])
+        writer.writeheader()
+        writer.writerows(report["series"])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.zundamon_streaming.bench.chat_flood")
+    parser.add_argument("--target", choices=("animator", "layer"), default="animator")
+    parser.add_argument("--layer-dir", default="assets/zundamon")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--pattern", choices=("poisson", "burst"), default="poisson")
+    parser.add_argument("--rate", type=float, default=5.0, help="平均コメント数/秒（burst 時は背景負荷）")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--burst-size", type=int, default=20)
+    parser.add_argument("--burst-interval", type=float, default=10.0)
+    parser.add_argument("--idle-seconds", type=float, default=3.0)
+    parser.add_argument("--drain-seconds", type=float, default=0.0)
+    parser.add_argument("--tts-latency", type=float, default=0.1)
+    parser.add_argument("--tts-realtime-factor", type=float, default=0.05)
+    parser.add_argument("--superchat-ratio", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out")
+    parser.add_argument("--csv")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    report = run_flood(args.target, args.layer_dir, args.fps, args.pattern, args.rate, args.duration,
+                       args.burst_size, args.burst_interval, args.idle_seconds, args.drain_seconds,
+                       args.tts_latency, args.tts_realtime_factor, seed=args.seed, quiet=not args.verbose,
+                       superchat_ratio=args.superchat_ratio)
+    summary = {k: v for k, v in report.items() if k != "series"}
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.csv:
+        write_csv(report, args.csv)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
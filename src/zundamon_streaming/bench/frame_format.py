@@ -0,0 +1,144 @@
+"""入力フレーム形式の比較 - ffmpeg の overlay + format と、変換済みフレームキャッシュ
+
+同じ表情の並びを3通りで ffmpeg へ流し、エンコード（-f null）までの CPU 時間を比べる。
+
+    rgba_overlay      従来: RGBA を静止背景へ overlay → yuv420p
+    yuva420p_overlay  キャラクターだけ yuva420p に変換済み、overlay は残る
+    yuv420p_cached    背景合成・変換済み（FrameCache）、フィルタなし
+
+Python 側の1フレームあたりのコスト（合成 + tobytes / キャッシュ参照 / 変換）も出す。
+
+    python -m src.zundamon_streaming.bench.frame_format --frames 600
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from ..image.frame_cache import FrameCache
+from ..utils.metrics import cpu_seconds
+from .suite import EXPRESSIONS, _median_ms
+
+MODES = ("rgba_overlay", "yuva420p_overlay", "yuv420p_cached")
+BACKGROUND = (40, 90, 60)
+
+
+def _cmd(mode: str, size, fps: int, background_png: str) -> List[str]:
+    """build_rawvideo_cmd と同じグラフを、-re なし・-f null で最大速度で回す"""
+    width, height = size
+    pix_fmt = {"rgba_overlay": "rgba", "yuva420p_overlay": "yuva420p", "yuv420p_cached": "yuv420p"}[mode]
+    raw_input = ["-f", "rawvideo", "-pix_fmt", pix_fmt, "-s", f"{width}x{height}",
+                 "-framerate", str(fps), "-i", "pipe:0"]
+    encode = ["-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-f", "null", "-"]
+    if mode == "yuv420p_cached":
+        return ["ffmpeg", "-hide_banner", "-loglevel", "error", *raw_input, *encode]
+    return ["ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-loop", "1", "-framerate", str(fps), "-i", background_png, *raw_input,
+            "-filter_complex", "[0:v][1:v]overlay=shortest=1[outv]", "-map", "[outv]", *encode]
+
+
+def _wait_with_cpu(process: subprocess.Popen) -> Tuple[int, Optional[float]]:
+    """終了を待ちながら CPU 時間を読み続け、(終了コード, 最後に読めた CPU 秒) を返す
+
+    回収後は /proc も psutil も読めないので、終了直前の値で代える（誤差は数 ms）。
+    """
+    cpu = cpu_seconds(process.pid)
+    while process.poll() is None:
+        cpu = cpu_seconds(process.pid) or cpu
+        time.sleep(0.005)
+    return process.returncode, cpu
+
+
+def run_mode(mode: str, compositor, frames: int, fps: int, background_png: str) -> Dict:
+    if mode == "rgba_overlay":
+        states = {key: compositor.compose_frame(*key).tobytes() for key in EXPRESSIONS}
+        size = compositor.base_image.size
+    else:
+        cache = FrameCache(compositor, mode.split("_")[0],
+                           background_png if mode == "yuv420p_cached" else None)
+        states = {key: cache.frame(*key) for key in EXPRESSIONS}
+        size = cache.size
+    sequence = [states[EXPRESSIONS[(i // fps) % len(EXPRESSIONS)]] for i in range(frames)]  # 1秒ごとに変化
+
+    wall0 = time.perf_counter()
+    process = subprocess.Popen(_cmd(mode, size, fps, background_png), stdin=subprocess.PIPE)
+    try:
+        for data in sequence:
+            process.stdin.write(data)
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    code, cpu = _wait_with_cpu(process)
+    wall = time.perf_counter() - wall0
+    result = {"mode": mode, "frames": frames, "frame_bytes": len(sequence[0]),
+              "ffmpeg_cpu_seconds": cpu,
+              "ffmpeg_cpu_ms_per_frame": cpu / frames * 1000 if cpu is not None else None,
+              "wall_fps": frames / wall if wall else 0.0}
+    if code:
+        result["error"] = f"ffmpeg 終了コード {code}"
+    return result
+
+
+def python_costs(compositor, background_png: str, repeat: int = 20) -> Dict[str, float]:
+    """Python 側で1フレーム分のバイト列を用意するコスト（ミリ秒の中央値）"""
+    cache = FrameCache(compositor, "yuv420p", background_png)
+    key = EXPRESSIONS[0]
+    frame = compositor.compose_frame(*key)
+    cache.frame(*key)
+    return {
+        "rgba_compose_tobytes_ms": _median_ms(lambda: compositor.compose_frame(*key).tobytes(), repeat),
+        "yuv420p_convert_ms": _median_ms(lambda: cache.convert(frame), repeat),
+        "yuva420p_convert_ms": _median_ms(lambda: FrameCache(compositor, "yuva420p").convert(frame), repeat),
+        "cached_lookup_ms": _median_ms(lambda: cache.frame(*key), repeat),
+    }
+
+
+def run_frame_format(layer_dir: str = "assets/zundamon", frames: int = 600, fps: int = 30,
+                     modes=MODES) -> Dict:
+    from ..image.compositor import ImageCompositor
+
+    compositor = ImageCompositor(layer_dir)
+    compositor.warm_up()
+    with tempfile.TemporaryDirectory() as tmp:
+        background_png = os.path.join(tmp, "background.png")
+        Image.new("RGB", compositor.base_image.size, BACKGROUND).save(background_png)
+        return {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": python_costs(compositor, background_png),
+                "results": [run_mode(mode, compositor, frames, fps, background_png) for mode in modes]}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.zundamon_streaming.bench.frame_format")
+    parser.add_argument("--layer-dir", default="assets/zundamon")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--modes", default=",".join(MODES), help=f"カンマ区切り（{', '.join(MODES)}）")
+    parser.add_argument("--out")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    modes = [m for m in args.modes.split(",") if m]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"未知のモード: {', '.join(unknown)}")
+    out = sys.stdout if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(out):
+        report = run_frame_format(args.layer_dir, args.frames, args.fps, modes)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0 if all("error" not in r for r in report["results"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
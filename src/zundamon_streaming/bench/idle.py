@@ -0,0 +1,92 @@
+"""アイドル時の CPU - 表情が変わらない間のレンダラーとエンコーダの使用率
+
+アニメーターをローカル受け口へパイプ配信し、まばたきを止めて一定時間何も変えずに
+レンダースレッド（/proc のスレッド CPU 時間）と ffmpeg プロセスの CPU 使用率を測る。
+毎フレーム書く通常モードと、変化時・キープアライブ時だけ書くアイドルモードを比べる。
+
+    python -m src.zundamon_streaming.bench.idle --configs every_frame,idle_vfr,idle_cfr --seconds 10
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+from typing import Dict, List, Optional
+
+from ..utils.metrics import CPUMeter
+
+# start_pipe_stream の引数
+CONFIGS = {
+    "every_frame": {},
+    "idle_vfr": {"idle_fps": 2, "encoder_options": {"idle_output": "vfr"}},
+    "idle_cfr": {"idle_fps": 2, "encoder_options": {"idle_output": "cfr"}},
+}
+
+
+def run_config(name: str, config: Dict, layer_dir: str = "assets/zundamon", fps: int = 30,
+               seconds: float = 10.0, warmup: float = 2.0) -> Dict:
+    """1構成ぶん計測してレポート dict を返す"""
+    from ..core.animator import ZundamonAnimator
+    from ..rtmp.ingest import LocalRTMPServer
+    from .chat_flood import SimulatedAudioPlayer
+
+    video_tags = [0]
+
+    def on_tag(path, kind, timestamp, payload, arrival):
+        if kind == "video":
+            video_tags[0] += 1
+
+    animator = ZundamonAnimator(layer_dir, fps, audio_player=SimulatedAudioPlayer(),
+                                rtmp_server=LocalRTMPServer(port=0, on_tag=on_tag))
+    result = {"config": name, **config}
+    try:
+        if not animator.start_pipe_stream(**config):
+            result["error"] = "配信開始失敗"
+            return result
+        animator.blink_animator.stop()  # 完全に変化しない区間を作る
+        time.sleep(warmup)
+
+        renderer = CPUMeter(animator._render_thread.native_id)
+        encoder = CPUMeter(animator.ffmpeg_streamer.process.pid)
+        frames_before, tags_before = animator._frame_no, video_tags[0]
+        time.sleep(seconds)
+        result.update(
+            renderer_cpu_percent=renderer.percent(),
+            encoder_cpu_percent=encoder.percent(),
+            frames_written_per_sec=(animator._frame_no - frames_before) / seconds,
+            output_video_tags_per_sec=(video_tags[0] - tags_before) / seconds,
+        )
+        return result
+    finally:
+        animator.stop_stream()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.zundamon_streaming.bench.idle")
+    parser.add_argument("--configs", default=",".join(CONFIGS), help=f"カンマ区切り（{', '.join(CONFIGS)}）")
+    parser.add_argument("--layer-dir", default="assets/zundamon")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--out")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    names = [c for c in args.configs.split(",") if c]
+    unknown = [c for c in names if c not in CONFIGS]
+    if unknown:
+        parser.error(f"未知の構成: {', '.join(unknown)}")
+    out = sys.stdout if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(out):
+        results = [run_config(name, CONFIGS[name], args.layer_dir, args.fps, args.seconds) for name in names]
+    report = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0 if all("error" not in r for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""グラス・トゥ・グラス遅延 - 表情変更から RTMP 視聴側の画素に届くまで
+
+アニメーターを latency_marker=True で起動し、口を一定間隔で切り替える。
+レンダラーはフレーム左上に表情 version を焼き込み、ローカルの引き取り側が
+RTMP 出力をデコードしてマーカーを読む。version ごとに
+「ExpressionSnapshot.changed_at → 初めて画素に現れた時刻」を遅延として集計する。
+
+    python -m src.zundamon_streaming.bench.latency --backend local --configs inprocess,zerolatency,ring
+    python -m src.zundamon_streaming.bench.latency --backend node --changes 100 --out latency.json
+
+local バックエンドでは受け口が受け取った FLV タグをそのまま ffmpeg デコーダへ流し、
+node / nginx では ffmpeg が rtmp_url を再生する（どちらも ffmpeg が必要）。
+"""
+import argparse
+import contextlib
+import io
+import json
+import queue
+import random
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from ..image.marker import marker_size, read_marker
+from ..utils.metrics import FrameTimeStats, REGISTRY
+
+# パイプライン構成（start_pipe_stream の引数とアニメーターのペーシング）
+CONFIGS = {
+    "inprocess": {"encoder_options": {"preset": "ultrafast"}},
+    "zerolatency": {"encoder_options": {"preset": "ultrafast", "tune": "zerolatency"}},
+    "veryfast": {"encoder_options": {"preset": "veryfast", "tune": "zerolatency"}},
+    "out_of_process": {"out_of_process": True,
+                       "encoder_options": {"preset": "ultrafast", "tune": "zerolatency"}},
+    "ring": {"out_of_process": True, "ring_slots": 4,
+             "encoder_options": {"preset": "ultrafast", "tune": "zerolatency"}},
+}
+
+# ヒストグラムの上端（ミリ秒）
+BUCKETS_MS = (50, 100, 150, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000)
+
+MOUTHS = ("ほあー", "むふ")  # 初期状態は「むふ」。最初の変更で version が進むよう「ほあー」から
+
+
+def histogram(values_ms: List[float], edges=BUCKETS_MS) -> Dict[str, int]:
+    """{"<=50": n, ..., ">5000": n}"""
+    result = {f"<={edge}": 0 for edge in edges}
+    result[f">{edges[-1]}"] = 0
+    for value in values_ms:
+        for edge in edges:
+            if value <= edge:
+                result[f"<={edge}"] += 1
+                break
+        else:
+            result[f">{edges[-1]}"] += 1
+    return result
+
+
+class LatencyProbe:
+    """version → changed_at を覚え、マーカーが初めて見えた時刻との差を記録"""
+
+    def __init__(self):
+        self.pending: Dict[int, float] = {}
+        self.samples: List[float] = []
+        self.unknown = 0
+        self._lock = threading.Lock()
+        self.first_seen = threading.Event()
+
+    def mark(self, snap):
+        with self._lock:
+            self.pending[snap.version] = snap.changed_at
+
+    def observe(self, version: int, seen_at: float):
+        self.first_seen.set()
+        with self._lock:
+            changed_at = self.pending.pop(version, None)
+            if changed_at is None:
+                self.unknown += 1
+                return
+            # 先に出るはずだった古い version は追い越された（画面に出なかった）
+            for old in [v for v in self.pending if v < version]:
+                del self.pending[old]
+                self.samples.append(float("nan"))
+        latency = seen_at - changed_at
+        REGISTRY.observe("glass_to_glass", latency)
+        with self._lock:
+            self.samples.append(latency)
+
+    def report(self) -> Dict:
+        with self._lock:
+            measured = [s for s in self.samples if s == s]
+            missed = len(self.samples) - len(measured) + len(self.pending)
+        stats = FrameTimeStats(maxlen=max(1, len(measured)))
+        for value in measured:
+            stats.record(value)
+        return {"samples": len(measured), "missed": missed, "latency_ms": stats.summary(),
+                "histogram_ms": histogram([v * 1000 for v in measured])}
+
+
+class MarkerPuller:
+    """RTMP 出力をデコードしてマーカー領域だけを読み、値が変わった時刻を on_marker へ渡す"""
+
+    def __init__(self, on_marker: Callable[[int, float], None]):
+        self.on_marker = on_marker
+        self.process: Optional[subprocess.Popen] = None
+        self.frames = 0
+        self._tags: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+
+    def _cmd(self, source: List[str]) -> List[str]:
+        width, height = marker_size()
+        return [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-fflags", "nobuffer", "-flags", "low_delay", "-probesize", "32", "-analyzeduration", "0",
+            *source,
+            "-an", "-vf", f"crop={width}:{height}:0:0,format=gray",
+            "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1",
+        ]
+
+    def start_url(self, rtmp_url: str):
+        """ffmpeg で RTMP を再生（node / nginx 用）"""
+        self.process = subprocess.Popen(self._cmd(["-i", rtmp_url]), stdout=subprocess.PIPE,
+                                        stdin=subprocess.DEVNULL)
+        self._spawn(self._read_loop)
+
+    def start_tap(self):
+        """feed_tag で受け取った FLV タグをデコーダへ流す（ローカル受け口用）"""
+        from ..rtmp.protocol import flv_header
+        self.process = subprocess.Popen(self._cmd(["-f", "flv", "-i", "pipe:0"]), stdout=subprocess.PIPE,
+                                        stdin=subprocess.PIPE)
+        self._tags.put(flv_header(audio=False))
+        self._spawn(self._feed_loop)
+        self._spawn(self._read_loop)
+
+    def feed_tag(self, path: str, kind: str, timestamp: int, payload: bytes, arrival: float):
+        """LocalRTMPServer の on_tag。受信ループを止めないようキューに積むだけ"""
+        if kind == "video":
+            from ..rtmp.protocol import MSG_VIDEO, flv_tag
+            self._tags.put(flv_tag(MSG_VIDEO, timestamp, payload))
+
+    def _spawn(self, target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _feed_loop(self):
+        while True:
+            data = self._tags.get()
+            if data is None:
+                break
+            try:
+                self.process.stdin.write(data)
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                break
+
+    def _read_loop(self):
+        width, height = marker_size()
+        size = width * height
+        last = None
+        stdout = self.process.stdout
+        while True:
+            data = stdout.read(size)
+            if len(data) < size:
+                break
+            seen_at = time.monotonic()
+            self.frames += 1
+            value = read_marker(data, width)
+            if value is not None and value != last:
+                last = value
+                self.on_marker(value, seen_at)
+
+    def stop(self):
+        self._tags.put(None)
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+
+def run_config(name: str, config: Dict, backend: str = "local", layer_dir: str = "assets/zundamon",
+               fps: int = 30, changes: int = 30, interval: float = 0.5, jitter: float = 0.2,
+               warmup_timeout: float = 15.0, settle: float = 2.0, seed: int = 0) -> Dict:
+    """1構成ぶん計測してレポート dict を返す"""
+    from ..core.animator import ZundamonAnimator
+    from ..rtmp.ingest import LocalRTMPServer
+    from ..rtmp.server import create_server
+    from .chat_flood import SimulatedAudioPlayer
+
+    probe = LatencyProbe()
+    puller = MarkerPuller(probe.observe)
+    if backend == "local":
+        server = LocalRTMPServer(port=0, on_tag=puller.feed_tag)
+        puller.start_tap()
+    else:
+        server = create_server(backend)
+    animator = ZundamonAnimator(layer_dir, fps, pacing_policy=config.get("pacing_policy", "drop"),
+                                audio_player=SimulatedAudioPlayer(), rtmp_server=server, latency_marker=True)
+    result = {"config": name, "backend": backend, **config}
+    try:
+        if not animator.start_pipe_stream(out_of_process=config.get("out_of_process", False),
+                                          ring_slots=config.get("ring_slots", 0),
+                                          encoder_options=config.get("encoder_options")):
+            result["error"] = "配信開始失敗"
+            return result
+        animator.blink_animator.stop()  # 計測外の version を増やさない
+        if backend != "local":
+            puller.start_url(server.rtmp_url)
+        if not probe.first_seen.wait(warmup_timeout):
+            result["error"] = "マーカーが読めません"
+            return result
+
+        rng = random.Random(seed)
+        last_version = animator.expression_state.snapshot().version
+        for i in range(changes):
+            animator.expression_state.set_mouth(MOUTHS[i % 2])
+            snap = animator.expression_state.snapshot()
+            if snap.version != last_version:  # 変化しなかった回は画面に出ないので取りこぼしに数えない
+                probe.mark(snap)
+                last_version = snap.version
+            time.sleep(max(0.05, interval + rng.uniform(-jitter, jitter)))
+        time.sleep(settle)
+        result.update(probe.report(), decoded_frames=puller.frames, unknown_markers=probe.unknown)
+        return result
+    finally:
+        puller.stop()
+        animator.stop_stream()
+
+
+def run_latency(configs: List[str], backend: str = "local", **kwargs) -> Dict:
+    return {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "backend": backend,
+            "results": [run_config(name, CONFIGS[name], backend, **kwargs) for name in configs]}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.zundamon_streaming.bench.latency")
+    parser.add_argument("--backend", choices=("local", "node", "nginx"), default="local")
+    parser.add_argument("--configs", default="inprocess,zerolatency,out_of_process",
+                        help=f"カンマ区切り（{', '.join(CONFIGS)}）")
+    parser.add_argument("--layer-dir", default="assets/zundamon")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--changes", type=int, default=30)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    names = [c for c in args.configs.split(",") if c]
+    unknown = [c for c in names if c not in CONFIGS]
+    if unknown:
+        parser.error(f"未知の構成: {', '.join(unknown)}")
+    out = sys.stdout if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(out):
+        report = run_latency(names, args.backend, layer_dir=args.layer_dir, fps=args.fps,
+                             changes=args.changes, interval=args.interval, seed=args.seed)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0 if all("error" not in r for r in report["results"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+"""ベンチマーク本体 - インデックス構築・検索・合成・フレーム出力・TTS・RTMP受け口
+
+各ベンチは {指標名: 値} を返す。指標の良し悪しの向きと許容する揺れは METRICS に持ち、
+compare() が基準値（baseline.json）との差を判定する。基準値は同じマシン（CPU 数・OS・Python）で
+同じ設定（quick・試行回数）で取ったものとだけ比べる（machine / settings が違えば比較しない）。
+基準値は複数回の中央値で取る（median_results）。
+"""
+import contextlib
+import io
+import os
+import platform
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from ..utils.metrics import percentiles
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+TTS_ROUNDS = 5
+INGEST_ROUNDS = 3
+
+# 指標名 -> (大きいほど良いか, 同じマシンでの揺れとして許容する悪化の割合)
+# 許容幅は 1 CPU の VM で full モードを繰り返した時の、5回の中央値（基準値）からの最大の悪化に合わせている
+METRICS = {
+    "index_build_ms": (False, 0.15),  # ファイルシステム走査（最良値）
+    "pack_open_ms": (False, 0.15),
+    "find_layer_file_per_sec": (True, 0.20),
+    "compose_fps": (True, 0.15),
+    "png_sink_fps": (True, 0.15),
+    "raw_sink_fps": (True, 0.20),  # /dev/null への書き込み
+    "tts_p50_ms": (False, 0.20),  # 数 ms のループバック往復（TTS_ROUNDS 回の最良値）
+    "tts_p95_ms": (False, 0.30),
+    "ingest_tags_per_sec": (True, 0.25),  # ソケット越し（INGEST_ROUNDS 回の最良値）
+    "ingest_mb_per_sec": (True, 0.25),
+}
+MACHINE_KEYS = ("cpus", "platform", "python")
+
+# compositor と旧アニメーターが実際に引くパターン
+LOOKUP_PATTERNS = [
+    "服装2/素体", "素体", "!眉/*普通眉*", "!目/*普通白目*", "目/目セット/普通白目",
+    "目/目セット/黒目/普通目", "目/UU", "目/にっこり", "!口/_むふ_", "!口/_ほあー_",
+    "!口/_ほあ_", "_服装1/!左腕/*基本*", "_服装1/!右腕/*基本*", "存在しないレイヤー",
+]
+
+EXPRESSIONS = [("むふ", "普通目"), ("ほあー", "普通目"), ("むふ", "UU"), ("ほあ", "にっこり")]
+
+
+def _median_ms(fn: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def _best_ms(fn: Callable[[], object], repeat: int) -> float:
+    """repeat 回のうち最速（ミリ秒）。他プロセスに割り込まれた回を除くため中央値ではなく最良値"""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return min(samples) * 1000
+
+
+def _rate(fn: Callable[[int], object], seconds: float, rounds: int = 3) -> float:
+    """fn(i) を seconds 秒回して 1秒あたりの回数を返す（rounds 区間に分けて最良の区間）"""
+    count = 0
+    best = 0.0
+    for _ in range(rounds):
+        start = count
+        t0 = time.perf_counter()
+        deadline = t0 + seconds / rounds
+        while time.perf_counter() < deadline:
+            fn(count)
+            count += 1
+        best = max(best, (count - start) / (time.perf_counter() - t0))
+    return best
+
+
+def bench_index(layer_dir: str, repeat: int = 5) -> Dict[str, float]:
+    """os.walk によるインデックス構築と、アセットパックを開く時間"""
+    from ..image.loader import build_png_index
+    from ..image.pack import AssetPack
+
+    result = {"index_build_ms": _best_ms(lambda: build_png_index(layer_dir), repeat)}
+
+    def open_pack():
+        pack = AssetPack.open_default(layer_dir)
+        if pack:
+            pack.close()
+        return pack
+
+    if open_pack() is not None:
+        result["pack_open_ms"] = _best_ms(open_pack, repeat)
+    return result
+
+
+def bench_lookup(layer_dir: str, seconds: float = 1.0) -> Dict[str, float]:
+    """find_layer_file の検索速度（メモ化なし）"""
+    from ..image.loader import PNGLoader
+
+    with contextlib.redirect_stdout(io.StringIO()):  # 未検出 WARN を抑止
+        loader = PNGLoader(layer_dir)
+        rate = _rate(lambda i: loader.find_layer_file(LOOKUP_PATTERNS[i % len(LOOKUP_PATTERNS)]), seconds,
+                     rounds=5)
+    return {"find_layer_file_per_sec": rate}
+
+
+def bench_compose_and_sinks(layer_dir: str, seconds: float = 2.0) -> Dict[str, float]:
+    """ウォームアップ済み compositor の合成速度と、PNG / 生フレーム出力の速度"""
+    from ..image.compositor import ImageCompositor
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        compositor = ImageCompositor(layer_dir)
+        compositor.warm_up()
+
+    def compose(i):
+        mouth, eyes = EXPRESSIONS[i % len(EXPRESSIONS)]
+        return compositor.compose_frame(mouth, eyes)
+
+    result = {"compose_fps": _rate(compose, seconds)}
+    frames = [compose(i) for i in range(len(EXPRESSIONS))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def png_sink(i):
+            frames[i % len(frames)].save(os.path.join(tmp, f"current_{i % 60:06d}.png"))
+        result["png_sink_fps"] = _rate(png_sink, seconds)
+
+    with open(os.devnull, "wb") as sink:
+        result["raw_sink_fps"] = _rate(lambda i: sink.write(frames[i % len(frames)].tobytes()), seconds)
+    result["raw_frame_mb"] = len(frames[0].tobytes()) / 1e6
+    return result
+
+
+def bench_tts(requests_count: int = 50, latency: float = 0.0, rounds: int = 1) -> Dict[str, float]:
+    """VoiceVoxClient の往復レイテンシ（クエリ + 合成、偽VOICEVOX相手）
+
+    rounds 回繰り返して各パーセンタイルの最良値を取る（少ないサンプルの揺れを抑える）。
+    """
+    from ..audio.fake_voicevox import FakeVoiceVoxServer
+    from ..audio.voicevox import VoiceVoxClient
+
+    stub = FakeVoiceVoxServer(port=0, synthesis_latency=latency)
+    client = VoiceVoxClient(stub.start())
+    best = {"p50": float("inf"), "p95": float("inf")}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(rounds):
+                samples = []
+                for i in range(requests_count):
+                    t0 = time.perf_counter()
+                    client.generate_voice(f"ベンチマーク{i}番目のコメントなのだ")
+                    samples.append(time.perf_counter() - t0)
+                for key, value in percentiles(samples, (50, 95)).items():
+                    best[key] = min(best[key], value)
+    finally:
+        stub.stop()
+    return {"tts_p50_ms": best["p50"] * 1000, "tts_p95_ms": best["p95"] * 1000}
+
+
+def _ingest_once(seconds: float, video: bytes, audio: bytes) -> Dict:
+    """1接続分 publish して受け口の集計を返す"""
+    from ..rtmp.client import RTMPPublisher
+    from ..rtmp.ingest import LocalRTMPServer
+    from ..rtmp.protocol import MSG_AUDIO, MSG_VIDEO
+
+    sent = 0
+    server = LocalRTMPServer(port=0)
+    server.start()
+    publisher = RTMPPublisher(server.rtmp_url)
+    try:
+        publisher.connect()
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < seconds:
+            timestamp = sent * 33
+            publisher.send_tag(MSG_VIDEO, timestamp, video)
+            publisher.send_tag(MSG_AUDIO, timestamp, audio)
+            sent += 1
+        publisher.close()  # 受け口が全タグを読んで切断するまで待つ
+        stats = next(iter(server.stats().values()))
+    finally:
+        server.stop()
+    if stats["tags"] < sent * 2:
+        raise RuntimeError(f"受け口の取りこぼし: {stats['tags']}/{sent * 2}タグ")
+    return stats
+
+
+def bench_ingest(seconds: float = 1.0, frame_bytes: int = 20000, rounds: int = INGEST_ROUNDS) -> Dict[str, float]:
+    """ローカル RTMP 受け口の取り込み速度（30fps 相当の映像+音声タグを全力で publish）
+
+    速度は受け口での最初から最後のタグ到着までの時間で割る（接続・終了待ちは含めない）。
+    seconds を rounds 回の接続に分け、最も速かった回を取る。
+    """
+    video = bytes([0x27, 1]) + bytes(frame_bytes)
+    audio = bytes([0xAF, 1]) + bytes(370)
+    best = None
+    # 受け口スレッドのログ（publish開始/終了）も含めて stdout に出さない
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(rounds):
+            stats = _ingest_once(seconds / rounds, video, audio)
+            rate = stats["tags"] / stats["received_seconds"]
+            if best is None or rate > best[0]:
+                best = (rate, stats["bytes"] / 1e6 / stats["received_seconds"])
+    return {"ingest_tags_per_sec": best[0], "ingest_mb_per_sec": best[1]}
+
+
+def run_suite(layer_dir: str = "assets/zundamon", quick: bool = False,
+              only: Optional[List[str]] = None) -> Dict:
+    """全ベンチを実行して結果 dict を返す"""
+    settings = suite_settings(quick)
+    seconds = settings["seconds"]
+    benches = {
+        "index": lambda: bench_index(layer_dir, settings["index_repeat"]),
+        "lookup": lambda: bench_lookup(layer_dir, seconds),
+        "compose": lambda: bench_compose_and_sinks(layer_dir, seconds),
+        "tts": lambda: bench_tts(settings["tts_requests"], rounds=settings["tts_rounds"]),
+        "ingest": lambda: bench_ingest(seconds, rounds=settings["ingest_rounds"]),
+    }
+    results: Dict[str, float] = {}
+    for name, bench in benches.items():
+        if only and name not in only:
+            continue
+        results.update(bench())
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": machine_info(),
+        "layer_dir": layer_dir,
+        "settings": settings,
+        "results": results,
+    }
+
+
+def suite_settings(quick: bool = False) -> Dict:
+    """計測時間・試行回数。基準値はこれが一致するときだけ比べられる"""
+    return {"quick": quick, "seconds": 0.5 if quick else 2.0, "index_repeat": 3 if quick else 15,
+            "tts_requests": 20 if quick else 100, "tts_rounds": TTS_ROUNDS, "ingest_rounds": INGEST_ROUNDS}
+
+
+def settings_mismatch(settings: Dict, baseline_settings: Optional[Dict]) -> Optional[str]:
+    """比較できない理由（一致すれば None）。settings の無い古い基準値は full モード扱い"""
+    baseline_settings = baseline_settings or {"quick": False}
+    diff = [key for key in settings if key in baseline_settings and settings[key] != baseline_settings[key]]
+    if not diff:
+        return None
+    return ", ".join(f"{key}={settings[key]}（基準値は {baseline_settings[key]}）" for key in diff)
+
+
+def machine_info() -> Dict:
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def machine_mismatch(machine: Dict, baseline_machine: Optional[Dict]) -> Optional[str]:
+    """別のマシンで取った基準値なら理由を返す（比べても揺れと区別できない）"""
+    if not baseline_machine:
+        return "基準値にマシン情報がありません"
+    diff = [key for key in MACHINE_KEYS if machine.get(key) != baseline_machine.get(key)]
+    if not diff:
+        return None
+    return ", ".join(f"{key}={machine.get(key)}（基準値は {baseline_machine.get(key)}）" for key in diff)
+
+
+def median_results(reports: List[Dict]) -> Dict[str, float]:
+    """複数回の run_suite の結果を指標ごとの中央値にまとめる（基準値用）"""
+    names = {name for report in reports for name in report["results"]}
+    return {name: statistics.median(r["results"][name] for r in reports if name in r["results"])
+            for name in sorted(names)}
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float],
+            threshold: Optional[float] = None) -> Dict[str, Dict]:
+    """基準値との差分。向きを考慮して許容幅（threshold 指定時は一律その値）を超えて悪化したら regression"""
+    report = {}
+    for name, (higher_is_better, tolerance) in METRICS.items():
+        if threshold is not None:
+            tolerance = threshold
+        if name not in results or not baseline.get(name):
+            continue
+        change = (results[name] - baseline[name]) / baseline[name]
+        worse = -change if higher_is_better else change
+        report[name] = {
+            "baseline": baseline[name],
+            "current": results[name],
+            "change": change,
+            "tolerance": tolerance,
+            "regression": worse > tolerance,
+        }
+    return report
@@ -5,24 +5,39 @@ import threading
 import queue
 from PIL import Image
 from ..image.compositor import ImageCompositor
+from ..image.frame_cache import FrameCache
+from ..image.marker import stamp
 from ..audio.voicevox import VoiceVoxClient
-from ..audio.player import AudioPlayer
+from ..audio.scheduler import SpeechScheduler
 from ..expression.state import ExpressionState
 from ..expression.animation import BlinkAnimator
-from ..rtmp.server import RTMPServer
+from ..expression.timeline import Timeline
+from ..rtmp.server import create_server
 from ..rtmp.ffmpeg import FFmpegStreamer
-
-def trace_log(message, level="INFO"):
-    timestamp = time.time()
-    thread_id = threading.current_thread().ident
-    print(f"[{timestamp:.3f}][{thread_id}][{level}] {message}")
+from ..rtmp.fanout import FanOut
+from ..rtmp.readiness import StartupReport
+from ..rtmp.supervisor import EncoderSupervisor
+from ..utils.metrics import FrameTimeStats, MetricsServer, REGISTRY
+from ..utils.trace import trace_log, span
+from .render_process import RenderProcess
+from .watchdog import READER_STALLED, WRITER_STALLED, StreamWatchdog
+from .frame_ring import FrameRing
+from .pacing import FramePacer, PaceDecision
 
 class ZundamonAnimator:
-    def __init__(self, layer_dir: str = "assets/zundamon", fps: int = 30):
+    def __init__(self, layer_dir: str = "assets/zundamon", fps: int = 30, pacing_policy: str = "drop",
+                 metrics_port: int = None, voicevox_url: str = None, audio_player=None,
+                 rtmp_server=None, ffmpeg_streamer=None, latency_marker: bool = False, compositor=None):
+        """voicevox_url 以降は差し替え用（負荷試験で偽TTS・空の出力先を注入する）
+
+        latency_marker=True でパイプ配信の各フレーム左上に表情 version を焼き込む（遅延計測用）
+        compositor を渡すとそのアセット（索引・デコード済みレイヤー）を共有する（ChannelManager 用）
+        """
         trace_log("ZundamonAnimator初期化開始")
         
         self.layer_dir = layer_dir
         self.fps = fps
+        self.latency_marker = latency_marker
         
         # 3ストリーム用ディレクトリ作成
         self.base_dir = os.path.join(layer_dir, "base")
@@ -33,25 +48,55 @@ class ZundamonAnimator:
         os.makedirs(self.eyes_dir, exist_ok=True)
         
         # コンポーネント初期化
-        self.compositor = ImageCompositor(layer_dir)
-        self.voicevox = VoiceVoxClient()
-        self.audio_player = AudioPlayer()
+        if compositor is None:
+            compositor = ImageCompositor(layer_dir)
+            compositor.warm_up()
+        self.compositor = compositor
+        self.voicevox = VoiceVoxClient(voicevox_url)
+        if audio_player is None:
+            from ..audio.player import AudioPlayer  # pyaudio は実再生時だけ必要
+            audio_player = AudioPlayer()
+        self.audio_player = audio_player
         self.expression_state = ExpressionState()
-        self.blink_animator = BlinkAnimator(self.expression_state)
-        self.rtmp_server = RTMPServer()
-        self.ffmpeg_streamer = FFmpegStreamer()
+        self.timeline = Timeline(self.expression_state, fps)
+        self.blink_animator = BlinkAnimator(self.expression_state, self.timeline)
+        self.rtmp_server = rtmp_server or create_server()
+        self.ffmpeg_streamer = ffmpeg_streamer or FFmpegStreamer()
         
         # 3ストリーム管理
         self._frame_no = 0
         self._frame_lock = threading.Lock()
-        self.current_mouth = "むふ"
+        self.current_mouth = "むふ"   # 描画済みの状態
         self.current_eyes = "普通目"
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+        self.frame_times = FrameTimeStats()
+        self.speech_latency = FrameTimeStats()  # add_speech から再生開始まで（秒）
+        self.pacer = FramePacer(fps, pacing_policy)
+        self.render_process = None
+        self.frame_ring = None
+        self._feed_thread = None
+        self._reset_render_state()
+        self._last_frame_report = {}
+        self.metrics_server = None
+        self.startup = None  # 直近の起動段階レポート
+        self.fanout = None
+        self.supervisor = None
+        self.watchdog = None
+        self.frames_lost = 0  # エンコーダ復旧待ちで書けなかったフレーム
+        self.idle_fps = None  # アイドルモードのキープアライブ（None = 毎フレーム書く）
+        self.frames_idle = 0  # アイドルモードで書かずに済ませたフレーム
+        self.frame_cache = None  # 状態ごとの変換済みフレーム（frame_format が rgba 以外）
+        if metrics_port is not None:
+            self.metrics_server = MetricsServer(port=metrics_port)
+            self.metrics_server.start()
+            trace_log(f"メトリクス: http://127.0.0.1:{self.metrics_server.port}/metrics")
         
         # AudioPlayerにコールバック設定
         self.audio_player.mouth_callback = self._mouth_callback
         
         # 内部状態
-        self.speech_queue = queue.Queue()
+        self.speech_queue = SpeechScheduler()  # 優先度・TTL・重複統合・バックログ上限
         self._render_thread = None
         self._speech_thread = None
         self._stop_event = threading.Event()
@@ -61,15 +106,19 @@ class ZundamonAnimator:
         
         trace_log("ZundamonAnimator初期化完了")
     
-    def start_layer_stream(self, background_video: str = None) -> bool:
-        """3ストリーム配信開始"""
+    def start_layer_stream(self, background_video: str = None, watchdog_action="restart") -> bool:
+        """3ストリーム配信開始
+        
+        watchdog_action: レンダラーと ffmpeg の片方が止まった時の対処
+        （"alert" = 警告のみ / "restart" = 止まった側を再起動 / "stop" = 配信停止 / callable(kind)）
+        """
         trace_log("3ストリーム配信開始")
         
-        if not self.rtmp_server.start():
+        self.startup = StartupReport()
+        if not self.rtmp_server.start(self.startup):
             trace_log("RTMPサーバー起動失敗", "ERROR")
             return False
-        
-        time.sleep(1.0)
+        self._last_frame_report = {}
         
         # 3ストリーム初期フレーム生成
         self._generate_initial_streams()
@@ -79,7 +128,7 @@ class ZundamonAnimator:
         self._render_thread = threading.Thread(target=self._eyes_render_loop, daemon=True)
         self._render_thread.start()
         
-        # まばたき開始
+        # まばたき開始（レンダーループのフレームクロックで駆動）
         self.blink_animator.start()
         
         # FFmpeg 3ストリーム配信開始
@@ -95,9 +144,454 @@ class ZundamonAnimator:
             self.stop_stream()
             return False
         
+        if not self._await_first_packet():
+            self.stop_stream()
+            return False
+        
+        def restart_encoder():
+            trace_log("FFmpeg 3ストリーム再起動", "WARN")
+            self.ffmpeg_streamer.stop()
+            self.ffmpeg_streamer.start_3stream(base_pattern, mouth_pattern, eyes_pattern,
+                                               self.rtmp_server.rtmp_url, self.fps)
+        
+        self._start_watchdog(watchdog_action, lambda: self._restart_render_thread(self._eyes_render_loop),
+                             restart_encoder)
         trace_log("3ストリーム配信開始完了")
         return True
     
+    def _start_watchdog(self, watchdog_action, restart_writer, restart_reader, writer_seq=None,
+                        writer_blocked=None, **options):
+        """書き手（既定はフレームクロック）と読み手（ffmpeg の frame=）を突き合わせる
+        
+        restart_writer / restart_reader は watchdog_action="restart" で止まった側を立て直す処理。
+        writer_blocked はパイプ配信のように読み手が書き手に追従する構成で渡す（StreamWatchdog 参照）。
+        """
+        def restart(kind: str):
+            if kind == WRITER_STALLED:
+                restart_writer()
+            elif kind == READER_STALLED:
+                restart_reader()
+        
+        actions = {
+            "alert": None,
+            "restart": restart,
+            # ウォッチドッグのスレッドから stop_stream は呼べない（自分自身を join する）
+            "stop": lambda kind: threading.Thread(target=self.stop_stream, daemon=True).start(),
+        }
+        action = watchdog_action if callable(watchdog_action) else actions[watchdog_action]
+        self.watchdog = StreamWatchdog(writer_seq or (lambda: self.timeline.frame_no),
+                                       lambda: self.ffmpeg_streamer.progress_frame,
+                                       self.fps, action=action, writer_blocked=writer_blocked, **options)
+        self.watchdog.start()
+    
+    def _restart_render_thread(self, target):
+        if self._render_thread and self._render_thread.is_alive():
+            trace_log("レンダースレッドは生存中（ブロック中）のため再起動できません", "ERROR")
+            return
+        trace_log("レンダースレッド再起動", "WARN")
+        self._render_thread = threading.Thread(target=target, daemon=True)
+        self._render_thread.start()
+    
+    def start_pipe_stream(self, background_video: str = None, out_of_process: bool = False,
+                          ring_slots: int = 0, ring_policy: str = "overwrite",
+                          encoder_options: dict = None, outputs: dict = None, supervise: bool = True,
+                          idle_fps: float = None, frame_format: str = "rgba", background_image=None,
+                          own_clock: bool = True, watchdog_action="restart") -> bool:
+        """生フレームパイプ配信開始（out_of_process=True で合成・出力を別プロセス化）
+        
+        ring_slots > 0 の場合、ワーカーは共有メモリのフレームリングに書き、
+        親プロセスの供給スレッドがスロットをコピーせず ffmpeg へ渡す。
+        encoder_options は x264 の preset / tune（例: {"tune": "zerolatency"}）。
+        outputs（名前 → rtmp URL / FLV パス）を渡すと1回のエンコードを FanOut で
+        rtmp_server と各配信先へ配る。以降も add_output / remove_output で増減できる。
+        supervise=True ならエンコーダが親側にある構成で ffmpeg の終了・停止を監視し、
+        現在のフレーム位置から再起動する（EncoderSupervisor）。
+        idle_fps を渡すと表情が変わった時と idle_fps のキープアライブ時だけフレームを書く
+        （同一プロセスのみ。出力は encoder_options["idle_output"] = "vfr"（既定）/ "cfr"）。
+        frame_format="yuv420p" は表情状態ごとに静止背景 background_image（画像パス / RGB / None=黒）へ
+        合成・変換済みのフレームをキャッシュして送り、ffmpeg の overlay と形式変換を省く。
+        "yuva420p" はキャラクターのみを変換済みで送る（background_video への overlay は残る）。
+        own_clock=False ならレンダースレッドを持たず、外部のスケジューラが render_tick() を呼ぶ。
+        同一プロセスではウォッチドッグが書き込みと ffmpeg の消費を突き合わせ、書き手（合成）の停止を
+        エンコーダの停止と区別する（watchdog_action は start_layer_stream と同じ）。
+        """
+        encoder_options = dict(encoder_options or {})
+        mode = "別プロセス" if out_of_process else "同一プロセス"
+        trace_log(f"パイプ配信開始 ({mode})")
+        if outputs is not None and out_of_process and ring_slots <= 0:
+            trace_log("ファンアウトはエンコーダが親プロセスにある構成（同一プロセス / フレームリング）のみ", "ERROR")
+            return False
+        if idle_fps is not None and idle_fps <= 0:
+            trace_log(f"idle_fps は正の値: {idle_fps}", "ERROR")
+            return False
+        if idle_fps is not None and out_of_process:
+            trace_log("アイドルモードは同一プロセス配信のみ", "ERROR")
+            return False
+        if not own_clock and out_of_process:
+            trace_log("外部クロックは同一プロセス配信のみ", "ERROR")
+            return False
+        self.idle_fps = idle_fps
+        if idle_fps is not None:
+            encoder_options.setdefault("idle_output", "vfr")
+        self.frame_cache = None
+        if frame_format != "rgba":
+            if out_of_process:
+                trace_log("変換済みフレームは同一プロセス配信のみ", "ERROR")
+                return False
+            if frame_format == "yuv420p" and background_video:
+                trace_log("yuv420p は静止背景に合成済みのため background_video とは併用できません", "ERROR")
+                return False
+            try:
+                self.frame_cache = FrameCache(self.compositor, frame_format, background_image)
+                # 口パク（むふ / ほあー）× まばたき（普通目 / UU）は配信開始前に変換しておく
+                self.frame_cache.warm_up([(m, e) for m in ("むふ", "ほあー") for e in ("普通目", "UU")])
+            except (OSError, ValueError) as e:
+                trace_log(f"変換済みフレーム準備失敗: {e}", "ERROR")
+                self.frame_cache = None
+                return False
+            encoder_options["input_pix_fmt"] = frame_format
+        size = self.frame_cache.size if self.frame_cache else self.compositor.base_image.size
+        
+        self.startup = StartupReport()
+        if not self.rtmp_server.start(self.startup):
+            trace_log("RTMPサーバー起動失敗", "ERROR")
+            return False
+        
+        self._stop_event.clear()
+        self._last_frame_report = {}
+        self.frames_lost = 0
+        self.frames_idle = 0
+        if out_of_process:
+            if ring_slots > 0:
+                width, height = self.compositor.base_image.size
+                if not self._start_encoder((width, height), background_video, encoder_options, outputs):
+                    self.stop_stream()
+                    return False
+                self.frame_ring = FrameRing(width * height * 4, ring_slots, ring_policy)
+                self._feed_thread = threading.Thread(target=self._feed_loop, daemon=True)
+                self._feed_thread.start()
+            
+            # 親側はタイムラインを進めて制御ブロックへ書くだけ
+            self.render_process = RenderProcess(
+                self.layer_dir, self.fps, self.rtmp_server.rtmp_url, background_video,
+                ring=self.frame_ring, pacing_policy=self.pacer.policy,
+                encoder_options=encoder_options, latency_marker=self.latency_marker
+            )
+            self.render_process.start(self.expression_state.snapshot())
+            target = self._publish_loop
+        else:
+            self._reset_render_state()
+            if not self._start_encoder(size, background_video, encoder_options, outputs):
+                self.stop_stream()
+                return False
+            target = self._pipe_render_loop if own_clock else None
+        
+        if target is not None:
+            self._render_thread = threading.Thread(target=target, daemon=True)
+            self._render_thread.start()
+        self.blink_animator.start()
+        
+        # 別プロセスで ffmpeg も子側にある場合は親から進捗が見えない
+        if (not out_of_process or ring_slots > 0) and not self._await_first_packet(primed=not own_clock):
+            self.stop_stream()
+            return False
+        if supervise and (not out_of_process or ring_slots > 0):
+            self._start_supervisor(size, background_video, encoder_options)
+        if not out_of_process:
+            self._start_pipe_watchdog(watchdog_action, size, background_video, encoder_options, own_clock)
+        trace_log("パイプ配信開始完了")
+        return True
+    
+    def start_alpha_stream(self, target: str, codec: str = "vp9", crop_to_layers: bool = True) -> bool:
+        """キャラクターのみを透過で出力（背景は OBS などの合成側に任せる）
+        
+        RTMP サーバーも背景動画のデコードも使わない。crop_to_layers=True なら
+        position_map.json の全レイヤー bbox の和に切り出して送る（エンコードする画素を減らす）。
+        codec: "vp9"（WebM, yuva420p）/ "qtrle"（QuickTime RLE, argb）
+        """
+        trace_log(f"透過出力開始 → {target}")
+        self.startup = StartupReport()
+        self._stop_event.clear()
+        self._last_frame_report = {}
+        self.idle_fps = None
+        crop = self.compositor.layer_bounds() if crop_to_layers else None
+        # vp9 は yuva420p をそのまま受けるので変換済みをキャッシュ、qtrle は argb なので rgba のまま
+        pix_fmt = "yuva420p" if codec == "vp9" else "rgba"
+        self.frame_cache = FrameCache(self.compositor, pix_fmt, crop=crop)
+        self.frame_cache.warm_up([(m, e) for m in ("むふ", "ほあー") for e in ("普通目", "UU")])
+        if not self.ffmpeg_streamer.start_alpha(self.frame_cache.size, target, self.fps, codec, pix_fmt):
+            self.stop_stream()
+            return False
+        
+        self._render_thread = threading.Thread(target=self._pipe_render_loop, daemon=True)
+        self._render_thread.start()
+        self.blink_animator.start()
+        
+        if not self._await_first_packet():
+            self.stop_stream()
+            return False
+        trace_log(f"透過出力開始完了 ({self.frame_cache.size[0]}x{self.frame_cache.size[1]}, crop={crop})")
+        return True
+    
+    def _start_encoder(self, size, background_video, encoder_options: dict, outputs) -> bool:
+        if outputs is None:
+            return self.ffmpeg_streamer.start_rawvideo(size, self.rtmp_server.rtmp_url, self.fps,
+                                                       background_video, **encoder_options)
+        self.fanout = FanOut()
+        self.fanout.add_output("origin", self.rtmp_server.rtmp_url)
+        for name, target in outputs.items():
+            self.fanout.add_output(name, target)
+        return self.ffmpeg_streamer.start_fanout(size, self.fanout, self.fps, background_video,
+                                                 **encoder_options)
+    
+    def _relaunch_encoder(self, size, background_video, encoder_options: dict, frame: int):
+        """エンコーダを起動し直す。入力は次に書くフレームから続き、出力タイムスタンプもその位置から始める"""
+        self.ffmpeg_streamer.stop()
+        options = dict(encoder_options, ts_offset=frame / self.fps)
+        if self.fanout is not None:
+            ok = self.ffmpeg_streamer.start_fanout(size, self.fanout, self.fps, background_video, **options)
+        else:
+            ok = self.ffmpeg_streamer.start_rawvideo(size, self.rtmp_server.rtmp_url, self.fps,
+                                                     background_video, **options)
+        return self.ffmpeg_streamer.process if ok else None
+    
+    def _start_supervisor(self, size, background_video, encoder_options: dict):
+        def launch(frame: int):
+            return self._relaunch_encoder(size, background_video, encoder_options, frame)
+        
+        def position() -> int:
+            if self.idle_fps is not None:
+                return self.timeline.frame_no  # 書いた枚数ではなくフレームクロックの位置
+            with self._frame_lock:
+                return self._frame_no
+        
+        stall_timeout, startup_timeout = 5.0, 10.0
+        if self.idle_fps is not None:
+            # アイドル中はキープアライブの間 ffmpeg に入力が無く進捗行も出ない。3回分は待つ
+            stall_timeout = max(stall_timeout, 3 / self.idle_fps)
+            startup_timeout = max(startup_timeout, 2 * stall_timeout)
+        # 合成側が止まって入力が来ないだけの間は ffmpeg を再起動しない（ウォッチドッグが書き手の停止と判定）
+        self.supervisor = EncoderSupervisor(launch, position, stall_timeout=stall_timeout,
+                                            startup_timeout=startup_timeout,
+                                            input_stalled=lambda: self.watchdog is not None
+                                            and WRITER_STALLED in self.watchdog.active)
+        self.supervisor.attach(self.ffmpeg_streamer.process)
+        self.ffmpeg_streamer.supervisor = self.supervisor
+        self.supervisor.progressed()  # 最初のパケットは確認済み
+        self.supervisor.start()
+    
+    def _start_pipe_watchdog(self, watchdog_action, size, background_video, encoder_options: dict,
+                             own_clock: bool):
+        """書き手 = 書いた（復旧待ちで書けなかった分も含む）フレーム数、読み手 = ffmpeg の frame="""
+        def restart_writer():
+            if not own_clock:
+                trace_log("描画は外部クロック側で止まっています（再起動しません）", "ERROR")
+                return
+            self._restart_render_thread(self._pipe_render_loop)
+        
+        def restart_encoder():
+            if self.supervisor is not None:
+                return  # エンコーダの再起動は EncoderSupervisor に任せる
+            trace_log("FFmpeg 再起動", "WARN")
+            with self._frame_lock:
+                frame = self._frame_no
+            self._relaunch_encoder(size, background_video, encoder_options, frame)
+        
+        options = {}
+        if self.idle_fps is not None:
+            # キープアライブの間はどちらも進まない。cfr 出力では ffmpeg が複製するので差も見ない
+            options = {"stall_seconds": max(2.0, 2 / self.idle_fps), "max_lag_seconds": None}
+        self._start_watchdog(watchdog_action, restart_writer, restart_encoder,
+                             writer_seq=lambda: self._frame_no + self.frames_lost,
+                             writer_blocked=lambda: self.ffmpeg_streamer.writing, **options)
+    
+    def _write_failed(self) -> bool:
+        """書き込み失敗。監視中なら復旧を待ってループを続ける（True）"""
+        if self.supervisor is None:
+            trace_log("FFmpegへの書き込み失敗", "ERROR")
+            return False
+        if self.frames_lost % self.fps == 0:  # 1秒分ごとに1回
+            trace_log(f"FFmpegへの書き込み失敗（再起動待ち、累計 {self.frames_lost} フレーム）", "WARN")
+        self.frames_lost += 1
+        return True
+    
+    def add_output(self, name: str, target: str):
+        """配信中に出力先を追加（エンコーダは再起動しない）"""
+        if self.fanout is None:
+            raise RuntimeError("ファンアウト配信中ではありません（start_pipe_stream(outputs=...)）")
+        return self.fanout.add_output(name, target)
+    
+    def remove_output(self, name: str):
+        return self.fanout.remove_output(name) if self.fanout else None
+    
+    def _await_first_packet(self, timeout: float = 10.0, primed: bool = False) -> bool:
+        """ffmpeg の最初のパケットを待ち、起動段階の所要時間を出力
+        
+        primed=True（外部クロック）なら待つ間は自分で render_tick() を回す。外部のクロックは配信開始後に
+        回り始めるため、入力が無いままだと ffmpeg は最初のパケットを出せない。
+        """
+        priming = threading.Event()
+        primer = None
+        if primed:
+            def prime():
+                while not priming.wait(1 / self.fps) and self.render_tick():
+                    pass
+            primer = threading.Thread(target=prime, daemon=True, name="prime-encoder")
+            primer.start()
+        try:
+            with self.startup.phase("ffmpeg_first_packet") as result:
+                result["ok"] = self.ffmpeg_streamer.wait_first_packet(timeout)
+        finally:
+            if primer is not None:
+                priming.set()
+                primer.join()  # 以降の render_tick は外部クロックだけが呼ぶ
+        summary = self.startup.summary()
+        phases = ", ".join(f"{p['phase']}={p['seconds'] * 1000:.0f}ms" for p in summary["phases"])
+        trace_log(f"起動完了まで {summary['total_seconds'] * 1000:.0f}ms ({phases})",
+                  "INFO" if result["ok"] else "ERROR")
+        return result["ok"]
+    
+    def _reset_render_state(self):
+        self._last_version = None
+        self._current_bytes = b""
+        self._last_write = time.perf_counter()
+        self._written_at = 0  # アイドルモードで最後に書いたフレームクロック位置
+    
+    def _render_next(self) -> bool:
+        """タイムラインを1フレーム進め、表情が変わっていれば描き直す（変わったら True）"""
+        self.timeline.advance()
+        snap = self.expression_state.snapshot()
+        if snap.version == self._last_version:
+            self.frames_skipped += 1
+            return False
+        with span("render_frame", version=snap.version):
+            self._current_bytes = self._frame_bytes(snap)
+        self._last_version = snap.version
+        self.frames_rendered += 1
+        return True
+    
+    def _write_frames(self, writes, changed: bool) -> bool:
+        """ffmpeg へ書く（アイドルモードなら間引く）。書き込みを続けられなければ False"""
+        if self.idle_fps is not None:
+            # 到着時刻がタイムスタンプになるので、変化かキープアライブの時だけ最新の1枚を書く
+            keepalive = max(1, round(self.fps / self.idle_fps))  # フレーム数
+            self.frames_idle += len(writes)
+            if writes and (changed or self.timeline.frame_no - self._written_at >= keepalive):
+                writes = writes[-1:]
+                self._written_at = self.timeline.frame_no
+                self.frames_idle -= 1
+            else:
+                writes = []
+        
+        for data in writes:
+            if not self.ffmpeg_streamer.write_frame(data) and not self._write_failed():
+                return False
+            with self._frame_lock:
+                self._frame_no += 1
+            now = time.perf_counter()
+            self.frame_times.record(now - self._last_write)
+            self._last_write = now
+        return True
+    
+    def _pipe_render_loop(self):
+        """同一プロセスで合成し ffmpeg の標準入力へ毎フレーム書き込む"""
+        self._reset_render_state()
+        decision = PaceDecision(1, 0)
+        self.pacer.start()
+        
+        while not self._stop_event.is_set():
+            if decision.skipped_clock:
+                self.timeline.advance(self.timeline.frame_no + decision.skipped_clock)
+            writes = [self._current_bytes] * decision.duplicate  # 複製分は直前フレームを再送
+            changed = False
+            for _ in range(decision.render):
+                changed = self._render_next() or changed
+                writes.append(self._current_bytes)
+            
+            if not self._write_frames(writes, changed):
+                return
+            decision = self.pacer.wait()
+    
+    def render_tick(self, skipped_clock: int = 0) -> bool:
+        """外部のフレームクロック（ChannelManager）用：1フレーム描いて書く。続けられなければ False
+
+        skipped_clock は前回から描けなかったフレーム数（タイムラインだけ進める）
+        """
+        if self._stop_event.is_set():
+            return False
+        if skipped_clock:
+            self.timeline.advance(self.timeline.frame_no + skipped_clock)
+        changed = self._render_next()
+        return self._write_frames([self._current_bytes], changed)
+    
+    def _frame_bytes(self, snap) -> bytes:
+        """スナップショットの1フレーム分（変換済みキャッシュがあればそこから）"""
+        if self.frame_cache is not None and not self.latency_marker:
+            return self.frame_cache.frame(snap.mouth, snap.eyes)
+        frame = self.compositor.compose_frame(snap.mouth, snap.eyes)
+        if self.latency_marker:
+            stamp(frame, snap.version)  # version ごとに違うのでキャッシュしない
+        if self.frame_cache is not None:
+            return self.frame_cache.convert(frame)
+        with REGISTRY.timer("encode"):
+            return frame.tobytes()
+    
+    def _publish_loop(self):
+        """別プロセスレンダラー用：フレームクロックでタイムラインを進め制御ブロックに公開"""
+        last_version = None
+        self.pacer.start()
+        
+        while not self._stop_event.is_set():
+            self.timeline.advance()
+            snap = self.expression_state.snapshot()
+            if snap.version != last_version:
+                self.render_process.publish(snap)
+                last_version = snap.version
+            
+            decision = self.pacer.wait()
+            if decision.skipped_clock or decision.render > 1:
+                self.timeline.advance(self.timeline.frame_no + decision.skipped_clock + decision.render - 1)
+    
+    def _feed_loop(self):
+        """フレームリングのスロットをそのまま ffmpeg の標準入力へ渡す"""
+        while not self._stop_event.is_set():
+            acquired = self.frame_ring.acquire_read(timeout=0.5)
+            if acquired is None:
+                continue
+            seq, view = acquired
+            ok = self.ffmpeg_streamer.write_frame(view)
+            view.release()
+            self.frame_ring.release_read(seq)
+            with self._frame_lock:
+                self._frame_no = seq + 1
+            if not ok and not self._write_failed():
+                break
+    
+    def frame_time_report(self) -> dict:
+        """フレーム間隔パーセンタイル（ms）。別プロセス時は停止時にワーカーから受け取った値"""
+        if self._last_frame_report.get("mode") == "out-of-process":
+            return dict(self._last_frame_report)
+        report = self.frame_times.summary()
+        report.update(mode="in-process", frames_rendered=self.frames_rendered,
+                      frames_skipped=self.frames_skipped, pacing=self.pacer.stats())
+        if self.idle_fps is not None:
+            report.update(idle_fps=self.idle_fps, frames_idle=self.frames_idle)
+        if self.frame_cache is not None:
+            report["frame_cache"] = self.frame_cache.stats()
+        report.update(self._last_frame_report)  # 停止時に付けた出力・エンコーダ監視の集計
+        return report
+    
+    def stage_report(self) -> dict:
+        """ステージ別所要時間（秒）の p50/p90/p99。別プロセス時はワーカー側の値も含む"""
+        report = REGISTRY.snapshot()
+        for stage, values in self._last_frame_report.get("stages", {}).items():
+            report[f"renderer_{stage}"] = values
+        return report
+    
+    def pacing_report(self) -> dict:
+        """遅延・破棄・複製カウンタと秒ごとのフレーム時間ヒストグラム"""
+        return {"stats": self.pacer.stats(), "histograms": self.pacer.histograms()}
+    
     def _generate_initial_streams(self):
         """3ストリーム初期化"""
         trace_log("3ストリーム初期フレーム生成開始")
@@ -118,66 +612,80 @@ class ZundamonAnimator:
         trace_log("3ストリーム初期フレーム生成完了")
     
     def _mouth_callback(self, is_speaking, amplitude_percent):
-        """口ストリーム更新"""
+        """口形イベント登録（次フレームで反映、描画はレンダーループが行う）"""
         target_mouth = "ほあー" if is_speaking else "むふ"
         
-        if target_mouth != self.current_mouth:
-            mouth_frame = self.compositor.create_mouth_part(target_mouth)
-            
-            with self._frame_lock:
-                frame_id = self._frame_no % 60
-                mouth_frame.save(os.path.join(self.mouth_dir, f"mouth_{frame_id:06d}.png"))
-                self._frame_no += 1
-            
-            self.current_mouth = target_mouth
-            trace_log(f"口ストリーム更新: {target_mouth} ({amplitude_percent:.1f}%)")
+        if target_mouth != self.expression_state.current_mouth:
+            self.timeline.schedule_in("mouth", target_mouth)
+            trace_log(f"口状態更新: {target_mouth} ({amplitude_percent:.1f}%)", "DEBUG")
+    
+    def _write_part(self, directory: str, prefix: str, frame):
+        with self._frame_lock:
+            frame_id = self._frame_no % 60
+            with REGISTRY.timer("encode"):
+                frame.save(os.path.join(directory, f"{prefix}_{frame_id:06d}.png"))
+            self._frame_no += 1
     
     def _eyes_render_loop(self):
-        """目ストリーム更新ループ"""
-        interval = 1.0 / self.fps
-        next_time = time.perf_counter()
+        """口・目ストリーム更新ループ（スナップショットの version が変わった時だけ描画）"""
+        last_version = self.expression_state.version
+        self.pacer.start()
         
         while not self._stop_event.is_set():
-            _, current_eyes = self.expression_state.get_current_expression()
+            self.timeline.advance()
+            snap = self.expression_state.snapshot()
             
-            if current_eyes != self.current_eyes:
-                eyes_frame = self.compositor.create_eyes_part(current_eyes)
+            if snap.version == last_version:
+                self.frames_skipped += 1
+            else:
+                last_version = snap.version
+                self.frames_rendered += 1
                 
-                with self._frame_lock:
-                    frame_id = self._frame_no % 60
-                    eyes_frame.save(os.path.join(self.eyes_dir, f"eyes_{frame_id:06d}.png"))
-                    self._frame_no += 1
+                if snap.mouth != self.current_mouth:
+                    with span("render_mouth_part", mouth=snap.mouth):
+                        self._write_part(self.mouth_dir, "mouth", self.compositor.create_mouth_part(snap.mouth))
+                    self.current_mouth = snap.mouth
+                    trace_log(f"口ストリーム更新: {snap.mouth}", "DEBUG")
                 
-                self.current_eyes = current_eyes
-                trace_log(f"目ストリーム更新: {current_eyes}")
+                if snap.eyes != self.current_eyes:
+                    with span("render_eyes_part", eyes=snap.eyes):
+                        self._write_part(self.eyes_dir, "eyes", self.compositor.create_eyes_part(snap.eyes))
+                    self.current_eyes = snap.eyes
+                    trace_log(f"目ストリーム更新: {snap.eyes}", "DEBUG")
             
-            next_time += interval
-            sleep_time = next_time - time.perf_counter()
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-            else:
-                next_time = time.perf_counter()
+            # 部品ファイルは状態変化時だけ書くので、遅延分はフレームクロックを進めるだけ
+            decision = self.pacer.wait()
+            if decision.skipped_clock or decision.render > 1:
+                self.timeline.advance(self.timeline.frame_no + decision.skipped_clock + decision.render - 1)
     
     def _start_workers(self):
         """音声処理ワーカー"""
         def speech_worker():
             while not self._stop_event.is_set():
                 try:
-                    text = self.speech_queue.get(timeout=0.5)
+                    item = self.speech_queue.get(timeout=0.5)
                 except queue.Empty:
                     continue
+                text = item.text
                 
                 if not text.strip():
                     self.speech_queue.task_done()
                     continue
                 
                 trace_log(f"音声生成: {text[:30]}...")
-                audio_data = self.voicevox.generate_voice(text)
+                with span("tts", "INFO", chars=len(text)):
+                    audio_data = self.voicevox.generate_voice(text)
                 
                 if audio_data:
+                    latency = time.monotonic() - item.enqueued_at
+                    self.speech_latency.record(latency)
+                    REGISTRY.observe("speech_latency", latency)
+                    if item.on_start:
+                        item.on_start()
                     self.expression_state.set_talking(True)
                     trace_log("音声再生開始（3ストリーム口パク）")
-                    self.audio_player.play_audio_data(audio_data, self._stop_event)
+                    with span("playback", "INFO", bytes=len(audio_data)):
+                        self.audio_player.play_audio_data(audio_data, self._stop_event)
                     self.expression_state.set_talking(False)
                     trace_log("音声再生完了")
                 
@@ -186,33 +694,81 @@ class ZundamonAnimator:
         self._speech_thread = threading.Thread(target=speech_worker, daemon=True)
         self._speech_thread.start()
     
-    def add_speech(self, text: str):
-        """音声追加"""
-        if text.strip():
-            self.speech_queue.put(text)
-            trace_log(f"音声追加: {text[:30]}...")
+    def add_speech(self, text: str, priority: str = "chat", on_start=None) -> bool:
+        """音声追加（priority: operator / superchat / chat、on_start は再生開始時に呼ばれる）。統合・破棄されたら False"""
+        if not text.strip():
+            return False
+        accepted = self.speech_queue.put(text, priority, on_start=on_start)
+        if accepted:
+            trace_log(f"音声追加[{priority}]: {text[:30]}...")
+        else:
+            trace_log(f"音声スキップ[{priority}]: {text[:30]}...", "DEBUG")
+        return accepted
     
     def change_expression(self, mouth: str = None, eyes: str = None):
         """表情変更"""
         if mouth:
-            self.expression_state.set_mouth(mouth)
+            self.timeline.schedule_in("mouth", mouth)
             trace_log(f"口変更: {mouth}")
         if eyes:
-            self.expression_state.set_eyes(eyes)
+            self.timeline.schedule_in("eyes", eyes)
             trace_log(f"目変更: {eyes}")
     
     def stop_stream(self):
         """配信停止"""
         trace_log("3ストリーム配信停止開始")
         self._stop_event.set()
+        if self.supervisor:
+            self.supervisor.stop()  # 停止中の ffmpeg を再起動させない
+        if self.watchdog:
+            self.watchdog.stop()
         
         self.blink_animator.stop()
         
         if self._render_thread:
             self._render_thread.join(timeout=2.0)
         
+        if self.render_process:
+            report = self.render_process.stop()
+            report["mode"] = "out-of-process"
+            self._last_frame_report = report
+            self.render_process = None
+        if self.frame_ring:
+            if self._feed_thread:
+                self._feed_thread.join(timeout=2.0)
+                self._feed_thread = None
+            ring_stats = self.frame_ring.stats()
+            self._last_frame_report["ring"] = ring_stats
+            trace_log(f"フレームリング: {ring_stats}")
+            self.frame_ring.close(unlink=True)
+            self.frame_ring = None
+        report = self.frame_time_report()
+        if report.get("count"):
+            trace_log("フレーム間隔[{mode}]: p50={p50:.2f}ms p95={p95:.2f}ms "
+                      "p99={p99:.2f}ms max={max:.2f}ms".format(**report))
+        
         self.ffmpeg_streamer.stop()
+        if self.supervisor:
+            encoder = dict(self.supervisor.summary(), frames_lost=self.frames_lost)
+            self._last_frame_report["encoder"] = encoder
+            trace_log(f"エンコーダ監視: {encoder}")
+            self.ffmpeg_streamer.supervisor = None
+            self.supervisor = None
+        if self.watchdog:
+            watchdog = self.watchdog.summary()
+            self._last_frame_report["watchdog"] = watchdog
+            trace_log(f"ウォッチドッグ: {watchdog}")
+            self.watchdog = None
+        if self.fanout:
+            outputs = self.fanout.stats()
+            self._last_frame_report["outputs"] = outputs
+            trace_log(f"出力: {outputs}")
+            self.fanout.stop()
+            self.fanout = None
         self.rtmp_server.stop()
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
         
         trace_log("3ストリーム配信停止完了")
     
@@ -0,0 +1,249 @@
+"""複数チャンネル配信 - 1プロセスで N 体のアニメーターを共有アセット・共有ワーカーで動かす
+
+ZundamonAnimator を単独で動かすと、インスタンスごとに PNG 索引・デコード済みレイヤー・
+RTMP サーバ・レンダースレッドを持つ。ChannelManager は
+
+    共有   ImageCompositor（索引・デコード済みレイヤー・ベース画像、読み取り専用）
+           RTMP サーバ（ストリームキーだけ差し替える）
+           フレームクロック1本 + ワーカープール
+    個別   表情状態・タイムライン・発話キュー・ffmpeg（出力）・変換済みフレームキャッシュ
+
+に分け、フレームクロックごとに各チャンネルの render_tick() をプールへ投げる。
+前の tick が終わっていないチャンネルはその回を飛ばし（タイムラインは次回まとめて進める）、
+1チャンネルの遅れが他に波及しないようにする。
+
+    manager = ChannelManager("assets/zundamon", fps=30, workers=4)
+    manager.add_channel("main")
+    manager.add_channel("sub", stream_key="sub-stream", frame_format="yuv420p")
+    manager.channel("sub").add_speech("こんにちはなのだ")
+    manager.stats()
+    manager.stop()
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from ..image.compositor import ImageCompositor
+from ..rtmp.server import create_server
+from ..utils.metrics import REGISTRY, cpu_seconds, rss_bytes
+from ..utils.trace import trace_log
+from .animator import ZundamonAnimator
+from .pacing import FramePacer, PaceDecision
+
+
+class SharedRTMPServer:
+    """1つの RTMP サーバを複数チャンネルで使う。起動・停止は参照カウント"""
+
+    def __init__(self, server):
+        self.server = server
+        self.users = 0
+        self._lock = threading.Lock()
+
+    def endpoint(self, stream_key: str) -> "ChannelEndpoint":
+        return ChannelEndpoint(self, stream_key)
+
+    def url_for(self, stream_key: str) -> str:
+        return self.server.rtmp_url.rsplit("/", 1)[0] + "/" + stream_key
+
+    def acquire(self, report=None, timeout: float = 15.0) -> bool:
+        with self._lock:
+            if self.users == 0 and not self.server.start(report, timeout):
+                return False
+            self.users += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            if self.users == 0:
+                return
+            self.users -= 1
+            if self.users == 0:
+                self.server.stop()
+
+
+class ChannelEndpoint:
+    """チャンネルから見た RTMP サーバ（start / stop / rtmp_url を持つので rtmp_server に渡せる）"""
+
+    def __init__(self, shared: SharedRTMPServer, stream_key: str):
+        self.shared = shared
+        self.stream_key = stream_key
+        self.startup = None
+        self._started = False
+
+    @property
+    def rtmp_url(self) -> str:
+        return self.shared.url_for(self.stream_key)
+
+    def start(self, report=None, timeout: float = 15.0) -> bool:
+        self.startup = report
+        if not self._started:
+            self._started = self.shared.acquire(report, timeout)
+        return self._started
+
+    def stop(self):
+        if self._started:
+            self._started = False
+            self.shared.release()
+
+
+class Channel:
+    """1チャンネル分のアニメーターと tick の実績"""
+
+    def __init__(self, name: str, animator: ZundamonAnimator):
+        self.name = name
+        self.animator = animator
+        self.added_at = time.monotonic()
+        self.future: Optional[Future] = None
+        self.pending_clock = 0  # 飛ばした tick の分（次の tick でタイムラインを進める）
+        self.ended = False
+        self.stats = {"ticks": 0, "skipped_ticks": 0, "errors": 0, "render_cpu_seconds": 0.0}
+
+    @property
+    def busy(self) -> bool:
+        return self.future is not None and not self.future.done()
+
+    def tick(self, skipped_clock: int):
+        """ワーカースレッド上で1フレーム。CPU 時間はこのスレッドの分だけ数える"""
+        t0 = time.thread_time()
+        try:
+            if not self.animator.render_tick(skipped_clock):
+                self.ended = True
+        except Exception as e:
+            self.stats["errors"] += 1
+            trace_log(f"チャンネル {self.name} 描画例外: {e}", "ERROR")
+        self.stats["ticks"] += 1
+        self.stats["render_cpu_seconds"] += time.thread_time() - t0
+
+    def summary(self) -> Dict:
+        animator = self.animator
+        process = getattr(animator.ffmpeg_streamer, "process", None)
+        pid = process.pid if process is not None and process.poll() is None else None
+        elapsed = time.monotonic() - self.added_at
+        cache = animator.frame_cache.stats() if animator.frame_cache else None
+        return {
+            **self.stats,
+            "stream_url": animator.rtmp_server.rtmp_url,
+            "frames_written": animator._frame_no,
+            "frames_rendered": animator.frames_rendered,
+            "render_cpu_percent": self.stats["render_cpu_seconds"] / elapsed * 100 if elapsed else 0.0,
+            "encoder_cpu_seconds": cpu_seconds(pid) if pid else None,
+            "encoder_rss_bytes": rss_bytes(pid) if pid else None,
+            "frame_cache_bytes": cache["bytes"] if cache else 0,
+            "frame_bytes": len(animator._current_bytes),
+            "ended": self.ended,
+        }
+
+
+class ChannelManager:
+    def __init__(self, layer_dir: str = "assets/zundamon", fps: int = 30, workers: int = None,
+                 rtmp_server=None, audio_player_factory: Optional[Callable[[], object]] = None,
+                 voicevox_url: str = None):
+        """audio_player_factory はチャンネルごとの再生器を作る（省略時は AudioPlayer）"""
+        trace_log("ChannelManager初期化開始")
+        self.layer_dir = layer_dir
+        self.fps = fps
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.audio_player_factory = audio_player_factory
+        self.voicevox_url = voicevox_url
+        self.compositor = ImageCompositor(layer_dir)
+        self.compositor.warm_up()
+        self.server = SharedRTMPServer(rtmp_server or create_server())
+        self.pacer = FramePacer(fps, "drop")
+        self.channels: Dict[str, Channel] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="channel")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        trace_log(f"ChannelManager初期化完了（ワーカー {self.workers}）")
+
+    def channel(self, name: str) -> Optional[ZundamonAnimator]:
+        entry = self.channels.get(name)
+        return entry.animator if entry else None
+
+    def add_channel(self, name: str, stream_key: str = None, **stream_options) -> Optional[ZundamonAnimator]:
+        """チャンネル追加。stream_options は start_pipe_stream の引数（own_clock 以外）"""
+        if name in self.channels:
+            trace_log(f"チャンネル重複: {name}", "ERROR")
+            return None
+        player = self.audio_player_factory() if self.audio_player_factory else None
+        animator = ZundamonAnimator(self.layer_dir, self.fps, voicevox_url=self.voicevox_url,
+                                    audio_player=player, rtmp_server=self.server.endpoint(stream_key or name),
+                                    compositor=self.compositor)
+        if not animator.start_pipe_stream(own_clock=False, **stream_options):
+            trace_log(f"チャンネル {name} 開始失敗", "ERROR")
+            animator.stop_stream()
+            return None
+        with self._lock:
+            self.channels[name] = Channel(name, animator)
+            REGISTRY.set_gauge("channels", len(self.channels))
+        if self._thread is None:
+            self._start_clock()
+        trace_log(f"チャンネル追加: {name} → {animator.rtmp_server.rtmp_url}")
+        return animator
+
+    def remove_channel(self, name: str) -> Optional[Dict]:
+        """チャンネルを止めて外す。最後の集計を返す"""
+        with self._lock:
+            # tick の投入も同じロック内なので、外した後に新しい tick は入らない（残るのは実行中の1回だけ）
+            entry = self.channels.pop(name, None)
+            REGISTRY.set_gauge("channels", len(self.channels))
+        if entry is None:
+            return None
+        if entry.future is not None:
+            entry.future.result()
+        summary = entry.summary()
+        entry.animator.stop_stream()
+        trace_log(f"チャンネル削除: {name} {summary}")
+        return summary
+
+    def _start_clock(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._clock_loop, daemon=True, name="channel-clock")
+        self._thread.start()
+
+    def _dispatch(self, entry: Channel, skipped_clock: int):
+        """_lock 内で呼ぶ（remove_channel と排他）"""
+        if entry.ended:
+            return
+        if entry.busy:
+            entry.stats["skipped_ticks"] += 1
+            entry.pending_clock += 1 + skipped_clock
+            return
+        skipped_clock += entry.pending_clock
+        entry.pending_clock = 0
+        entry.future = self._pool.submit(entry.tick, skipped_clock)
+
+    def _clock_loop(self):
+        """全チャンネル共通のフレームクロック"""
+        decision = PaceDecision(1, 0)
+        self.pacer.start()
+        while not self._stop.is_set():
+            with self._lock:
+                for entry in self.channels.values():
+                    self._dispatch(entry, decision.skipped_clock)
+            decision = self.pacer.wait()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = list(self.channels.values())
+        return {
+            "channels": {entry.name: entry.summary() for entry in entries},
+            "workers": self.workers,
+            "shared_assets": self.compositor.cache.stats(),
+            "process_rss_bytes": rss_bytes(),
+            "process_cpu_seconds": cpu_seconds(),
+            "threads": threading.active_count(),
+            "clock": {"late_frames": self.pacer.late_frames, "dropped_frames": self.pacer.dropped_frames},
+        }
+
+    def stop(self) -> Dict:
+        """全チャンネル停止。各チャンネルの最後の集計を返す"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        summaries = {name: self.remove_channel(name) for name in list(self.channels)}
+        self._pool.shutdown(wait=True)
+        return summaries
@@ -0,0 +1,152 @@
+"""共有メモリのフレームリング - レンダラーとエンコーダー供給側の受け渡し
+
+事前確保したフレームスロットを multiprocessing.shared_memory に置き、
+合成側はスロットへ直接書き込み、供給側はスロットの memoryview をそのまま
+ffmpeg のパイプへ渡す（pickle もコピーもしない）。
+メタデータ（シーケンス番号・カウンタ）の更新だけをプロセス間ロックで守る。
+
+満杯時のポリシー:
+    overwrite: 未読の最新フレームを新フレームで置き換える（常に最新を送る。読み出し中のスロットは守る）
+    drop:      新しいフレームを破棄（書かれた順に全て送る）
+"""
+import multiprocessing as mp
+import struct
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+POLICIES = ("overwrite", "drop")
+_NONE = 0xFFFFFFFFFFFFFFFF
+# write_seq, read_seq, reading_seq, written, read, dropped, overwritten
+_HEADER = struct.Struct("<7Q")
+_U64 = struct.Struct("<Q")
+_ALIGN = 64
+
+
+class FrameRing:
+    def __init__(self, slot_size: int, slots: int = 8, policy: str = "overwrite",
+                 name: Optional[str] = None, cond=None):
+        if policy not in POLICIES:
+            raise ValueError(f"未知のポリシー: {policy}")
+        self.slot_size = slot_size
+        self.slots = slots
+        self.policy = policy
+        self._slot_seq_offset = _HEADER.size
+        data_offset = _HEADER.size + _U64.size * slots
+        self._data_offset = data_offset + (-data_offset % _ALIGN)
+        size = self._data_offset + slot_size * slots
+
+        create = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self.name = self.shm.name
+        self.cond = cond if cond is not None else mp.get_context("spawn").Condition()
+        if create:
+            _HEADER.pack_into(self.shm.buf, 0, 0, 0, _NONE, 0, 0, 0, 0)
+            for i in range(slots):
+                _U64.pack_into(self.shm.buf, self._slot_seq_offset + i * _U64.size, _NONE)
+
+    def attach_args(self) -> tuple:
+        """子プロセスで FrameRing.attach(*args) するための引数"""
+        return (self.slot_size, self.slots, self.policy, self.name, self.cond)
+
+    @classmethod
+    def attach(cls, slot_size: int, slots: int, policy: str, name: str, cond) -> "FrameRing":
+        return cls(slot_size, slots, policy, name=name, cond=cond)
+
+    # ---------- 内部 ----------
+    def _header(self) -> list:
+        return list(_HEADER.unpack_from(self.shm.buf, 0))
+
+    def _set_header(self, h: list):
+        _HEADER.pack_into(self.shm.buf, 0, *h)
+
+    def _set_slot_seq(self, seq: int, value: int):
+        _U64.pack_into(self.shm.buf, self._slot_seq_offset + (seq % self.slots) * _U64.size, value)
+
+    def slot(self, seq: int) -> memoryview:
+        start = self._data_offset + (seq % self.slots) * self.slot_size
+        return self.shm.buf[start:start + self.slot_size]
+
+    # ---------- 書き込み側（レンダラー） ----------
+    def begin_write(self) -> Optional[Tuple[int, memoryview]]:
+        """書き込み先スロットを確保。満杯で破棄する場合は None"""
+        with self.cond:
+            h = self._header()
+            write_seq, read_seq, reading_seq = h[0], h[1], h[2]
+            seq = write_seq
+            if write_seq - read_seq >= self.slots:
+                seq = write_seq - 1
+                if self.policy == "drop" or seq == reading_seq:
+                    h[5] += 1
+                    self._set_header(h)
+                    return None
+                h[6] += 1  # 未読の最新フレームを同じシーケンス番号のまま置き換える
+                self._set_header(h)
+            self._set_slot_seq(seq, _NONE)
+        return seq, self.slot(seq)
+
+    def commit_write(self, seq: int):
+        with self.cond:
+            h = self._header()
+            self._set_slot_seq(seq, seq)
+            h[0] = max(h[0], seq + 1)
+            h[3] += 1
+            self._set_header(h)
+            self.cond.notify_all()
+
+    def write(self, data) -> Optional[int]:
+        """data をスロットへ1回コピーして公開。破棄されたら None"""
+        acquired = self.begin_write()
+        if acquired is None:
+            return None
+        seq, view = acquired
+        view[:len(data)] = data
+        view.release()
+        self.commit_write(seq)
+        return seq
+
+    # ---------- 読み出し側（エンコーダー供給） ----------
+    def acquire_read(self, timeout: Optional[float] = None) -> Optional[Tuple[int, memoryview]]:
+        """次の未読フレームを貸し出す（release_read まで上書きされない）"""
+        with self.cond:
+            if not self.cond.wait_for(self._readable, timeout):
+                return None
+            h = self._header()
+            seq = h[1]
+            h[2] = seq
+            self._set_header(h)
+        return seq, self.slot(seq)
+
+    def _readable(self) -> bool:
+        write_seq, read_seq = _HEADER.unpack_from(self.shm.buf, 0)[:2]
+        if read_seq >= write_seq:
+            return False
+        offset = self._slot_seq_offset + (read_seq % self.slots) * _U64.size
+        return _U64.unpack_from(self.shm.buf, offset)[0] == read_seq  # 置き換え中は待つ
+
+    def release_read(self, seq: int):
+        with self.cond:
+            h = self._header()
+            h[1] = max(h[1], seq + 1)
+            h[2] = _NONE
+            h[4] += 1
+            self._set_header(h)
+
+    # ---------- 統計 ----------
+    def stats(self) -> Dict[str, int]:
+        with self.cond:
+            write_seq, read_seq, _, written, read, dropped, overwritten = self._header()
+        return {
+            "slots": self.slots,
+            "occupancy": write_seq - read_seq,
+            "write_seq": write_seq,
+            "read_seq": read_seq,
+            "written": written,
+            "read": read,
+            "dropped": dropped,
+            "overwritten": overwritten,
+        }
+
+    def close(self, unlink: bool = False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
@@ -0,0 +1,109 @@
+"""フレームペーシング - 遅延時の方針と計測
+
+レンダーループは1フレーム出すごとに FramePacer.wait() を呼ぶ。
+締め切りに間に合っていれば次の締め切りまで眠り、遅れていれば方針に従って
+何フレームを「新規描画」「前フレーム複製」するかを返す。
+
+    drop:      遅れた分のフレームを捨てる（グリッドは維持）
+    duplicate: 遅れた分だけ直前のフレームを複製して出力数を実時間に合わせる
+    burst:     遅れた分を新規描画で連続出力して追いつく（max_burst 超過分は捨てる）
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple
+
+POLICIES = ("drop", "duplicate", "burst")
+HISTOGRAM_BOUNDS_MS = (8, 17, 25, 35, 50, 67, 100, 200)
+
+class PaceDecision(NamedTuple):
+    render: int       # 新規に描画して出すフレーム数
+    duplicate: int    # 直前フレームを複製して出す数
+    dropped: int = 0  # 捨てたフレーム数（フレームクロックはこの分も進める）
+
+    @property
+    def skipped_clock(self) -> int:
+        """新規描画以外で経過したフレーム数"""
+        return self.duplicate + self.dropped
+
+class FramePacer:
+    def __init__(self, fps: int, policy: str = "drop", max_burst: int = 5, history_seconds: int = 60):
+        if policy not in POLICIES:
+            raise ValueError(f"未知のペーシング方針: {policy}")
+        self.interval = 1.0 / fps
+        self.policy = policy
+        self.max_burst = max_burst
+        self.late_frames = 0
+        self.dropped_frames = 0
+        self.duplicated_frames = 0
+        self.max_lateness = 0.0
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history_seconds)  # (秒, バケット数リスト)
+        self._current_second = None
+        self._current_counts = None
+        self._next_time = None
+        self._last_tick = None
+
+    def start(self):
+        self._next_time = self._last_tick = time.perf_counter()
+
+    def _record_frame_time(self, frame_time: float):
+        second = int(time.time())
+        ms = frame_time * 1000
+        bucket = next((i for i, b in enumerate(HISTOGRAM_BOUNDS_MS) if ms <= b), len(HISTOGRAM_BOUNDS_MS))
+        with self._lock:
+            if second != self._current_second:
+                if self._current_counts is not None:
+                    self._history.append((self._current_second, self._current_counts))
+                self._current_second = second
+                self._current_counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+            self._current_counts[bucket] += 1
+
+    def wait(self) -> PaceDecision:
+        """次フレームの締め切りまで待ち、出力すべきフレーム数を返す"""
+        if self._next_time is None:
+            self.start()
+        self._next_time += self.interval
+        sleep_time = self._next_time - time.perf_counter()
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+
+        now = time.perf_counter()
+        self._record_frame_time(now - self._last_tick)
+        self._last_tick = now
+
+        lateness = now - self._next_time
+        missed = int(lateness / self.interval) if lateness > 0 else 0
+        if missed == 0:
+            return PaceDecision(1, 0)
+
+        self.late_frames += 1
+        self.max_lateness = max(self.max_lateness, lateness)
+        self._next_time += missed * self.interval  # グリッドを保ったまま追いつく
+        if self.policy == "duplicate":
+            self.duplicated_frames += missed
+            return PaceDecision(1, missed)
+        if self.policy == "burst":
+            burst = min(missed, self.max_burst)
+            self.dropped_frames += missed - burst
+            return PaceDecision(1 + burst, 0, missed - burst)
+        self.dropped_frames += missed
+        return PaceDecision(1, 0, missed)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "policy": self.policy,
+            "late_frames": self.late_frames,
+            "dropped_frames": self.dropped_frames,
+            "duplicated_frames": self.duplicated_frames,
+            "max_lateness_ms": self.max_lateness * 1000,
+        }
+
+    def histograms(self) -> List[Dict]:
+        """秒ごとのフレーム時間ヒストグラム（古い順、集計中の秒を含む）"""
+        labels = [f"<={b}ms" for b in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}ms"]
+        with self._lock:
+            rows = list(self._history)
+            if self._current_counts is not None:
+                rows.append((self._current_second, list(self._current_counts)))
+        return [{"second": sec, "buckets": dict(zip(labels, counts))} for sec, counts in rows]
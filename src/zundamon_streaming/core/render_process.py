@@ -0,0 +1,237 @@
+"""別プロセスレンダラー - 合成とフレーム出力をGIL競合から切り離す
+
+親プロセス（音声・VOICEVOX・ログ読み取りスレッド）は表情スナップショットを
+共有メモリの小さな制御ブロックに書くだけで、合成と ffmpeg への書き込みは
+専用のワーカープロセスが行う。フレームリングを渡した場合、ワーカーは
+共有メモリのスロットへ書き、ffmpeg への供給は親プロセス側が行う。
+"""
+import multiprocessing as mp
+import struct
+import subprocess
+import time
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+
+from ..utils.metrics import FrameTimeStats, REGISTRY
+from ..utils.trace import span
+from .frame_ring import FrameRing
+from .pacing import FramePacer, PaceDecision
+
+# seq, version, talking, stop, mouth, eyes
+_CONTROL = struct.Struct("<QQBB64s64s")
+_SEQ = struct.Struct("<Q")
+
+
+def _encode_name(name: str) -> bytes:
+    data = name.encode("utf-8")
+    if len(data) > 64:
+        raise ValueError(f"表情名が長すぎます: {name}")
+    return data
+
+
+class ExpressionControlBlock:
+    """表情状態の共有メモリ制御ブロック（書き手1つの seqlock）"""
+
+    def __init__(self, name: Optional[str] = None):
+        create = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=_CONTROL.size)
+        if create:
+            self.shm.buf[:_CONTROL.size] = bytes(_CONTROL.size)
+        self.name = self.shm.name
+
+    def _write(self, version: int, talking: bool, stop: bool, mouth: str, eyes: str):
+        buf = self.shm.buf
+        seq = _SEQ.unpack_from(buf, 0)[0]
+        _SEQ.pack_into(buf, 0, seq + 1)  # 奇数 = 書き込み中
+        _CONTROL.pack_into(buf, 0, seq + 1, version, int(talking), int(stop),
+                           _encode_name(mouth), _encode_name(eyes))
+        _SEQ.pack_into(buf, 0, seq + 2)
+
+    def publish(self, snap):
+        """ExpressionSnapshot を書き込む"""
+        self._write(snap.version, snap.is_talking, False, snap.mouth, snap.eyes)
+
+    def request_stop(self):
+        _, version, talking, _, mouth, eyes = self.read()
+        self._write(version, talking, True, mouth, eyes)
+
+    def read(self, timeout: float = 1.0):
+        """(seq, version, talking, stop, mouth, eyes) を一貫した状態で読む
+
+        書き込み中なら譲って読み直す。timeout 秒読めなければ（書き手が書き込み途中で
+        落ちた等）TimeoutError。
+        """
+        buf = self.shm.buf
+        deadline = None
+        while True:
+            seq1, version, talking, stop, mouth, eyes = _CONTROL.unpack_from(buf, 0)
+            if seq1 % 2 == 0 and _SEQ.unpack_from(buf, 0)[0] == seq1:
+                return (seq1, version, bool(talking), bool(stop),
+                        mouth.rstrip(b"\0").decode("utf-8"), eyes.rstrip(b"\0").decode("utf-8"))
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + timeout
+            elif now > deadline:
+                raise TimeoutError("制御ブロックが書き込み中のまま")
+            time.sleep(0)
+
+    def close(self, unlink: bool = False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _render_main(layer_dir: str, fps: int, control_name: str, rtmp_url: str,
+                 background_video: Optional[str], result_conn, ring_args: Optional[tuple] = None,
+                 pacing_policy: str = "drop", encoder_options: Optional[Dict[str, str]] = None,
+                 latency_marker: bool = False):
+    """ワーカープロセス本体：制御ブロックを見て合成し ffmpeg（またはフレームリング）に書き込む
+
+    親プロセスが落ちたら（停止要求を書けずに終わったら）毎フレームの確認で気づいて終了する。
+    """
+    from ..image.compositor import ImageCompositor
+    from ..image.marker import stamp
+    from ..rtmp.ffmpeg import build_rawvideo_cmd
+
+    parent = mp.parent_process()
+    control = ExpressionControlBlock(control_name)
+    compositor = ImageCompositor(layer_dir)
+    compositor.warm_up()
+    ring = FrameRing.attach(*ring_args) if ring_args else None
+    process = None
+    if ring is None:
+        cmd = build_rawvideo_cmd(compositor.base_image.size, rtmp_url, fps, background_video,
+                                 **(encoder_options or {}))
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    stats = FrameTimeStats()
+    pacer = FramePacer(fps, pacing_policy)
+    last_version = None
+    frame_bytes = b""
+    rendered = skipped = 0
+    decision = PaceDecision(1, 0)
+    last_write = time.perf_counter()
+    pacer.start()
+    try:
+        stop = False
+        while not stop:
+            if parent is not None and not parent.is_alive():
+                break  # 親が落ちた。固まった絵を配信し続けない
+            try:
+                _, version, _, stop, mouth, eyes = control.read()
+            except TimeoutError:
+                continue  # 親の生存確認からやり直す
+            if stop:
+                break
+            if version != last_version:
+                with span("render_frame", version=version):
+                    frame = compositor.compose_frame(mouth, eyes)
+                    if latency_marker:
+                        stamp(frame, version)
+                    with REGISTRY.timer("encode"):
+                        frame_bytes = frame.tobytes()
+                last_version = version
+                rendered += 1
+            else:
+                skipped += 1
+            # 制御ブロックは最新状態しか持たないので、複製も追いつき分も同じフレームを出す
+            for _ in range(decision.render + decision.duplicate):
+                write_start = time.perf_counter()
+                if ring is not None:
+                    ring.write(frame_bytes)
+                else:
+                    try:
+                        process.stdin.write(frame_bytes)
+                    except (BrokenPipeError, OSError):
+                        stop = True
+                        break
+                REGISTRY.observe("write", time.perf_counter() - write_start)
+                now = time.perf_counter()
+                stats.record(now - last_write)
+                last_write = now
+
+            decision = pacer.wait()
+    finally:
+        if process is not None:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if ring is not None:
+            ring.close()
+        control.close()
+        summary = stats.summary()
+        summary.update(frames_rendered=rendered, frames_skipped=skipped, pacing=pacer.stats(),
+                       stages=REGISTRY.snapshot())
+        try:
+            result_conn.send(summary)
+        except OSError:
+            pass  # 親が落ちている
+        result_conn.close()
+
+
+class RenderProcess:
+    """合成 + フレーム出力を担当するワーカープロセスの親側ハンドル"""
+
+    def __init__(self, layer_dir: str, fps: int, rtmp_url: str, background_video: Optional[str] = None,
+                 ring: Optional[FrameRing] = None, pacing_policy: str = "drop",
+                 encoder_options: Optional[Dict[str, str]] = None, latency_marker: bool = False):
+        self.layer_dir = layer_dir
+        self.fps = fps
+        self.rtmp_url = rtmp_url
+        self.background_video = background_video
+        self.ring = ring
+        self.pacing_policy = pacing_policy
+        self.encoder_options = encoder_options
+        self.latency_marker = latency_marker
+        self.control = None
+        self._process = None
+        self._result_conn = None
+
+    def start(self, snap):
+        ctx = mp.get_context("spawn")
+        self.control = ExpressionControlBlock()
+        self.control.publish(snap)
+        self._result_conn, child_conn = ctx.Pipe(duplex=False)
+        self._process = ctx.Process(
+            target=_render_main,
+            args=(self.layer_dir, self.fps, self.control.name, self.rtmp_url,
+                  self.background_video, child_conn,
+                  self.ring.attach_args() if self.ring else None, self.pacing_policy,
+                  self.encoder_options, self.latency_marker),
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+
+    def publish(self, snap):
+        if self.control:
+            self.control.publish(snap)
+
+    def is_alive(self) -> bool:
+        return bool(self._process and self._process.is_alive())
+
+    def stop(self, timeout: float = 10.0) -> Dict[str, float]:
+        """停止してワーカー側のフレーム時間統計を返す"""
+        summary = {}
+        if not self._process:
+            return summary
+        self.control.request_stop()
+        if self._result_conn.poll(timeout):
+            try:
+                summary = self._result_conn.recv()
+            except EOFError:
+                pass
+        self._process.join(timeout=2.0)
+        if self._process.is_alive():
+            self._process.terminate()
+        self.control.close(unlink=True)
+        self._process = None
+        self.control = None
+        return summary
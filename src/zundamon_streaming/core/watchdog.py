@@ -0,0 +1,146 @@
+"""書き手・読み手の停止検出 - レンダラーの出力番号と ffmpeg の消費フレーム数を突き合わせる
+
+3ストリーム配信では ffmpeg が 60 枚の部品 PNG を -stream_loop でループ再生し、
+Python 側が上書きする。どちらかが止まっても画面が固まるだけでエラーにならないため、
+
+    writer_seq()  レンダラーが進めたフレーム番号（フレームクロック）
+    reader_seq()  ffmpeg の進捗行の frame=（エンコーダが消費したフレーム数）
+
+を一定間隔で比べ、片方だけ進まない・差が開きすぎたら警告して action を呼ぶ。
+差（writer - reader、開始時点を 0 とするフレーム数）はゲージ stream_lag_frames に出す。
+
+パイプ配信・連番 PNG（image2）のように読み手が書き手の出力だけを読む構成では、片方が止まると
+もう片方もすぐ止まる。writer_blocked()（書き手が読み手の消費待ちでブロック中か）を渡すと、
+両方止まった時に「書き手が読み手待ち → 読み手の停止、そうでなければ書き手の停止」と判定する。
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+from ..utils.metrics import REGISTRY
+from ..utils.trace import trace_log
+
+WRITER_STALLED = "writer_stalled"
+READER_STALLED = "reader_stalled"
+LAG = "lag"
+
+
+class StreamWatchdog:
+    def __init__(self, writer_seq: Callable[[], int], reader_seq: Callable[[], int], fps: int = 30,
+                 stall_seconds: float = 2.0, max_lag_seconds: Optional[float] = 3.0, check_interval: float = 0.5,
+                 action: Optional[Callable[[str], None]] = None, on_alert: Optional[Callable[[Dict], None]] = None,
+                 writer_blocked: Optional[Callable[[], bool]] = None):
+        """action(kind) は警告の初回に一度だけ呼ばれる復旧処理、on_alert(alert) は通知先
+        
+        writer_blocked は読み手が書き手に追従する構成でだけ渡す（None なら両方停止 = 一時停止）
+        """
+        self.writer_seq = writer_seq
+        self.reader_seq = reader_seq
+        self.fps = fps
+        self.stall_seconds = stall_seconds
+        self.max_lag_frames = int(max_lag_seconds * fps) if max_lag_seconds is not None else None  # None = 差は見ない
+        self.check_interval = check_interval
+        self.action = action
+        self.on_alert = on_alert
+        self.writer_blocked = writer_blocked
+        self.alerts: Deque[Dict] = deque(maxlen=100)
+        self.active: Dict[str, float] = {}  # 継続中の警告 → 開始時刻
+        self.stats = {"checks": 0, "alerts": 0, "actions": 0, "max_lag_frames": 0}
+        self.lag = 0
+        self._base = (0, 0)
+        self._last = {"writer": (0, 0.0), "reader": (0, 0.0)}  # 値, 最後に進んだ時刻
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def rebase(self):
+        """現在の値を差 0 の基準にする（ffmpeg 再起動などでカウンタが戻った時）"""
+        now = time.monotonic()
+        writer, reader = self.writer_seq(), self.reader_seq()
+        self._base = (writer, reader)
+        self._last = {"writer": (writer, now), "reader": (reader, now)}
+
+    def _advanced(self, side: str, value: int, now: float) -> float:
+        """side が最後に進んでからの秒数"""
+        last_value, last_time = self._last[side]
+        if value != last_value:
+            self._last[side] = (value, now)
+            return 0.0
+        return now - last_time
+
+    def check(self) -> Dict[str, bool]:
+        """1回分の判定。{種別: 異常か}"""
+        now = time.monotonic()
+        writer, reader = self.writer_seq(), self.reader_seq()
+        if reader < self._last["reader"][0] or writer < self._last["writer"][0]:
+            self.rebase()
+            return {}
+        self.stats["checks"] += 1
+        self.lag = (writer - self._base[0]) - (reader - self._base[1])
+        self.stats["max_lag_frames"] = max(self.stats["max_lag_frames"], abs(self.lag))
+        REGISTRY.set_gauge("stream_lag_frames", self.lag)
+        writer_idle = self._advanced("writer", writer, now)
+        reader_idle = self._advanced("reader", reader, now)
+        writer_stalled = writer_idle > self.stall_seconds
+        reader_stalled = reader_idle > self.stall_seconds
+        if self.writer_blocked is None:
+            # 両方止まっているのは停止中（配信終了・一時停止）とみなす
+            state = {WRITER_STALLED: writer_stalled and not reader_stalled,
+                     READER_STALLED: reader_stalled and not writer_stalled}
+        else:
+            # 書き手が読み手待ちで止まっているなら原因は読み手、そうでなければ書き手
+            blocked = writer_stalled and self.writer_blocked()
+            state = {WRITER_STALLED: writer_stalled and not blocked,
+                     READER_STALLED: reader_stalled and (blocked or not writer_stalled)}
+        state[LAG] = self.max_lag_frames is not None and abs(self.lag) > self.max_lag_frames
+        # 停止の警告は止まった側が実際に進むまで続いている扱い（1回の停止で action は1回）
+        recovered = {
+            WRITER_STALLED: writer_idle == 0.0,
+            READER_STALLED: reader_idle == 0.0,
+            LAG: not state[LAG],
+        }
+        for kind, bad in state.items():
+            if bad and kind not in self.active:
+                self._alert(kind, now, writer=writer, reader=reader, lag_frames=self.lag)
+            elif recovered[kind] and kind in self.active:
+                started = self.active.pop(kind)
+                trace_log(f"ウォッチドッグ回復: {kind}（{now - started:.1f}秒）")
+        return state
+
+    def _alert(self, kind: str, now: float, **detail):
+        self.active[kind] = now
+        alert = {"kind": kind, "at": time.time(), **detail}
+        self.alerts.append(alert)
+        self.stats["alerts"] += 1
+        REGISTRY.set_gauge("watchdog_alerts", self.stats["alerts"])
+        trace_log(f"ウォッチドッグ警告: {kind} {detail}", "WARN")
+        if self.on_alert:
+            self.on_alert(alert)
+        if self.action:
+            try:
+                self.action(kind)
+                self.stats["actions"] += 1
+            except Exception as e:
+                trace_log(f"ウォッチドッグ復旧処理失敗: {kind} ({e})", "ERROR")
+            # 復旧後の差を新しい基準にする（停止時刻は残し、回復は実際に進んだかで判定）
+            self._base = (self.writer_seq(), self.reader_seq())
+
+    def _run(self):
+        self.rebase()
+        while not self._stop.wait(self.check_interval):
+            self.check()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="stream-watchdog")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def summary(self) -> Dict:
+        return {**self.stats, "lag_frames": self.lag, "active": sorted(self.active),
+                "recent_alerts": list(self.alerts)[-10:]}
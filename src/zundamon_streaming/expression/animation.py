@@ -1,31 +1,28 @@
-"""まばたきアニメーション"""
-import threading
-import time
+"""まばたきアニメーション（タイムライン駆動）"""
 import random
 
 class BlinkAnimator:
-    def __init__(self, expression_state):
+    BLINK_SECONDS = 0.12  # まばたき時間
+
+    def __init__(self, expression_state, timeline):
         self.expression_state = expression_state
-        self._stop_event = threading.Event()
-        self._thread = None
-    
+        self.timeline = timeline
+        self._next_blink_frame = None
+
     def start(self):
-        self._stop_event.clear()
-        self._thread = threading.Thread(target=self._blink_loop, daemon=True)
-        self._thread.start()
-    
+        self._next_blink_frame = self.timeline.frame_no
+        self.timeline.add_ticker(self.tick)
+
     def stop(self):
-        self._stop_event.set()
-        if self._thread:
-            self._thread.join(timeout=1.0)
-    
-    def _blink_loop(self):
-        while not self._stop_event.is_set():
-            if not self.expression_state.is_talking:
-                original_eyes = self.expression_state.current_eyes
-                self.expression_state.set_eyes("UU")
-                time.sleep(0.12)  # まばたき時間
-                self.expression_state.set_eyes(original_eyes)
-                time.sleep(2.0 + random.random() * 3.0)
-            else:
-                time.sleep(0.1)
+        self.timeline.remove_ticker(self.tick)
+
+    def tick(self, frame_no: int):
+        """フレームごとに呼ばれ、時刻が来たらまばたきイベントを登録"""
+        if frame_no < self._next_blink_frame:
+            return
+        if self.expression_state.is_talking:
+            self._next_blink_frame = frame_no + self.timeline.frames(0.1)
+            return
+        blink_frames = self.timeline.frames(self.BLINK_SECONDS)
+        self.timeline.schedule("eyes", "UU", frame_no, frame_no + blink_frames)
+        self._next_blink_frame = frame_no + blink_frames + self.timeline.frames(2.0 + random.random() * 3.0)
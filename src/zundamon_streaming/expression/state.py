@@ -1,25 +1,59 @@
 """表情状態管理"""
 import threading
+import time
+from dataclasses import dataclass, replace
+
+@dataclass(frozen=True)
+class ExpressionSnapshot:
+    """不変の表情スナップショット（version は変更ごとに単調増加）"""
+    mouth: str = "むふ"
+    eyes: str = "普通目"
+    is_talking: bool = False
+    version: int = 0
+    changed_at: float = 0.0  # time.monotonic()
 
 class ExpressionState:
     def __init__(self):
-        self.current_mouth = "むふ"
-        self.current_eyes = "普通目"
-        self.is_talking = False
-        self._lock = threading.Lock()
-    
-    def set_mouth(self, mouth: str):
+        self._snapshot = ExpressionSnapshot(changed_at=time.monotonic())
+        self._lock = threading.Lock()  # 書き込み側のみ
+
+    def _publish(self, **changes):
         with self._lock:
-            self.current_mouth = mouth
-    
+            current = self._snapshot
+            if all(getattr(current, k) == v for k, v in changes.items()):
+                return
+            self._snapshot = replace(current, version=current.version + 1,
+                                     changed_at=time.monotonic(), **changes)
+
+    def snapshot(self) -> ExpressionSnapshot:
+        """ロックなしで最新スナップショットを取得（参照の読み出しはアトミック）"""
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    @property
+    def current_mouth(self) -> str:
+        return self._snapshot.mouth
+
+    @property
+    def current_eyes(self) -> str:
+        return self._snapshot.eyes
+
+    @property
+    def is_talking(self) -> bool:
+        return self._snapshot.is_talking
+
+    def set_mouth(self, mouth: str):
+        self._publish(mouth=mouth)
+
     def set_eyes(self, eyes: str):
-        with self._lock:
-            self.current_eyes = eyes
-    
+        self._publish(eyes=eyes)
+
     def set_talking(self, talking: bool):
-        with self._lock:
-            self.is_talking = talking
-    
+        self._publish(is_talking=talking)
+
     def get_current_expression(self) -> tuple:
-        with self._lock:
-            return self.current_mouth, self.current_eyes
+        snap = self._snapshot
+        return snap.mouth, snap.eyes
@@ -0,0 +1,106 @@
+"""フレームクロック駆動のタイムラインスケジューラ
+
+まばたき・口形・表情変更を「何フレーム目から何フレーム目まで」のイベントとして
+登録し、レンダーループが毎フレーム advance() を呼んで状態に反映する。
+sleep するワーカースレッドを使わないため、長さはフレーム単位で正確になる。
+"""
+import heapq
+import itertools
+import threading
+from typing import Callable, List, Optional
+
+CHANNELS = ("mouth", "eyes", "talking")
+
+class TimelineEvent:
+    __slots__ = ("channel", "value", "start_frame", "end_frame", "restore", "cancelled")
+
+    def __init__(self, channel: str, value, start_frame: int, end_frame: Optional[int]):
+        self.channel = channel
+        self.value = value
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.restore = None
+        self.cancelled = False
+
+class Timeline:
+    def __init__(self, expression_state, fps: int = 30):
+        self.expression_state = expression_state
+        self.fps = fps
+        self.frame_no = 0
+        self._queue: List[tuple] = []  # (frame, seq, kind, event)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._tickers: List[Callable[[int], None]] = []
+
+    def frames(self, seconds: float) -> int:
+        """秒 → フレーム数（最低1フレーム）"""
+        return max(1, round(seconds * self.fps))
+
+    def schedule(self, channel: str, value, start_frame: int,
+                 end_frame: Optional[int] = None) -> TimelineEvent:
+        """start_frame で value を適用し、end_frame で適用前の値に戻す（None なら戻さない）"""
+        if channel not in CHANNELS:
+            raise ValueError(f"未知のチャンネル: {channel}")
+        event = TimelineEvent(channel, value, start_frame, end_frame)
+        with self._lock:
+            heapq.heappush(self._queue, (start_frame, next(self._seq), "start", event))
+            if end_frame is not None:
+                heapq.heappush(self._queue, (end_frame, next(self._seq), "end", event))
+        return event
+
+    def schedule_in(self, channel: str, value, delay_frames: int = 0,
+                    duration_frames: Optional[int] = None) -> TimelineEvent:
+        """現在フレームからの相対指定（delay 0 = 次の advance で適用）"""
+        start = self.frame_no + 1 + max(0, delay_frames)
+        end = start + duration_frames if duration_frames is not None else None
+        return self.schedule(channel, value, start, end)
+
+    def cancel(self, event: TimelineEvent):
+        event.cancelled = True
+
+    def add_ticker(self, ticker: Callable[[int], None]):
+        """毎フレーム advance 時に呼ばれるコールバック（まばたき等の生成器）"""
+        if ticker not in self._tickers:
+            self._tickers.append(ticker)
+
+    def remove_ticker(self, ticker: Callable[[int], None]):
+        if ticker in self._tickers:
+            self._tickers.remove(ticker)
+
+    def advance(self, frame_no: Optional[int] = None):
+        """フレームを進めて期限の来たイベントを状態に反映（レンダースレッドから呼ぶ）"""
+        if frame_no is None:
+            frame_no = self.frame_no + 1
+        self.frame_no = frame_no
+        for ticker in list(self._tickers):
+            ticker(frame_no)
+
+        while True:
+            with self._lock:
+                if not self._queue or self._queue[0][0] > frame_no:
+                    return
+                _, _, kind, event = heapq.heappop(self._queue)
+            if event.cancelled:
+                continue
+            if kind == "start":
+                event.restore = self._get(event.channel)
+                self._set(event.channel, event.value)
+            elif self._get(event.channel) == event.value:
+                # 途中で別の値に変えられていなければ元に戻す
+                self._set(event.channel, event.restore)
+
+    def _get(self, channel: str):
+        snap = self.expression_state.snapshot()
+        return {"mouth": snap.mouth, "eyes": snap.eyes, "talking": snap.is_talking}[channel]
+
+    def _set(self, channel: str, value):
+        if channel == "mouth":
+            self.expression_state.set_mouth(value)
+        elif channel == "eyes":
+            self.expression_state.set_eyes(value)
+        else:
+            self.expression_state.set_talking(value)
+
+    def clear(self):
+        with self._lock:
+            self._queue.clear()
@@ -1,17 +1,117 @@
-"""画像キャッシュ管理"""
+"""画像キャッシュ管理（切り抜きスプライト + メモリ上限付きLRU）"""
+import threading
+from collections import OrderedDict
 from PIL import Image
-from typing import Dict
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+from .pack import AssetPack
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class Sprite(NamedTuple):
+    """アルファbboxで切り抜いた画像と元キャンバス上の貼り付け位置"""
+    image: Image.Image
+    offset: Tuple[int, int]
+    canvas_size: Tuple[int, int]
+
+    @property
+    def nbytes(self) -> int:
+        w, h = self.image.size
+        return w * h * 4
 
 class ImageCache:
-    def __init__(self):
-        self._cache: Dict[str, Image.Image] = {}
-    
+    def __init__(self, pack: Optional[AssetPack] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self._cache: "OrderedDict[str, Sprite]" = OrderedDict()
+        self._pinned: Set[str] = set()
+        self._lock = threading.Lock()
+        self.pack = pack
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.sealed = False
+        self.late_decodes = 0
+
+    def get_sprite(self, path: str) -> Sprite:
+        """キャッシュから切り抜きスプライト取得、なければ読み込み"""
+        with self._lock:
+            sprite = self._cache.get(path)
+            if sprite is not None:
+                self._cache.move_to_end(path)
+                self.hits += 1
+                return sprite
+            self.misses += 1
+            if self.sealed:
+                self.late_decodes += 1
+                print(f"[WARN] ウォームアップ後のデコード: {path}")
+
+        sprite = self._load(path)
+        with self._lock:
+            if path not in self._cache:
+                self._cache[path] = sprite
+                self.size_bytes += sprite.nbytes
+                self._evict()
+        return sprite
+
     def get(self, path: str) -> Image.Image:
-        """キャッシュから画像取得、なければ読み込み"""
-        if path not in self._cache:
-            self._cache[path] = Image.open(path).convert("RGBA")
-        return self._cache[path]
-    
+        """元キャンバスサイズの画像取得（互換用。合成には get_sprite を使う）"""
+        sprite = self.get_sprite(path)
+        canvas = Image.new("RGBA", sprite.canvas_size, (0, 0, 0, 0))
+        canvas.paste(sprite.image, sprite.offset)
+        return canvas
+
+    def _load(self, path: str) -> Sprite:
+        if self.pack is not None and path in self.pack:
+            image, offset = self.pack.image(path)
+            return Sprite(image, offset, self.pack.canvas_size)
+        img = Image.open(path).convert("RGBA")
+        bbox = img.getchannel("A").getbbox() or (0, 0, 0, 0)
+        return Sprite(img.crop(bbox), bbox[:2], img.size)
+
+    def _evict(self):
+        """上限超過分をピン留め以外の古い順に破棄（ロック保持中に呼ぶ）"""
+        if self.size_bytes <= self.max_bytes:
+            return
+        for key in list(self._cache):
+            if self.size_bytes <= self.max_bytes:
+                break
+            if key in self._pinned:
+                continue
+            self.size_bytes -= self._cache.pop(key).nbytes
+            self.evictions += 1
+
+    def pin(self, path: str) -> Sprite:
+        """追い出し対象外として保持（ベースレイヤー用）"""
+        with self._lock:
+            self._pinned.add(path)
+        return self.get_sprite(path)
+
+    def unpin(self, path: str):
+        with self._lock:
+            self._pinned.discard(path)
+            self._evict()
+
+    def seal(self):
+        """以降のキャッシュミス（描画経路でのデコード）を警告・計数する"""
+        self.sealed = True
+
+    def stats(self) -> Dict[str, int]:
+        """サイズ・ヒット数・追い出し数"""
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "pinned": len(self._pinned),
+                "size_bytes": self.size_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "late_decodes": self.late_decodes,
+            }
+
     def clear(self):
-        """キャッシュクリア"""
-        self._cache.clear()
+        """キャッシュクリア（ピン留めも解除）"""
+        with self._lock:
+            self._cache.clear()
+            self._pinned.clear()
+            self.size_bytes = 0
@@ -1,25 +1,52 @@
 """画像合成エンジン - 3ストリーム配信対応"""
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 from .loader import PNGLoader
-from .cache import ImageCache
+from .cache import ImageCache, DEFAULT_MAX_BYTES
+from .pack import AssetPack
+from ..utils.metrics import REGISTRY
+from ..utils.trace import trace_log
 
 import time
-import threading
 
-def trace_log(message, level="INFO"):
-    timestamp = time.time()
-    thread_id = threading.current_thread().ident
-    print(f"[{timestamp:.3f}][{thread_id}][{level}] {message}")
+def layer_union_bbox(position_map: dict, align: int = 2) -> Optional[Tuple[int, int, int, int]]:
+    """position_map の全レイヤー bbox の和（left, top, right, bottom）。align の倍数に広げる
+
+    (非表示) などの 1px 以下のダミーは除く。どの表情・ポーズでもこの範囲に収まる。
+    """
+    boxes = [layer["bbox"] for layer in position_map.get("layers", {}).values()
+             if layer.get("bbox") and layer["bbox"][2] - layer["bbox"][0] > 1
+             and layer["bbox"][3] - layer["bbox"][1] > 1]
+    if not boxes:
+        return None
+    left = min(b[0] for b in boxes) // align * align
+    top = min(b[1] for b in boxes) // align * align
+    right = -(-max(b[2] for b in boxes) // align) * align
+    bottom = -(-max(b[3] for b in boxes) // align) * align
+    width, height = position_map.get("canvas_size", (right, bottom))
+    return left, top, min(right, width), min(bottom, height)
 
 class ImageCompositor:
-    def __init__(self, layer_dir: str):
+    def __init__(self, layer_dir: str, cache_bytes: int = DEFAULT_MAX_BYTES):
         self.layer_dir = layer_dir
-        self.loader = PNGLoader(layer_dir)
-        self.cache = ImageCache()
+        self.startup_timings: Dict[str, float] = {}
+        self._resolved: Dict[Tuple[str, str], List[str]] = {}
+        t0 = time.perf_counter()
+        self.pack = AssetPack.open_default(layer_dir)
+        if self.pack:
+            trace_log(f"アセットパック使用: {self.pack.pack_path} ({len(self.pack)}レイヤー)")
+        self.loader = PNGLoader(layer_dir, index=self.pack.index if self.pack else None)
+        self.cache = ImageCache(pack=self.pack, max_bytes=cache_bytes)
+        t1 = time.perf_counter()
         
         # ベース画像を一度だけ生成
         self.base_image = self._create_base_image()
+        self.startup_timings["index"] = t1 - t0
+        self.startup_timings["base"] = time.perf_counter() - t1
         
     def _create_base_image(self):
         """固定ベース画像（体・服・腕・眉のみ）"""
@@ -30,52 +57,61 @@ class ImageCompositor:
         body = (self.loader.find_layer_file("服装2/素体") or 
                 self.loader.find_layer_file("素体"))
         if body:
-            img = self.cache.get(body)
-            canvas.alpha_composite(img, dest=(0, 0))
+            self._paste(canvas, body, pin=True)
         
         # 2) 枝豆（任意）
         edamame = self.loader.find_layer_file("枝豆/枝豆通常")
         if edamame:
-            img = self.cache.get(edamame)
-            canvas.alpha_composite(img, dest=(0, 0))
+            self._paste(canvas, edamame, pin=True)
         
         # 3) 服
         outfit = (self.loader.find_layer_file("服装1/いつもの服") or
                   self.loader.find_layer_file("服装1/制服"))
         if outfit:
-            img = self.cache.get(outfit)
-            canvas.alpha_composite(img, dest=(0, 0))
+            self._paste(canvas, outfit, pin=True)
         
         # 4) 腕
         left_arm = (self.loader.find_layer_file("_服装1/!左腕/*基本*") or
                     self._find_by_keywords("左腕", "基本"))
         if left_arm:
-            img = self.cache.get(left_arm)
-            canvas.alpha_composite(img, dest=(0, 0))
+            self._paste(canvas, left_arm, pin=True)
             
         right_arm = (self.loader.find_layer_file("_服装1/!右腕/*基本*") or
                     self._find_by_keywords("右腕", "基本"))
         if right_arm:
-            img = self.cache.get(right_arm)
-            canvas.alpha_composite(img, dest=(0, 0))
+            self._paste(canvas, right_arm, pin=True)
         
         # 5) 眉
         brow = (self.loader.find_layer_file("眉/普通眉") or
                 self.loader.find_layer_file("眉/怒り眉"))
         if brow:
-            img = self.cache.get(brow)
-            canvas.alpha_composite(img, dest=(0, 0))
+            self._paste(canvas, brow, pin=True)
         
         return canvas
     
+    def _paste(self, canvas, path: str, pin: bool = False):
+        """切り抜きスプライトを元の位置に重ねる"""
+        sprite = self.cache.pin(path) if pin else self.cache.get_sprite(path)
+        canvas.alpha_composite(sprite.image, dest=sprite.offset)
+    
+    def layer_bounds(self) -> Tuple[int, int, int, int]:
+        """キャラクターが描かれうる範囲（position_map.json が無ければキャンバス全体）"""
+        try:
+            with open(os.path.join(self.layer_dir, "position_map.json"), encoding="utf-8") as f:
+                bbox = layer_union_bbox(json.load(f))
+        except (OSError, ValueError):
+            bbox = None
+        return bbox or (0, 0) + self.base_image.size
+    
     def get_base_image(self):
         """ベース画像取得（コピーを返す）"""
         return self.base_image.copy()
     
-    def create_mouth_part(self, mouth: str):
-        """口パーツ専用画像生成（透明背景）"""
-        base_size = (1082, 1650)
-        canvas = Image.new("RGBA", base_size, (0, 0, 0, 0))
+    def resolve_mouth_files(self, mouth: str) -> List[str]:
+        """口パーツのファイル解決（結果はメモ化）"""
+        key = ("mouth", mouth)
+        if key in self._resolved:
+            return self._resolved[key]
         
         # 口パーツファイル検索
         mouth_patterns = [f"!口/_{mouth}_", f"!口/{mouth}"]
@@ -95,10 +131,37 @@ class ImageCompositor:
             if mouth_file:
                 break
         
-        if mouth_file:
-            img = self.cache.get(mouth_file)
-            canvas.alpha_composite(img, dest=(0, 0))
-            trace_log(f"口パーツ生成: {mouth} -> {mouth_file}")
+        files = [mouth_file] if mouth_file else []
+        self._resolved[key] = files
+        return files
+    
+    def resolve_eyes_files(self, eyes: str) -> List[str]:
+        """目パーツのファイル解決（重ね順、結果はメモ化）"""
+        key = ("eyes", eyes)
+        if key in self._resolved:
+            return self._resolved[key]
+        
+        if eyes == "普通目":
+            # 白目 + 黒目の組み合わせ
+            candidates = [self.loader.find_layer_file("目/目セット/普通白目"),
+                          self.loader.find_layer_file("目/目セット/黒目/普通目")]
+        else:
+            # 単一目ファイル
+            candidates = [self.loader.find_layer_file(f"目/{eyes}")]
+        
+        files = [f for f in candidates if f]
+        self._resolved[key] = files
+        return files
+    
+    def create_mouth_part(self, mouth: str):
+        """口パーツ専用画像生成（透明背景）"""
+        base_size = (1082, 1650)
+        canvas = Image.new("RGBA", base_size, (0, 0, 0, 0))
+        
+        files = self.resolve_mouth_files(mouth)
+        if files:
+            self._paste(canvas, files[0])
+            trace_log(f"口パーツ生成: {mouth} -> {files[0]}", "DEBUG")
         else:
             trace_log(f"口パーツ未発見: {mouth}", "ERROR")
         
@@ -109,27 +172,66 @@ class ImageCompositor:
         base_size = (1082, 1650)
         canvas = Image.new("RGBA", base_size, (0, 0, 0, 0))
         
-        if eyes == "普通目":
-            # 白目 + 黒目の組み合わせ
-            eye_white = self.loader.find_layer_file("目/目セット/普通白目")
-            if eye_white:
-                img = self.cache.get(eye_white)
-                canvas.alpha_composite(img, dest=(0, 0))
-            
-            eye_black = self.loader.find_layer_file("目/目セット/黒目/普通目")
-            if eye_black:
-                img = self.cache.get(eye_black)
-                canvas.alpha_composite(img, dest=(0, 0))
-        else:
-            # 単一目ファイル
-            eye_file = self.loader.find_layer_file(f"目/{eyes}")
-            if eye_file:
-                img = self.cache.get(eye_file)
-                canvas.alpha_composite(img, dest=(0, 0))
+        for path in self.resolve_eyes_files(eyes):
+            self._paste(canvas, path)
         
-        trace_log(f"目パーツ生成: {eyes}")
+        trace_log(f"目パーツ生成: {eyes}", "DEBUG")
         return canvas
     
+    def compose_frame(self, mouth: str, eyes: str):
+        """ベース + 目 + 口 を1枚に合成（生フレームパイプ配信用）"""
+        with REGISTRY.timer("resolve"):
+            layers = self.resolve_eyes_files(eyes) + self.resolve_mouth_files(mouth)[:1]
+        with REGISTRY.timer("compose"):
+            canvas = self.base_image.copy()
+            for path in layers:
+                self._paste(canvas, path)
+        return canvas
+    
+    def _expression_layer_names(self):
+        """表情モデルが参照しうる口・目の名前を列挙"""
+        mouths, eyes = {"むふ", "ほあー", "ほあ"}, {"普通目", "UU"}
+        for rels in self.loader.png_index.values():
+            for rel in rels:
+                parts = re.sub(r"_pos_\d+_\d+_\d+_\d+", "", os.path.splitext(rel)[0]).split("/")
+                if len(parts) != 2:
+                    continue
+                name = parts[1].strip("_")
+                if not name:
+                    continue
+                if parts[0] == "!口":
+                    mouths.add(name)
+                elif parts[0] == "!目":
+                    eyes.add(name)
+        return sorted(mouths), sorted(eyes)
+    
+    def warm_up(self, workers: Optional[int] = None) -> Dict[str, float]:
+        """口・目の全レイヤーを事前に解決・並列デコードし、以降の描画経路でのデコードを禁止"""
+        t0 = time.perf_counter()
+        mouths, eyes = self._expression_layer_names()
+        paths = set()
+        for name in mouths:
+            paths.update(self.resolve_mouth_files(name))
+        for name in eyes:
+            paths.update(self.resolve_eyes_files(name))
+        for rels in self.loader.png_index.values():
+            for rel in rels:
+                if rel.startswith(("!口/", "!目/")):
+                    paths.add(os.path.join(self.layer_dir, rel))
+        t1 = time.perf_counter()
+        
+        # PIL はデコード中に GIL を解放するのでスレッドで並列化できる
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(self.cache.pin, sorted(paths)))
+        t2 = time.perf_counter()
+        
+        self.cache.seal()
+        self.startup_timings["resolve"] = t1 - t0
+        self.startup_timings["decode"] = t2 - t1
+        trace_log(f"ウォームアップ完了: {len(paths)}レイヤー "
+                  + " ".join(f"{k}={v * 1000:.1f}ms" for k, v in self.startup_timings.items()))
+        return dict(self.startup_timings)
+    
     def _find_by_keywords(self, *keywords):
         """キーワード検索のラッパー"""
         return self.loader.find_by_keywords(*keywords)
\ No newline at end of file
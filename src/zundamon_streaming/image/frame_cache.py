@@ -0,0 +1,129 @@
+"""変換済みフレームキャッシュ - 表情状態ごとに背景合成と YUV 変換を1回だけ行う
+
+表情の組み合わせ（口 × 目）は有限なので、毎フレーム ffmpeg に RGBA を渡して
+overlay + format をやり直す代わりに、状態ごとの完成フレームを ffmpeg の入力形式で持つ。
+
+    yuv420p   静止背景（画像 / 単色）に合成済み。ffmpeg はフィルタなしでそのままエンコード
+    yuva420p  キャラクターのみ（アルファ付き）。背景動画への overlay は残るが前段の変換が不要
+    rgba      従来どおり（変換なし）
+
+静止背景が画像なら出力サイズはその画像のサイズ（奇数なら右・下を1px黒で埋めて偶数にする）。
+crop（left, top, right, bottom）を渡すとキャラクターをその範囲に切り出してから変換する
+（透過出力でキャラクター部分だけ送る用。静止背景とは併用しない）。
+色変換は ffmpeg の既定（BT.601 limited range）に合わせる。
+"""
+from collections import OrderedDict
+from typing import Optional, Tuple, Union
+
+from PIL import Image
+
+from ..utils.metrics import REGISTRY
+from ..utils.trace import trace_log
+
+PIX_FMTS = ("rgba", "yuv420p", "yuva420p")
+
+
+# PIL の YCbCr（BT.601 full range）を limited range へ写す表
+_Y_LUT = [16 + round(v * 219 / 255) for v in range(256)]
+_C_LUT = [128 + round((v - 128) * 224 / 255) for v in range(256)]
+
+
+def rgba_to_yuv(image: Image.Image, alpha: bool = False) -> bytes:
+    """RGBA 画像を yuv420p（alpha=True なら yuva420p）のプレーン列にする。幅・高さは偶数
+
+    BT.601 limited range（ffmpeg の既定と ±1 以内）。クロマは 2x2 の平均。
+    """
+    width, height = image.size
+    if width % 2 or height % 2:
+        raise ValueError(f"yuv420p は偶数サイズのみ: {width}x{height}")
+    y, cb, cr = image.convert("RGB").convert("YCbCr").split()
+    half = (width // 2, height // 2)
+    planes = [y.point(_Y_LUT),
+              cb.resize(half, Image.BOX).point(_C_LUT),
+              cr.resize(half, Image.BOX).point(_C_LUT)]
+    if alpha:
+        planes.append(image.getchannel("A"))
+    return b"".join(plane.tobytes() for plane in planes)
+
+
+def load_background(background: Union[str, Tuple[int, ...], None], size: Tuple[int, int]) -> Image.Image:
+    """静止背景。画像パスなら元のサイズ（偶数に切り上げ）、色（RGB タプル）や None（黒）ならキャラクターのサイズ"""
+    if isinstance(background, str):
+        image = Image.open(background).convert("RGBA")
+        width, height = image.size
+        even = (width + width % 2, height + height % 2)
+        if even != image.size:
+            # yuv420p は偶数サイズのみ。拡大すると絵がずれるので黒で埋める
+            canvas = Image.new("RGBA", even, (0, 0, 0, 255))
+            canvas.paste(image, (0, 0))
+            trace_log(f"背景を偶数サイズに拡張: {width}x{height} → {even[0]}x{even[1]}", "WARN")
+            image = canvas
+        return image
+    color = tuple(background or (0, 0, 0))[:3] + (255,)
+    return Image.new("RGBA", size, color)
+
+
+class FrameCache:
+    """(口, 目) → ffmpeg に渡すフレームのバイト列"""
+
+    def __init__(self, compositor, pix_fmt: str = "yuv420p", background=None, max_entries: int = 64,
+                 crop: Optional[Tuple[int, int, int, int]] = None):
+        if pix_fmt not in PIX_FMTS:
+            raise ValueError(f"未対応のピクセル形式: {pix_fmt}（{', '.join(PIX_FMTS)}）")
+        self.compositor = compositor
+        self.pix_fmt = pix_fmt
+        self.max_entries = max_entries
+        # yuva420p / rgba は背景を ffmpeg 側に残す（合成しない）
+        self.background: Optional[Image.Image] = None
+        if pix_fmt == "yuv420p":
+            self.background = load_background(background, compositor.base_image.size)
+        self.crop = crop if self.background is None else None
+        if self.background:
+            self.size = self.background.size
+            if self.size != compositor.base_image.size:
+                trace_log(f"出力サイズは背景に合わせる: {self.size[0]}x{self.size[1]}")
+        elif self.crop:
+            self.size = (self.crop[2] - self.crop[0], self.crop[3] - self.crop[1])
+        else:
+            self.size = compositor.base_image.size
+        self._frames: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def convert(self, frame: Image.Image) -> bytes:
+        """合成済みのキャラクター（RGBA）を出力形式へ"""
+        with REGISTRY.timer("convert"):
+            if self.background is not None:
+                canvas = self.background.copy()
+                # 従来の overlay と同じく左上 (0,0) に重ね、はみ出しは切り捨て
+                canvas.alpha_composite(frame.crop((0, 0) + canvas.size))
+                return rgba_to_yuv(canvas)
+            if self.crop:
+                frame = frame.crop(self.crop)
+            if self.pix_fmt == "yuva420p":
+                return rgba_to_yuv(frame, alpha=True)
+            return frame.tobytes()
+
+    def frame(self, mouth: str, eyes: str) -> bytes:
+        key = (mouth, eyes)
+        data = self._frames.get(key)
+        if data is not None:
+            self.hits += 1
+            self._frames.move_to_end(key)
+            return data
+        self.misses += 1
+        data = self.convert(self.compositor.compose_frame(mouth, eyes))
+        self._frames[key] = data
+        if len(self._frames) > self.max_entries:
+            self._frames.popitem(last=False)
+        return data
+
+    def warm_up(self, states) -> int:
+        """(口, 目) の組を先に変換しておく（配信中の初出で1フレーム分の変換が入らないように）"""
+        for mouth, eyes in states:
+            self.frame(mouth, eyes)
+        return len(self._frames)
+
+    def stats(self):
+        return {"pix_fmt": self.pix_fmt, "entries": len(self._frames), "hits": self.hits, "misses": self.misses,
+                "bytes": sum(len(v) for v in self._frames.values())}
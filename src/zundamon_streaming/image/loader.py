@@ -38,9 +38,10 @@ def build_png_index(root_dir: str) -> Dict[str, List[str]]:
     return index
 
 class PNGLoader:
-    def __init__(self, root_dir: str):
+    def __init__(self, root_dir: str, index: Optional[Dict[str, List[str]]] = None):
         self.root_dir = root_dir
-        self.png_index = build_png_index(root_dir)
+        # アセットパックのインデックスがあれば os.walk を省略
+        self.png_index = index if index is not None else build_png_index(root_dir)
         self._warned_once = set()
     
     def find_layer_file(self, layer_path: str) -> Optional[str]:
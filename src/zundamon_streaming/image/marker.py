@@ -0,0 +1,69 @@
+"""フレームマーカー - 左上に白黒セルで値（表情 version）を焼き込み、デコード後の画素から読み戻す
+
+    [同期 1,0][値 24bit][チェック 4bit] を CELL 四方のセルで横一列に並べる。
+    yuv420p + x264 を通っても読めるよう、セル中央の平均輝度を 128 で二値化する。
+"""
+from typing import Optional, Tuple
+
+from PIL import Image
+
+CELL = 16
+SYNC = (1, 0)
+VALUE_BITS = 24
+CHECK_BITS = 4
+CELLS = len(SYNC) + VALUE_BITS + CHECK_BITS
+
+
+def marker_size() -> Tuple[int, int]:
+    return CELL * CELLS, CELL
+
+
+def _checksum(value: int) -> int:
+    return bin(value).count("1") % (1 << CHECK_BITS)
+
+
+def _bits(value: int):
+    value &= (1 << VALUE_BITS) - 1
+    check = _checksum(value)
+    return (list(SYNC)
+            + [(value >> i) & 1 for i in reversed(range(VALUE_BITS))]
+            + [(check >> i) & 1 for i in reversed(range(CHECK_BITS))])
+
+
+def marker_image(value: int) -> Image.Image:
+    """値を表す不透明な白黒の帯"""
+    image = Image.new("RGBA", marker_size(), (0, 0, 0, 255))
+    white = Image.new("RGBA", (CELL, CELL), (255, 255, 255, 255))
+    for i, bit in enumerate(_bits(value)):
+        if bit:
+            image.paste(white, (i * CELL, 0))
+    return image
+
+
+def stamp(image: Image.Image, value: int) -> Image.Image:
+    """image の左上にマーカーを上書き（image 自体を変更）"""
+    image.paste(marker_image(value), (0, 0))
+    return image
+
+
+def read_marker(gray: bytes, width: Optional[int] = None) -> Optional[int]:
+    """マーカー領域（marker_size() で切り出したグレースケール）から値を読む。読めなければ None"""
+    width = width or marker_size()[0]
+    lo, hi = CELL // 4, CELL - CELL // 4
+    bits = []
+    for i in range(CELLS):
+        total = count = 0
+        for y in range(lo, hi):
+            row = y * width + i * CELL
+            total += sum(gray[row + lo:row + hi])
+            count += hi - lo
+        bits.append(1 if total / count >= 128 else 0)
+    if tuple(bits[:len(SYNC)]) != SYNC:
+        return None
+    value = 0
+    for bit in bits[len(SYNC):len(SYNC) + VALUE_BITS]:
+        value = (value << 1) | bit
+    check = 0
+    for bit in bits[len(SYNC) + VALUE_BITS:]:
+        check = (check << 1) | bit
+    return value if check == _checksum(value) else None
@@ -0,0 +1,152 @@
+"""コンパイル済みアセットパック（mmap共有スプライト）
+
+PNGツリーを1ファイルにまとめ、アルファbboxで切り抜いた RGBA（straight alpha）の
+生データとメタデータヘッダ（正規化キー・bbox）を格納する。
+実行時は mmap で開き、スプライトは mmap を直接参照する読み取り専用の PIL 画像になる
+（デコードもコピーもせず、ページキャッシュをプロセス間で共有する）。
+合成は PIL の alpha_composite が straight alpha で行うので、premultiplied にはしない。
+PNG を更新したら再ビルドすること。
+
+ファイル形式:
+    magic "ZPAK" | version u32 | header_len u64 | header(JSON, UTF-8) | 64byte境界 | raw data
+"""
+import os
+import json
+import mmap
+import struct
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .loader import build_png_index
+from ..utils.trace import trace_log
+
+PACK_MAGIC = b"ZPAK"
+PACK_VERSION = 2  # 2: straight RGBA（1 は premultiplied）
+PACK_FILENAME = "zundamon.zpack"
+_PREAMBLE = struct.Struct("<4sIQ")
+_ALIGN = 64
+
+
+def default_pack_path(layer_dir: str) -> str:
+    """レイヤーディレクトリ標準のパック配置先"""
+    return os.path.join(layer_dir, PACK_FILENAME)
+
+
+def build_asset_pack(layer_dir: str, out_path: Optional[str] = None) -> str:
+    """レイヤーツリーをパックファイルにコンパイル"""
+    out_path = out_path or default_pack_path(layer_dir)
+    index = build_png_index(layer_dir)
+    rels = sorted({rel for hits in index.values() for rel in hits})
+
+    entries = []
+    blobs = []
+    offset = 0
+    canvas_size = None
+    for rel in rels:
+        img = Image.open(os.path.join(layer_dir, rel)).convert("RGBA")
+        if canvas_size is None:
+            canvas_size = img.size
+        bbox = img.getchannel("A").getbbox() or (0, 0, 0, 0)
+        data = img.crop(bbox).tobytes()
+
+        entries.append({
+            "path": rel,
+            "bbox": list(bbox),
+            "size": list(img.size),
+            "offset": offset,
+            "length": len(data),
+        })
+        blobs.append(data)
+        pad = -len(data) % _ALIGN
+        if pad:
+            blobs.append(b"\0" * pad)
+        offset += len(data) + pad
+
+    header = json.dumps({
+        "canvas_size": list(canvas_size or (0, 0)),
+        "format": "RGBA8",
+        "entries": entries,
+        "index": index,
+    }, ensure_ascii=False).encode("utf-8")
+    data_start = _PREAMBLE.size + len(header)
+    data_start += -data_start % _ALIGN
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(PACK_MAGIC, PACK_VERSION, len(header)))
+        f.write(header)
+        f.write(b"\0" * (data_start - _PREAMBLE.size - len(header)))
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+class AssetPack:
+    """mmap したアセットパック（読み取り専用）"""
+
+    def __init__(self, pack_path: str, root_dir: str):
+        self.pack_path = pack_path
+        self.root_dir = root_dir
+        self._file = open(pack_path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_len = _PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            self.close()
+            raise ValueError(f"未対応のアセットパック: {pack_path}")
+        header = json.loads(self._mmap[_PREAMBLE.size:_PREAMBLE.size + header_len].decode("utf-8"))
+        data_start = _PREAMBLE.size + header_len
+        data_start += -data_start % _ALIGN
+
+        self.canvas_size: Tuple[int, int] = tuple(header["canvas_size"])
+        self.index: Dict[str, List[str]] = header["index"]
+        self._entries = {e["path"]: e for e in header["entries"]}
+        self._data = np.frombuffer(self._mmap, dtype=np.uint8, offset=data_start)
+
+    @classmethod
+    def open_default(cls, layer_dir: str) -> Optional["AssetPack"]:
+        """標準配置のパックがあれば開く。古い形式なら使わない（PNG から読む）"""
+        path = default_pack_path(layer_dir)
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path, layer_dir)
+        except ValueError as e:
+            trace_log(f"{e}（assets build で再ビルドしてください）", "WARN")
+            return None
+
+    def _rel(self, path: str) -> str:
+        return os.path.relpath(path, self.root_dir).replace("\\", "/")
+
+    def __contains__(self, path: str) -> bool:
+        return self._rel(path) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def sprite(self, path: str) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """(RGBA の HxWx4 ゼロコピービュー, 貼り付け位置) を返す"""
+        e = self._entries[self._rel(path)]
+        x0, y0, x1, y1 = e["bbox"]
+        view = self._data[e["offset"]:e["offset"] + e["length"]]
+        return view.reshape(y1 - y0, x1 - x0, 4), (x0, y0)
+
+    def image(self, path: str) -> Tuple[Image.Image, Tuple[int, int]]:
+        """PIL 合成用の切り抜き RGBA 画像と貼り付け位置。mmap を直接参照する（読み取り専用）"""
+        arr, offset = self.sprite(path)
+        h, w = arr.shape[:2]
+        return Image.frombuffer("RGBA", (w, h), arr, "raw", "RGBA", 0, 1), offset
+
+    def close(self):
+        self._data = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # 外部にビューが残っている間は GC に任せる
+            self._mmap = None
+        self._file.close()
+
@@ -0,0 +1,115 @@
+"""最小の RTMP publish クライアント - FLV タグを直接送る（ローカル受け口の試験・ベンチ用）"""
+import os
+import socket
+from collections import deque
+from typing import Deque, List, Optional
+
+from .protocol import (
+    HANDSHAKE_SIZE, MSG_AUDIO, MSG_COMMAND_AMF0, MSG_DATA_AMF0, MSG_SET_CHUNK_SIZE, MSG_VIDEO,
+    RTMP_VERSION, ChunkDecoder, RTMPMessage, amf0_decode, amf0_encode, command_message,
+    control_message, encode_chunks,
+)
+
+_CSID = {MSG_AUDIO: 4, MSG_VIDEO: 6, MSG_DATA_AMF0: 5}
+
+
+def _split_url(url: str):
+    """rtmp://host:port/app/stream → (host, port, app, stream)"""
+    rest = url.split("://", 1)[-1]
+    hostport, _, path = rest.partition("/")
+    host, _, port = hostport.partition(":")
+    app, _, stream = path.partition("/")
+    return host or "localhost", int(port or 1935), app, stream
+
+
+class RTMPPublisher:
+    def __init__(self, url: str, timeout: float = 5.0, chunk_size: int = 4096):
+        self.url = url
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.stream_id = 0
+        self._sock: Optional[socket.socket] = None
+        self._decoder = ChunkDecoder()
+        self._commands: Deque[List] = deque()
+
+    def connect(self):
+        """ハンドシェイク → connect → createStream → publish（Publish.Start まで待つ）"""
+        host, port, app, stream = _split_url(self.url)
+        self._sock = socket.create_connection((host, port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock.sendall(bytes([RTMP_VERSION]) + bytes(8) + os.urandom(HANDSHAKE_SIZE - 8))
+        s0s1s2 = self._recv_exact(1 + 2 * HANDSHAKE_SIZE)
+        self._sock.sendall(s0s1s2[1:1 + HANDSHAKE_SIZE])  # C2 = S1 のエコー
+
+        self._send(control_message(MSG_SET_CHUNK_SIZE, self.chunk_size), 2, chunk_size=128)
+        self._send(command_message("connect", 1, {
+            "app": app, "type": "nonprivate", "flashVer": "FMLE/3.0", "tcUrl": self.url.rsplit("/", 1)[0],
+        }), 3)
+        self._wait_result(1)
+        # FMLE 互換（応答は待たない）
+        self._send(command_message("releaseStream", 2, None, stream), 3)
+        self._send(command_message("FCPublish", 3, None, stream), 3)
+        self._send(command_message("createStream", 4, None), 3)
+        self.stream_id = int(self._wait_result(4)[3])
+        self._send(command_message("publish", 0, None, stream, "live", stream_id=self.stream_id), 3)
+        while True:
+            values = self._next_command()
+            if values[0] == "onStatus":
+                code = (values[3] or {}).get("code", "")
+                if code != "NetStream.Publish.Start":
+                    raise ConnectionError(f"publish 拒否: {code}")
+                return
+
+    def send_metadata(self, metadata: dict):
+        self._send(RTMPMessage(MSG_DATA_AMF0, self.stream_id, 0,
+                               amf0_encode("@setDataFrame", "onMetaData", metadata)), _CSID[MSG_DATA_AMF0])
+
+    def send_tag(self, type_id: int, timestamp: int, payload: bytes):
+        """audio(8) / video(9) / script(18) タグを1つ送る"""
+        self._send(RTMPMessage(type_id, self.stream_id, timestamp, payload), _CSID.get(type_id, 7))
+
+    def close(self):
+        """deleteStream を送って送信側を閉じ、サーバーが閉じるまで読み捨てる
+
+        未読の Ack が残ったまま close すると RST になり、受け口が送信済みのタグを取りこぼす。
+        """
+        if self._sock is not None:
+            try:
+                self._send(command_message("deleteStream", 0, None, self.stream_id), 3)
+                self._sock.shutdown(socket.SHUT_WR)
+                while self._sock.recv(65536):
+                    pass
+            except OSError:
+                pass
+            self._sock.close()
+            self._sock = None
+
+    # ---------- 内部 ----------
+    def _send(self, message: RTMPMessage, csid: int, chunk_size: Optional[int] = None):
+        self._sock.sendall(encode_chunks(message, csid, chunk_size or self.chunk_size))
+
+    def _recv_exact(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self._sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("サーバーが切断しました")
+            data += chunk
+        return data
+
+    def _next_command(self) -> List:
+        while not self._commands:
+            data = self._sock.recv(65536)
+            if not data:
+                raise ConnectionError("サーバーが切断しました")
+            self._commands.extend(amf0_decode(m.payload) for m in self._decoder.feed(data)
+                                  if m.type_id == MSG_COMMAND_AMF0)
+        return self._commands.popleft()
+
+    def _wait_result(self, transaction_id: int) -> List:
+        while True:
+            values = self._next_command()
+            if values[0] == "_error" and values[1] == transaction_id:
+                raise ConnectionError(f"RTMP コマンド失敗: {values[3:]}")
+            if values[0] == "_result" and values[1] == transaction_id:
+                return values
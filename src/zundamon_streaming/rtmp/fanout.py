@@ -0,0 +1,280 @@
+"""1回のエンコードを複数の配信先へ - 出力ごとに独立したキュー・再接続・バックログ集計
+
+エンコーダ（ffmpeg）は FLV を標準出力へ書き、FanOut がタグ単位に分けて
+各出力のキューへ配る。出力は実行中に add_output / remove_output でき、
+エンコーダは再起動しない。1つの出力が落ちても他には影響しない（tee の onfail=ignore 相当）。
+
+    rtmp://...      RTMP publish（rtmp/client.RTMPPublisher。rtmps は非対応）
+    それ以外        FLV ファイルへ追記（ローカル保存用）
+
+新しく繋がった出力には onMetaData と AVC/AAC のシーケンスヘッダを先に送り、
+次のキーフレームから映像を流す。バックログが上限を超えたら溜まった分を捨てて
+次のキーフレームまで待つ（dropped_tags に数える）。
+"""
+import re
+import struct
+import threading
+from collections import deque
+from typing import BinaryIO, Deque, Dict, Iterator, List, Optional, Tuple
+
+from ..utils.metrics import REGISTRY
+from ..utils.trace import trace_log
+from .protocol import MSG_AUDIO, MSG_DATA_AMF0, MSG_VIDEO, amf0_encode, flv_header, flv_tag
+from .readiness import backoff_delays
+
+Tag = Tuple[int, int, bytes]  # (種別, タイムスタンプms, ペイロード)
+
+DEFAULT_MAX_BACKLOG_BYTES = 8 * 1024 * 1024
+
+_ON_METADATA = amf0_encode("onMetaData")
+_SET_DATA_FRAME = amf0_encode("@setDataFrame")
+
+
+def read_flv_tags(source: BinaryIO) -> Iterator[Tag]:
+    """FLV バイト列からタグを順に取り出す（ヘッダは読み飛ばす）"""
+    header = source.read(9)
+    if len(header) < 9 or header[:3] != b"FLV":
+        return
+    source.read(struct.unpack(">I", header[5:9])[0] - 9 + 4)  # 残りのヘッダ + PreviousTagSize0
+    while True:
+        tag_header = source.read(11)
+        if len(tag_header) < 11:
+            return
+        size = int.from_bytes(tag_header[1:4], "big")
+        timestamp = int.from_bytes(tag_header[4:7], "big") | (tag_header[7] << 24)
+        payload = source.read(size)
+        source.read(4)
+        if len(payload) < size:
+            return
+        yield tag_header[0] & 0x1F, timestamp, payload
+
+
+def is_sequence_header(tag: Tag) -> bool:
+    type_id, _, payload = tag
+    if len(payload) < 2 or payload[1] != 0:
+        return False
+    if type_id == MSG_VIDEO:
+        return payload[0] & 0x0F == 7  # AVC
+    return type_id == MSG_AUDIO and payload[0] >> 4 == 10  # AAC
+
+
+def is_keyframe(tag: Tag) -> bool:
+    """シーケンスヘッダを除く映像キーフレーム"""
+    return tag[0] == MSG_VIDEO and bool(tag[2]) and tag[2][0] >> 4 == 1 and not is_sequence_header(tag)
+
+
+class _RTMPSink:
+    def __init__(self, url: str):
+        from .client import RTMPPublisher
+        self.publisher = RTMPPublisher(url)
+
+    def open(self):
+        self.publisher.connect()
+
+    def send(self, tag: Tag):
+        type_id, timestamp, payload = tag
+        if type_id == MSG_DATA_AMF0 and payload.startswith(_ON_METADATA):
+            payload = _SET_DATA_FRAME + payload
+        self.publisher.send_tag(type_id, timestamp, payload)
+
+    def close(self):
+        self.publisher.close()
+
+
+class _FileSink:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+
+    def open(self):
+        self.file = open(self.path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(flv_header())
+
+    def send(self, tag: Tag):
+        self.file.write(flv_tag(*tag))
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class Output:
+    """1つの配信先。送信スレッド・キュー・再接続を持つ"""
+
+    def __init__(self, name: str, target: str, headers, max_backlog_bytes: int = DEFAULT_MAX_BACKLOG_BYTES,
+                 reconnect_max_delay: float = 10.0):
+        self.name = name
+        self.target = target
+        self.max_backlog_bytes = max_backlog_bytes
+        self.reconnect_max_delay = reconnect_max_delay
+        self._headers = headers  # () -> List[Tag]（メタデータとシーケンスヘッダ）
+        self._queue: Deque[Tag] = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self.backlog_bytes = 0
+        self.need_keyframe = True
+        self.connected = False
+        self.stats = {"sent_tags": 0, "sent_bytes": 0, "dropped_tags": 0, "reconnects": 0,
+                      "max_backlog_bytes": 0, "last_error": ""}
+        self._gauge = "fanout_" + re.sub(r"\W", "_", name) + "_backlog_bytes"
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"fanout-{name}")
+
+    def _sink(self):
+        return _RTMPSink(self.target) if self.target.startswith("rtmp://") else _FileSink(self.target)
+
+    def start(self):
+        self._thread.start()
+
+    def put(self, tag: Tag):
+        with self._cond:
+            if self._stop.is_set():
+                return  # 削除済み（feed が削除前に取った一覧から呼んだ）
+            if self.backlog_bytes + len(tag[2]) > self.max_backlog_bytes:
+                # 溜まった分を捨てて次のキーフレームから再開
+                self.stats["dropped_tags"] += len(self._queue)
+                self._queue.clear()
+                self.backlog_bytes = 0
+                self.need_keyframe = True
+            self._queue.append(tag)
+            self.backlog_bytes += len(tag[2])
+            self.stats["max_backlog_bytes"] = max(self.stats["max_backlog_bytes"], self.backlog_bytes)
+            self._cond.notify()
+            REGISTRY.set_gauge(self._gauge, self.backlog_bytes)
+
+    def _get(self) -> Optional[Tag]:
+        with self._cond:
+            while not self._queue and not self._stop.is_set():
+                self._cond.wait(0.5)
+            if self._stop.is_set():
+                return None
+            tag = self._queue.popleft()
+            self.backlog_bytes -= len(tag[2])
+            if self.need_keyframe and not (is_keyframe(tag) or tag[0] == MSG_DATA_AMF0 or is_sequence_header(tag)):
+                self.stats["dropped_tags"] += 1
+                return ()  # キーフレーム待ちで捨てた
+            if is_keyframe(tag):
+                self.need_keyframe = False
+            return tag
+
+    def _connect(self):
+        delays = backoff_delays(0.5, max_delay=self.reconnect_max_delay)
+        while not self._stop.is_set():
+            sink = self._sink()
+            try:
+                sink.open()
+                for tag in self._headers():
+                    sink.send(tag)
+                with self._cond:
+                    self.need_keyframe = True
+                self.connected = True
+                trace_log(f"出力接続: {self.name} → {self.target}")
+                return sink
+            except (OSError, ConnectionError) as e:
+                self.stats["last_error"] = str(e)
+                sink.close()
+                delay = next(delays)
+                trace_log(f"出力接続失敗: {self.name} ({e}) {delay:.1f}秒後に再試行", "WARN")
+                self._stop.wait(delay)
+        return None
+
+    def _run(self):
+        sink = self._connect()
+        while sink is not None:
+            tag = self._get()
+            if tag is None:
+                break
+            if not tag:
+                continue
+            try:
+                sink.send(tag)
+                self.stats["sent_tags"] += 1
+                self.stats["sent_bytes"] += len(tag[2])
+            except (OSError, ConnectionError) as e:
+                self.connected = False
+                self.stats["reconnects"] += 1
+                self.stats["last_error"] = str(e)
+                trace_log(f"出力切断: {self.name} ({e})", "WARN")
+                sink.close()
+                sink = self._connect()
+        if sink is not None:
+            sink.close()
+        self.connected = False
+
+    def stop(self):
+        with self._cond:
+            self._stop.set()
+            REGISTRY.remove_gauge(self._gauge)
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+
+    def summary(self) -> Dict:
+        with self._cond:
+            return {"target": self.target, "connected": self.connected, "backlog_bytes": self.backlog_bytes,
+                    "backlog_tags": len(self._queue), **self.stats}
+
+
+class FanOut:
+    def __init__(self, max_backlog_bytes: int = DEFAULT_MAX_BACKLOG_BYTES):
+        self.max_backlog_bytes = max_backlog_bytes
+        self.outputs: Dict[str, Output] = {}
+        self.tags = 0
+        self._metadata: Optional[Tag] = None
+        self._sequence_headers: Dict[int, Tag] = {}
+        self._lock = threading.Lock()
+        self._reader: Optional[threading.Thread] = None
+
+    def _headers(self) -> List[Tag]:
+        with self._lock:
+            return ([self._metadata] if self._metadata else []) + list(self._sequence_headers.values())
+
+    def add_output(self, name: str, target: str) -> Output:
+        """実行中でも追加できる（エンコーダはそのまま）"""
+        output = Output(name, target, self._headers, self.max_backlog_bytes)
+        with self._lock:
+            if name in self.outputs:
+                raise ValueError(f"出力名が重複しています: {name}")
+            self.outputs[name] = output
+        output.start()
+        return output
+
+    def remove_output(self, name: str) -> Optional[Dict]:
+        with self._lock:
+            output = self.outputs.pop(name, None)
+        if output is None:
+            return None
+        output.stop()
+        trace_log(f"出力削除: {name}")
+        return output.summary()
+
+    def feed(self, type_id: int, timestamp: int, payload: bytes):
+        """エンコーダからのタグを全出力へ配る"""
+        tag = (type_id, timestamp, payload)
+        with self._lock:
+            self.tags += 1
+            if type_id == MSG_DATA_AMF0:
+                self._metadata = tag
+            elif is_sequence_header(tag):
+                self._sequence_headers[type_id] = tag
+            outputs = list(self.outputs.values())
+        for output in outputs:
+            output.put(tag)
+
+    def start(self, source: BinaryIO):
+        """FLV を読む source（ffmpeg の標準出力）からの配信を開始"""
+        def read_loop():
+            for tag in read_flv_tags(source):
+                self.feed(*tag)
+            trace_log("FanOut: エンコーダ出力終了")
+        self._reader = threading.Thread(target=read_loop, daemon=True, name="fanout-reader")
+        self._reader.start()
+
+    def stop(self):
+        for name in list(self.outputs):
+            self.remove_output(name)
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            outputs = dict(self.outputs)
+        return {name: output.summary() for name, output in outputs.items()}
@@ -2,16 +2,168 @@
 import subprocess
 import threading
 import os
-import time
+import re
+from typing import Dict, Optional
+from ..utils.metrics import REGISTRY
+from ..utils.trace import trace_log
+from .readiness import wait_until
 
-def trace_log(message, level="INFO"):
-    timestamp = time.time()
-    thread_id = threading.current_thread().ident
-    print(f"[{timestamp:.3f}][{thread_id}][{level}] {message}")
+_PROGRESS_RE = re.compile(r"(frame|fps|speed)=\s*([\d.]+)")
+
+def parse_progress(line: str) -> Optional[Dict[str, float]]:
+    """ffmpeg の進捗行（frame= fps= ... speed=1.0x）から数値を取り出す"""
+    values = {key: float(value) for key, value in _PROGRESS_RE.findall(line)}
+    return values or None
+
+def record_progress(line: str) -> bool:
+    """進捗行ならゲージ（ffmpeg_frame / ffmpeg_fps / ffmpeg_speed）を更新して True"""
+    values = parse_progress(line)
+    if not values or "speed" not in values and "frame" not in values:
+        return False
+    for key, value in values.items():
+        REGISTRY.set_gauge(f"ffmpeg_{key}", value)
+    return True
+
+def is_first_packet(line: str) -> bool:
+    """frame が 1 以上の進捗行 = 最初のパケットが mux された"""
+    values = parse_progress(line)
+    return bool(values) and values.get("frame", 0) >= 1
+
+def tee_output(urls) -> list:
+    """1回のエンコードを複数の配信先へ出す tee 出力（1つ失敗しても他は続行）"""
+    return ["-flags", "+global_header", "-f", "tee",
+            "|".join(f"[f=flv:onfail=ignore]{url}" for url in urls)]
+
+IDLE_KEYFRAME_SECONDS = 2
+
+def build_rawvideo_cmd(size, rtmp_url, fps: int = 30, background_video: str = None,
+                       preset: str = "ultrafast", tune: str = None, ts_offset: float = 0.0,
+                       idle_output: str = None, input_pix_fmt: str = "rgba") -> list:
+    """標準入力の生RGBAフレームを受けて配信するコマンド（背景動画があれば重ねる）
+    
+    rtmp_url にリストを渡すと tee で固定の複数配信先へ出す（実行中の増減は FanOut を使う）。
+    ts_offset（秒）は再起動時に出力タイムスタンプを途中から続けるためのもの。
+    idle_output は変化時・キープアライブ時だけフレームを書くアイドルモード用：
+    入力のタイムスタンプを到着時刻から付け、"vfr" はそのまま可変フレームレートの FLV、
+    "cfr" は fps へ複製して固定フレームレートで出す（背景動画ありは背景のレートになる）。
+    input_pix_fmt は標準入力のフレーム形式（image/frame_cache で変換済みなら yuv420p / yuva420p）。
+    """
+    width, height = size
+    raw_input = [
+        *(["-use_wallclock_as_timestamps", "1"] if idle_output else []),
+        "-f", "rawvideo", "-pix_fmt", input_pix_fmt, "-s", f"{width}x{height}",
+        "-framerate", str(fps), "-i", "pipe:0",
+    ]
+    encode = ["-c:v", "libx264", "-preset", preset, *(["-tune", tune] if tune else []), "-pix_fmt", "yuv420p"]
+    if idle_output:
+        # フレームが間引かれてもキーフレーム間隔は秒で保つ（途中から見る視聴者用）
+        encode += ["-force_key_frames", f"expr:gte(t,n_forced*{IDLE_KEYFRAME_SECONDS})"]
+    tee = isinstance(rtmp_url, (list, tuple))
+    output = tee_output(rtmp_url) if tee else ["-f", "flv", rtmp_url]
+    if ts_offset:
+        output = ["-output_ts_offset", f"{ts_offset:.3f}", *output]
+    if background_video:
+        foreground = "[1:v]setpts=PTS-STARTPTS[fg];[0:v][fg]" if idle_output else "[0:v][1:v]"
+        return [
+            "ffmpeg",
+            "-re", "-stream_loop", "-1", "-i", background_video,
+            *raw_input,
+            "-filter_complex", f"{foreground}overlay[outv]",
+            "-map", "[outv]", "-map", "0:a?",
+            *encode,
+            "-c:a", "aac", *output
+        ]
+    if idle_output == "cfr":
+        timing = ["-vf", "setpts=PTS-STARTPTS", "-fps_mode", "cfr", "-r", str(fps)]
+    elif idle_output:
+        timing = ["-vf", "setpts=PTS-STARTPTS", "-fps_mode", "vfr"]
+    else:
+        timing = []
+    return [
+        "ffmpeg",
+        *raw_input,
+        *(["-map", "0:v"] if tee else []),
+        *timing,
+        *encode,
+        *output
+    ]
+
+# 透過（キャラクターのみ）出力。OBS などの合成側がファイル / パイプを読む
+ALPHA_CODECS = {
+    "vp9": ["-c:v", "libvpx-vp9", "-pix_fmt", "yuva420p", "-auto-alt-ref", "0",
+            "-deadline", "realtime", "-cpu-used", "8", "-row-mt", "1", "-b:v", "2M", "-f", "webm"],
+    "qtrle": ["-c:v", "qtrle", "-pix_fmt", "argb", "-f", "mov", "-movflags", "frag_keyframe+empty_moov"],
+}
+
+def alpha_output(codec: str, target: str) -> list:
+    if codec not in ALPHA_CODECS:
+        raise ValueError(f"未対応の透過コーデック: {codec}（{', '.join(ALPHA_CODECS)}）")
+    return [*ALPHA_CODECS[codec], target]
+
+def segment_target(target: str, segment: int) -> str:
+    """再起動後の出力先。通常ファイルなら segment 番目から空いている name.partN.ext（-y で前の録画を消さない）
+
+    segment 0 と URL・pipe:・名前付きパイプなど通常ファイル以外はそのまま返す。
+    """
+    if segment <= 0 or "://" in target or target.startswith("pipe:") or (
+            os.path.exists(target) and not os.path.isfile(target)):
+        return target
+    stem, ext = os.path.splitext(target)
+    while os.path.exists(f"{stem}.part{segment}{ext}"):
+        segment += 1
+    return f"{stem}.part{segment}{ext}"
+
+def build_alpha_cmd(size, target: str, fps: int = 30, codec: str = "vp9", input_pix_fmt: str = "rgba",
+                    segment: int = 0) -> list:
+    """標準入力のキャラクターフレームを背景なし・アルファ付きで target（ファイル / 名前付きパイプ / URL）へ
+
+    segment > 0 は再起動後の出力（ファイルなら別名の続き。segment_target 参照）
+    """
+    width, height = size
+    return [
+        "ffmpeg", "-y",
+        "-f", "rawvideo", "-pix_fmt", input_pix_fmt, "-s", f"{width}x{height}",
+        "-framerate", str(fps), "-i", "pipe:0",
+        *alpha_output(codec, segment_target(target, segment))
+    ]
 
 class FFmpegStreamer:
     def __init__(self):
         self.process = None
+        self.first_packet = threading.Event()
+        self.supervisor = None  # EncoderSupervisor（進捗行を渡して停止を検出させる）
+        self.progress_frame = 0  # 直近の進捗行の frame=（エンコーダが消費したフレーム数）
+        self.writing = False  # write_frame の書き込み中（パイプが詰まると ffmpeg の消費待ちでここに留まる）
+    
+    def _on_stderr_line(self, line: str, process=None) -> bool:
+        """進捗行ならゲージ更新（最初のパケットを検出）して True"""
+        if not record_progress(line):
+            return False
+        self.progress_frame = int(parse_progress(line).get("frame", self.progress_frame))
+        if not self.first_packet.is_set() and is_first_packet(line):
+            self.first_packet.set()
+        if self.supervisor is not None:
+            self.supervisor.progressed(process)
+        return True
+    
+    def _watch_stderr(self, process):
+        """process の標準エラーを読む（再起動後に古いプロセスの行が混ざらないよう process を固定）"""
+        def monitor_stderr():
+            try:
+                for line in process.stderr:
+                    if self._on_stderr_line(line, process):
+                        continue
+                    print(f"FFmpeg ERROR: {line.strip()}")
+            except:
+                pass
+        
+        threading.Thread(target=monitor_stderr, daemon=True).start()
+    
+    def wait_first_packet(self, timeout: float = 10.0) -> bool:
+        """ffmpeg が最初のパケットを出すまで待つ（プロセスが落ちたら即 False）"""
+        process = self.process
+        return wait_until(self.first_packet.is_set, timeout,
+                          abort=lambda: process is None or process.poll() is not None)
     
     def start_3stream(self, base_pattern: str, mouth_pattern: str, eyes_pattern: str, 
                      rtmp_url: str, fps: int = 30) -> bool:
@@ -34,6 +186,7 @@ class FFmpegStreamer:
         trace_log(f"目: {eyes_pattern}")
         trace_log(f"FFmpeg command: {' '.join(cmd)}")
         
+        self.first_packet.clear()
         self.process = subprocess.Popen(
             cmd,
             stdout=subprocess.PIPE,
@@ -45,6 +198,8 @@ class FFmpegStreamer:
         def monitor_stderr():
             try:
                 for line in self.process.stderr:
+                    if self._on_stderr_line(line):
+                        continue
                     print(f"FFmpeg ERROR: {line.strip()}")
             except:
                 pass
@@ -92,6 +247,7 @@ class FFmpegStreamer:
         trace_log(f"FFmpeg command: {' '.join(cmd)}")
         trace_log("単一ストリーム配信開始")
         
+        self.first_packet.clear()
         self.process = subprocess.Popen(
             cmd,
             stdout=subprocess.PIPE,
@@ -102,6 +258,8 @@ class FFmpegStreamer:
         def monitor_stderr():
             try:
                 for line in self.process.stderr:
+                    if self._on_stderr_line(line):
+                        continue
                     print(f"FFmpeg ERROR: {line.strip()}")
             except:
                 pass
@@ -118,9 +276,93 @@ class FFmpegStreamer:
         
         return True
     
+    def start_rawvideo(self, size, rtmp_url: str, fps: int = 30, background_video: str = None,
+                       **encoder_options) -> bool:
+        """生フレームパイプ配信（write_frame でフレームを書き込む。encoder_options は preset / tune）"""
+        if background_video and not os.path.exists(background_video):
+            trace_log(f"背景動画が見つかりません: {background_video}", "ERROR")
+            return False
+        
+        cmd = build_rawvideo_cmd(size, rtmp_url, fps, background_video, **encoder_options)
+        trace_log(f"FFmpeg command: {' '.join(cmd)}")
+        trace_log("生フレームパイプ配信開始")
+        
+        self.first_packet.clear()
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+        self._watch_stderr(self.process)
+        
+        return True
+    
+    def start_alpha(self, size, target: str, fps: int = 30, codec: str = "vp9",
+                    input_pix_fmt: str = "rgba", segment: int = 0) -> bool:
+        """キャラクターのみの透過出力（write_frame でフレームを書き込む）。再起動時は segment を進める"""
+        cmd = build_alpha_cmd(size, target, fps, codec, input_pix_fmt, segment)
+        trace_log(f"FFmpeg command: {' '.join(cmd)}")
+        trace_log(f"透過出力開始 ({codec})")
+        
+        self.first_packet.clear()
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+        self._watch_stderr(self.process)
+        
+        return True
+    
+    def start_fanout(self, size, fanout, fps: int = 30, background_video: str = None,
+                     **encoder_options) -> bool:
+        """1回だけエンコードして FLV を標準出力へ出し、FanOut に配らせる"""
+        if background_video and not os.path.exists(background_video):
+            trace_log(f"背景動画が見つかりません: {background_video}", "ERROR")
+            return False
+        
+        cmd = build_rawvideo_cmd(size, "pipe:1", fps, background_video, **encoder_options)
+        cmd[-1:-1] = ["-flvflags", "no_duration_filesize"]
+        trace_log(f"FFmpeg command: {' '.join(cmd)}")
+        trace_log("ファンアウト配信開始")
+        
+        self.first_packet.clear()
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+        fanout.start(self.process.stdout.buffer)
+        self._watch_stderr(self.process)
+        
+        return True
+    
+    def write_frame(self, data) -> bool:
+        """生フレームを標準入力へ書き込み"""
+        self.writing = True
+        try:
+            with REGISTRY.timer("write"):
+                self.process.stdin.buffer.write(data)
+            return True
+        except (BrokenPipeError, OSError, AttributeError, ValueError):
+            return False
+        finally:
+            self.writing = False
+    
     def stop(self):
         """FFmpegプロセス停止"""
         if self.process:
+            if self.process.stdin:
+                try:
+                    self.process.stdin.close()
+                except OSError:
+                    pass
             trace_log("FFmpeg停止開始")
             self.process.terminate()
             try:
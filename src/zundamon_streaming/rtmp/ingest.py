@@ -0,0 +1,281 @@
+"""ローカル RTMP 受け口 - Node/nginx なしで publish を受けて FLV タグを数える
+
+asyncio で動く最小限の RTMP サーバー。connect / createStream / publish に応答し、
+受け取った audio / video / script タグを配信名ごとに集計する（再生には対応しない）。
+RTMPServer と同じ start / stop / rtmp_url を持つので差し替えて使える。
+
+    python -m src.zundamon_streaming.rtmp.ingest --port 1935
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from ..utils.trace import trace_log
+from .protocol import (
+    FLV_TAG_TYPES, HANDSHAKE_SIZE, MSG_COMMAND_AMF0, MSG_DATA_AMF0, MSG_SET_CHUNK_SIZE,
+    MSG_SET_PEER_BANDWIDTH, MSG_WINDOW_ACK_SIZE, MSG_ACK, RTMP_VERSION, ChunkDecoder,
+    RTMPMessage, amf0_decode, command_message, control_message, encode_chunks, stream_begin,
+)
+from .readiness import StartupReport, wait_for_rtmp
+
+WINDOW_ACK_SIZE = 2500000
+
+# on_tag(配信名, 種別, RTMPタイムスタンプms, ペイロード, 受信時刻 perf_counter)
+TagCallback = Callable[[str, str, int, bytes, float], None]
+
+
+class IngestStream:
+    """1本の publish で受け取った FLV タグの集計"""
+
+    def __init__(self, path: str, keep_tags: int = 0):
+        self.path = path
+        self.counts = {"audio": 0, "video": 0, "script": 0}
+        self.keyframes = 0
+        self.bytes = 0
+        self.first_timestamp: Optional[int] = None
+        self.last_timestamp: Optional[int] = None
+        self.first_arrival: Optional[float] = None
+        self.last_arrival: Optional[float] = None
+        self.metadata: Dict = {}
+        self.active = True
+        self.tags: Deque[tuple] = deque(maxlen=keep_tags)  # (受信時刻, 種別, タイムスタンプ, バイト数)
+
+    def record(self, kind: str, timestamp: int, payload: bytes, arrival: float):
+        self.counts[kind] += 1
+        self.bytes += len(payload)
+        if kind == "video" and payload and payload[0] >> 4 == 1:
+            self.keyframes += 1
+        if kind != "script":
+            if self.first_timestamp is None:
+                self.first_timestamp = timestamp
+            self.last_timestamp = timestamp
+        if self.first_arrival is None:
+            self.first_arrival = arrival
+        self.last_arrival = arrival
+        self.tags.append((arrival, kind, timestamp, len(payload)))
+
+    def summary(self) -> Dict:
+        received = (self.last_arrival - self.first_arrival) if self.first_arrival is not None else 0.0
+        media_ms = (self.last_timestamp - self.first_timestamp) if self.first_timestamp is not None else 0
+        return {
+            "tags": sum(self.counts.values()),
+            **{f"{kind}_tags": count for kind, count in self.counts.items()},
+            "keyframes": self.keyframes,
+            "bytes": self.bytes,
+            "media_ms": media_ms,
+            "received_seconds": received,
+            "video_fps": self.counts["video"] / received if received > 0 else 0.0,
+            "kbps": self.bytes * 8 / 1000 / received if received > 0 else 0.0,
+            "active": self.active,
+            "metadata": self.metadata,
+        }
+
+
+class LocalRTMPServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 1935, app: str = "live",
+                 stream: str = "test-stream", on_tag: Optional[TagCallback] = None,
+                 keep_tags: int = 0, chunk_size: int = 4096):
+        """port=0 で空きポート。on_tag は受信ループ上で呼ばれるので軽くすること"""
+        self.host = host
+        self.port = port
+        self.app = app
+        self.stream = stream
+        self.on_tag = on_tag
+        self.keep_tags = keep_tags
+        self.chunk_size = chunk_size
+        self.streams: Dict[str, IngestStream] = {}
+        self.connections = 0
+        self.startup: Optional[StartupReport] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self._writers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def rtmp_url(self) -> str:
+        return f"rtmp://{self.host}:{self.port}/{self.app}/{self.stream}"
+
+    # ---------- 起動・停止 ----------
+    def start(self, report: Optional[StartupReport] = None, timeout: float = 5.0) -> bool:
+        trace_log("ローカルRTMP受け口起動開始")
+        self.startup = report or StartupReport()
+        bound = threading.Event()
+        errors: List[BaseException] = []
+        self._thread = threading.Thread(target=self._run, args=(bound, errors), daemon=True,
+                                        name="rtmp-ingest")
+        self._thread.start()
+        bound.wait(timeout)
+        if errors or self._server is None:
+            trace_log(f"ローカルRTMP受け口起動失敗: {errors[0] if errors else 'timeout'}", "ERROR")
+            return False
+        if not wait_for_rtmp(self.rtmp_url, self.startup, timeout):
+            self.stop()
+            return False
+        trace_log(f"ローカルRTMP受け口起動成功: {self.rtmp_url}")
+        return True
+
+    def _run(self, bound: threading.Event, errors: List[BaseException]):
+        loop = self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._server = loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+        except OSError as e:
+            errors.append(e)
+            bound.set()
+            loop.close()
+            return
+        bound.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    async def _shutdown(self):
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+    def stop(self):
+        if self._loop is None or self._server is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=5)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._server = None
+        self._loop = None
+        trace_log("ローカルRTMP受け口停止")
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {path: stream.summary() for path, stream in self.streams.items()}
+
+    # ---------- 接続処理 ----------
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        self.connections += 1
+        session = {"app": "", "stream": None, "chunk_size": 128, "window": WINDOW_ACK_SIZE,
+                   "received": 0, "acked": 0}
+        try:
+            c0c1 = await reader.readexactly(1 + HANDSHAKE_SIZE)
+            s1 = bytes(8) + os.urandom(HANDSHAKE_SIZE - 8)
+            writer.write(bytes([RTMP_VERSION]) + s1 + c0c1[1:])  # S0 + S1 + S2(C1 のエコー)
+            await writer.drain()
+            await reader.readexactly(HANDSHAKE_SIZE)  # C2
+            decoder = ChunkDecoder()
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                arrival = time.perf_counter()
+                session["received"] += len(data)
+                if session["received"] - session["acked"] >= session["window"]:
+                    session["acked"] = session["received"]
+                    self._send(writer, session, control_message(MSG_ACK, session["received"]), 2)
+                for message in decoder.feed(data):
+                    self._dispatch(message, writer, session, arrival)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            if not isinstance(e, asyncio.IncompleteReadError):
+                trace_log(f"RTMP受信エラー: {e}", "WARN")
+        finally:
+            stream = session["stream"]
+            if stream is not None:
+                stream.active = False
+                trace_log(f"publish終了: {stream.path} {stream.summary()['tags']}タグ")
+            self._writers.discard(writer)
+            writer.close()
+
+    def _send(self, writer: asyncio.StreamWriter, session: Dict, message: RTMPMessage, csid: int):
+        writer.write(encode_chunks(message, csid, session["chunk_size"]))
+
+    def _dispatch(self, message: RTMPMessage, writer: asyncio.StreamWriter, session: Dict, arrival: float):
+        kind = FLV_TAG_TYPES.get(message.type_id)
+        stream = session["stream"]
+        if kind is not None and stream is not None:
+            if message.type_id == MSG_DATA_AMF0:
+                values = amf0_decode(message.payload)
+                if "onMetaData" in values[:2] and isinstance(values[-1], dict):
+                    stream.metadata = values[-1]
+            with self._lock:
+                stream.record(kind, message.timestamp, message.payload, arrival)
+            if self.on_tag is not None:
+                self.on_tag(stream.path, kind, message.timestamp, message.payload, arrival)
+        elif message.type_id == MSG_WINDOW_ACK_SIZE and len(message.payload) >= 4:
+            session["window"] = int.from_bytes(message.payload[:4], "big") or WINDOW_ACK_SIZE
+        elif message.type_id == MSG_COMMAND_AMF0:
+            self._command(amf0_decode(message.payload), writer, session)
+
+    def _command(self, values: List, writer: asyncio.StreamWriter, session: Dict):
+        if len(values) < 2:
+            return
+        name, transaction_id = values[0], values[1]
+        if name == "connect":
+            session["app"] = (values[2] or {}).get("app", "") if len(values) > 2 else ""
+            self._send(writer, session, control_message(MSG_WINDOW_ACK_SIZE, WINDOW_ACK_SIZE), 2)
+            self._send(writer, session, control_message(MSG_SET_PEER_BANDWIDTH, WINDOW_ACK_SIZE, 2), 2)
+            self._send(writer, session, control_message(MSG_SET_CHUNK_SIZE, self.chunk_size), 2)
+            session["chunk_size"] = self.chunk_size
+            self._send(writer, session, command_message(
+                "_result", transaction_id,
+                {"fmsVer": "FMS/3,0,1,123", "capabilities": 31},
+                {"level": "status", "code": "NetConnection.Connect.Success",
+                 "description": "Connection succeeded.", "objectEncoding": 0}), 3)
+        elif name == "createStream":
+            self._send(writer, session, command_message("_result", transaction_id, None, 1), 3)
+        elif name == "publish":
+            stream_name = values[3] if len(values) > 3 else ""
+            path = f"{session['app']}/{stream_name}"
+            stream = IngestStream(path, self.keep_tags)
+            with self._lock:
+                self.streams[path] = stream
+            session["stream"] = stream
+            self._send(writer, session, stream_begin(1), 2)
+            self._send(writer, session, command_message(
+                "onStatus", 0, None,
+                {"level": "status", "code": "NetStream.Publish.Start",
+                 "description": f"{path} is now published."}, stream_id=1), 5)
+            trace_log(f"publish開始: {path}")
+        elif name in ("deleteStream", "FCUnpublish"):
+            if session["stream"] is not None:
+                session["stream"].active = False
+        elif transaction_id:
+            # releaseStream / FCPublish など応答を待たれないものにも空の _result を返す
+            self._send(writer, session, command_message("_result", transaction_id, None), 3)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m src.zundamon_streaming.rtmp.ingest")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1935)
+    parser.add_argument("--interval", type=float, default=5.0, help="集計の表示間隔（秒）")
+    args = parser.parse_args(argv)
+
+    server = LocalRTMPServer(args.host, args.port)
+    if not server.start():
+        return
+    print(f"ローカルRTMP受け口: {server.rtmp_url}  (Ctrl+C で停止)")
+    try:
+        while True:
+            time.sleep(args.interval)
+            for path, summary in server.stats().items():
+                summary.pop("metadata")
+                print(f"{path}: {json.dumps(summary, ensure_ascii=False)}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""RTMP の最小実装 - AMF0 とチャンクの読み書き（ローカル受け口・試験用クライアントで共用）"""
+import struct
+from typing import Any, Dict, List, NamedTuple, Optional
+
+RTMP_VERSION = 3
+HANDSHAKE_SIZE = 1536
+DEFAULT_CHUNK_SIZE = 128
+
+# メッセージ種別
+MSG_SET_CHUNK_SIZE = 1
+MSG_ABORT = 2
+MSG_ACK = 3
+MSG_USER_CONTROL = 4
+MSG_WINDOW_ACK_SIZE = 5
+MSG_SET_PEER_BANDWIDTH = 6
+MSG_AUDIO = 8
+MSG_VIDEO = 9
+MSG_DATA_AMF0 = 18
+MSG_COMMAND_AMF0 = 20
+
+# FLV タグとして扱うメッセージ
+FLV_TAG_TYPES = {MSG_AUDIO: "audio", MSG_VIDEO: "video", MSG_DATA_AMF0: "script"}
+
+_EXTENDED = 0xFFFFFF
+_HEADER_SIZES = (11, 7, 3, 0)
+
+
+class RTMPMessage(NamedTuple):
+    type_id: int
+    stream_id: int
+    timestamp: int
+    payload: bytes
+
+
+# ---------- AMF0 ----------
+def _encode_value(value: Any) -> bytes:
+    if value is None:
+        return b"\x05"
+    if isinstance(value, bool):
+        return b"\x01" + (b"\x01" if value else b"\x00")
+    if isinstance(value, (int, float)):
+        return b"\x00" + struct.pack(">d", float(value))
+    if isinstance(value, str):
+        raw = value.encode("utf-8")
+        return b"\x02" + struct.pack(">H", len(raw)) + raw
+    if isinstance(value, dict):
+        body = b"".join(struct.pack(">H", len(k.encode("utf-8"))) + k.encode("utf-8") + _encode_value(v)
+                        for k, v in value.items())
+        return b"\x03" + body + b"\x00\x00\x09"
+    if isinstance(value, (list, tuple)):
+        return b"\x0a" + struct.pack(">I", len(value)) + b"".join(_encode_value(v) for v in value)
+    raise TypeError(f"AMF0 で表せない値: {type(value).__name__}")
+
+
+def amf0_encode(*values: Any) -> bytes:
+    return b"".join(_encode_value(v) for v in values)
+
+
+def _decode_value(data: bytes, pos: int):
+    marker = data[pos]
+    pos += 1
+    if marker == 0x00:
+        return struct.unpack_from(">d", data, pos)[0], pos + 8
+    if marker == 0x01:
+        return data[pos] != 0, pos + 1
+    if marker == 0x02:
+        (length,) = struct.unpack_from(">H", data, pos)
+        return data[pos + 2:pos + 2 + length].decode("utf-8", "replace"), pos + 2 + length
+    if marker in (0x03, 0x08):  # object / ECMA array
+        if marker == 0x08:
+            pos += 4
+        result: Dict[str, Any] = {}
+        while pos + 3 <= len(data):
+            (length,) = struct.unpack_from(">H", data, pos)
+            if length == 0 and data[pos + 2] == 0x09:
+                return result, pos + 3
+            key = data[pos + 2:pos + 2 + length].decode("utf-8", "replace")
+            result[key], pos = _decode_value(data, pos + 2 + length)
+        return result, pos
+    if marker in (0x05, 0x06):  # null / undefined
+        return None, pos
+    if marker == 0x0a:
+        (count,) = struct.unpack_from(">I", data, pos)
+        pos += 4
+        items = []
+        for _ in range(count):
+            item, pos = _decode_value(data, pos)
+            items.append(item)
+        return items, pos
+    raise ValueError(f"未対応の AMF0 型: 0x{marker:02x}")
+
+
+def amf0_decode(data: bytes) -> List[Any]:
+    values = []
+    pos = 0
+    while pos < len(data):
+        value, pos = _decode_value(data, pos)
+        values.append(value)
+    return values
+
+
+# ---------- チャンク ----------
+class ChunkDecoder:
+    """受信バイト列を feed し、組み上がったメッセージを返す（Set Chunk Size も反映）"""
+
+    def __init__(self):
+        self.chunk_size = DEFAULT_CHUNK_SIZE
+        self._buf = bytearray()
+        self._streams: Dict[int, dict] = {}
+
+    def feed(self, data: bytes) -> List[RTMPMessage]:
+        self._buf.extend(data)
+        messages = []
+        while True:
+            message = self._next_chunk()
+            if message is False:
+                return messages
+            if message is not None:
+                if message.type_id == MSG_SET_CHUNK_SIZE and len(message.payload) >= 4:
+                    self.chunk_size = struct.unpack(">I", message.payload[:4])[0] & 0x7FFFFFFF
+                messages.append(message)
+
+    def _next_chunk(self):
+        """チャンクを1つ消費する。足りなければ False、メッセージ途中なら None"""
+        buf = self._buf
+        if not buf:
+            return False
+        fmt, csid, pos = buf[0] >> 6, buf[0] & 0x3F, 1
+        if csid == 0:
+            if len(buf) < 2:
+                return False
+            csid, pos = 64 + buf[1], 2
+        elif csid == 1:
+            if len(buf) < 3:
+                return False
+            csid, pos = 64 + buf[1] + buf[2] * 256, 3
+        end = pos + _HEADER_SIZES[fmt]
+        if len(buf) < end:
+            return False
+
+        prev = self._streams.get(csid) or {"timestamp": 0, "delta": 0, "length": 0, "type_id": 0,
+                                           "stream_id": 0, "extended": False, "partial": bytearray()}
+        state = dict(prev)
+        if fmt <= 2:
+            ts_field = int.from_bytes(buf[pos:pos + 3], "big")
+            state["extended"] = ts_field == _EXTENDED
+        if fmt <= 1:
+            state["length"] = int.from_bytes(buf[pos + 3:pos + 6], "big")
+            state["type_id"] = buf[pos + 6]
+        if fmt == 0:
+            state["stream_id"] = int.from_bytes(buf[pos + 7:pos + 11], "little")
+        pos = end
+        if state["extended"]:
+            if len(buf) < pos + 4:
+                return False
+            ts_field = int.from_bytes(buf[pos:pos + 4], "big")
+            pos += 4
+
+        partial = prev["partial"]
+        if not partial:  # 新しいメッセージの先頭
+            if fmt == 0:  # 続く fmt3 はこの値を差分として足す（ffmpeg と同じ解釈）
+                state["timestamp"], state["delta"] = ts_field, ts_field
+            elif fmt in (1, 2):
+                state["delta"] = ts_field
+                state["timestamp"] = prev["timestamp"] + ts_field
+            else:
+                state["timestamp"] = prev["timestamp"] + prev["delta"]
+        take = min(self.chunk_size, state["length"] - len(partial))
+        if len(buf) < pos + take:
+            return False
+
+        partial.extend(buf[pos:pos + take])
+        del buf[:pos + take]
+        state["partial"] = partial
+        self._streams[csid] = state
+        if len(partial) < state["length"]:
+            return None
+        state["partial"] = bytearray()
+        return RTMPMessage(state["type_id"], state["stream_id"], state["timestamp"] & 0xFFFFFFFF, bytes(partial))
+
+
+def encode_chunks(message: RTMPMessage, csid: int, chunk_size: int) -> bytes:
+    """メッセージを fmt0 + fmt3 継続チャンクに分ける（csid は 2〜63）"""
+    extended = message.timestamp >= _EXTENDED
+    ts_field = _EXTENDED if extended else message.timestamp
+    ext = struct.pack(">I", message.timestamp & 0xFFFFFFFF) if extended else b""
+    out = bytearray()
+    out.append(csid)
+    out += ts_field.to_bytes(3, "big") + len(message.payload).to_bytes(3, "big")
+    out.append(message.type_id)
+    out += struct.pack("<I", message.stream_id) + ext
+    payload = message.payload
+    out += payload[:chunk_size]
+    for offset in range(chunk_size, len(payload), chunk_size):
+        out.append(0xC0 | csid)
+        out += ext + payload[offset:offset + chunk_size]
+    return bytes(out)
+
+
+def control_message(type_id: int, value: int, limit_type: Optional[int] = None) -> RTMPMessage:
+    """Set Chunk Size / Ack / Window Ack Size / Set Peer Bandwidth"""
+    payload = struct.pack(">I", value & 0xFFFFFFFF)
+    if limit_type is not None:
+        payload += bytes([limit_type])
+    return RTMPMessage(type_id, 0, 0, payload)
+
+
+def stream_begin(stream_id: int) -> RTMPMessage:
+    return RTMPMessage(MSG_USER_CONTROL, 0, 0, struct.pack(">HI", 0, stream_id))
+
+
+def command_message(name: str, transaction_id: float, *args: Any, stream_id: int = 0) -> RTMPMessage:
+    return RTMPMessage(MSG_COMMAND_AMF0, stream_id, 0, amf0_encode(name, transaction_id, *args))
+
+
+# ---------- FLV ----------
+def flv_header(audio: bool = True, video: bool = True) -> bytes:
+    flags = (0x04 if audio else 0) | (0x01 if video else 0)
+    return b"FLV\x01" + bytes([flags]) + struct.pack(">I", 9) + bytes(4)
+
+
+def flv_tag(type_id: int, timestamp: int, payload: bytes) -> bytes:
+    """RTMP の audio / video / script メッセージを FLV タグ（+ PreviousTagSize）にする"""
+    header = (bytes([type_id]) + len(payload).to_bytes(3, "big")
+              + (timestamp & 0xFFFFFF).to_bytes(3, "big") + bytes([(timestamp >> 24) & 0xFF]) + bytes(3))
+    return header + payload + struct.pack(">I", len(header) + len(payload))
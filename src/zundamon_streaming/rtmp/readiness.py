@@ -0,0 +1,119 @@
+"""起動待ち - 固定 sleep の代わりに実際の準備完了を指数バックオフでポーリングする
+
+段階: TCP ポートが開く → RTMP ハンドシェイクが通る → ffmpeg が最初のパケットを出す
+各段階の所要時間は StartupReport に記録する。
+"""
+import os
+import socket
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from ..utils.trace import trace_log
+from .protocol import HANDSHAKE_SIZE, RTMP_VERSION
+
+
+def backoff_delays(initial: float = 0.02, factor: float = 2.0, max_delay: float = 0.25) -> Iterator[float]:
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, max_delay)
+
+
+def wait_until(predicate: Callable[[], bool], timeout: float, abort: Optional[Callable[[], bool]] = None,
+               initial: float = 0.02, max_delay: float = 0.25) -> bool:
+    """predicate が True になるまで指数バックオフで待つ（abort が True なら即失敗）"""
+    deadline = time.monotonic() + timeout
+    for delay in backoff_delays(initial, max_delay=max_delay):
+        if predicate():
+            return True
+        if abort is not None and abort():
+            return False
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+    return False
+
+
+def parse_rtmp_url(url: str) -> Tuple[str, int]:
+    parsed = urlparse(url)
+    return parsed.hostname or "localhost", parsed.port or 1935
+
+
+def tcp_port_open(host: str, port: int, timeout: float = 0.5) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("ハンドシェイク中に切断")
+        data += chunk
+    return data
+
+
+def rtmp_handshake(host: str, port: int, timeout: float = 1.0) -> bool:
+    """C0+C1 を送り S0+S1+S2 を受け取り C2 を返す（RTMP を話すサーバーか確認）"""
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            c1 = bytes(8) + os.urandom(HANDSHAKE_SIZE - 8)
+            sock.sendall(bytes([RTMP_VERSION]) + c1)
+            s0 = _recv_exact(sock, 1)
+            s1 = _recv_exact(sock, HANDSHAKE_SIZE)
+            _recv_exact(sock, HANDSHAKE_SIZE)  # S2
+            sock.sendall(s1)  # C2 = S1 のエコー
+            return s0[0] == RTMP_VERSION
+    except (OSError, ConnectionError):
+        return False
+
+
+class StartupReport:
+    """起動段階ごとの所要時間"""
+
+    def __init__(self):
+        self.phases: List[Dict] = []
+        self._start = time.monotonic()
+
+    @contextmanager
+    def phase(self, name: str):
+        """with report.phase("tcp_port") as result: result["ok"] = ..."""
+        result = {"phase": name, "ok": False}
+        t0 = time.monotonic()
+        try:
+            yield result
+        finally:
+            result["seconds"] = time.monotonic() - t0
+            self.phases.append(result)
+            level = "INFO" if result["ok"] else "ERROR"
+            trace_log(f"起動段階 {name}: {'OK' if result['ok'] else 'NG'} {result['seconds'] * 1000:.0f}ms", level)
+
+    def total_seconds(self) -> float:
+        return time.monotonic() - self._start
+
+    def summary(self) -> Dict:
+        return {"phases": list(self.phases), "total_seconds": self.total_seconds(),
+                "ready": bool(self.phases) and all(p["ok"] for p in self.phases)}
+
+
+def wait_for_rtmp(url: str, report: Optional[StartupReport] = None, timeout: float = 15.0,
+                  abort: Optional[Callable[[], bool]] = None) -> bool:
+    """TCP ポート → RTMP ハンドシェイクの順に待つ"""
+    report = report or StartupReport()
+    host, port = parse_rtmp_url(url)
+    deadline = time.monotonic() + timeout
+    with report.phase("tcp_port") as result:
+        result["ok"] = wait_until(lambda: tcp_port_open(host, port), timeout, abort)
+    if not result["ok"]:
+        return False
+    with report.phase("rtmp_handshake") as result:
+        result["ok"] = wait_until(lambda: rtmp_handshake(host, port),
+                                  max(0.5, deadline - time.monotonic()), abort)
+    return result["ok"]
@@ -1,50 +1,57 @@
-"""Node.js RTMPサーバー制御"""
-import subprocess
-import socket
-import time
+"""RTMPサーバー制御 - node-media-server / nginx-rtmp / ローカル受け口を切り替え
 
-def trace_log(message, level="INFO"):
-    import time, threading
-    timestamp = time.time()
-    thread_id = threading.current_thread().ident
-    print(f"[{timestamp:.3f}][{thread_id}][{level}] {message}")
+どのバックエンドも start(report, timeout) / stop() / rtmp_url を持つ。
+create_server() は ZUNDAMON_RTMP_BACKEND（node / nginx / local）で選ぶ。
+"""
+import os
+import subprocess
+from typing import List, Optional
+from ..utils.config import RTMP_BACKEND
+from ..utils.trace import trace_log
+from .ingest import LocalRTMPServer
+from .readiness import StartupReport, parse_rtmp_url, tcp_port_open, wait_for_rtmp
 
 class RTMPServer:
+    """外部プロセスの RTMP サーバー（既定は node rtmp_server.js）"""
+    name = "Node.js"
+
     def __init__(self):
         self.process = None
         self.rtmp_url = "rtmp://localhost:1935/live/test-stream"
-    
-    def start(self) -> bool:
-        trace_log("RTMPサーバー起動開始")
+        self.startup: Optional[StartupReport] = None
+
+    def command(self) -> List[str]:
+        return ['node', 'rtmp_server.js']
+
+    def start(self, report: Optional[StartupReport] = None, timeout: float = 15.0) -> bool:
+        """起動して TCP ポート → RTMP ハンドシェイクが通るまで待つ"""
+        trace_log(f"RTMPサーバー起動開始 ({self.name})")
+        self.startup = report or StartupReport()
         try:
-            trace_log("Node.jsプロセス起動中...")
+            trace_log(f"{self.name}プロセス起動中...")
             self.process = subprocess.Popen(
-                ['node', 'rtmp_server.js'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
+                self.command(),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
             )
-            trace_log(f"Node.jsプロセスID: {self.process.pid}")
-            
-            trace_log("サーバー起動待機開始(3秒)")
-            time.sleep(3)
-            trace_log("サーバー起動待機完了")
-            
-            trace_log("接続確認開始")
-            if self._check_connection():
+            trace_log(f"{self.name}プロセスID: {self.process.pid}")
+
+            process = self.process
+            if wait_for_rtmp(self.rtmp_url, self.startup, timeout, abort=lambda: process.poll() is not None):
                 trace_log("RTMPサーバー起動成功")
                 return True
             else:
                 trace_log("RTMPサーバー接続確認失敗", "ERROR")
                 self.stop()
                 return False
-                
+
         except FileNotFoundError:
-            trace_log("Node.js未発見", "ERROR")
+            trace_log(f"{self.name}未発見: {self.command()[0]}", "ERROR")
             return False
         except Exception as e:
             trace_log(f"RTMPサーバー起動例外: {e}", "ERROR")
             return False
-    
+
     def stop(self):
         if self.process:
             self.process.terminate()
@@ -54,10 +61,34 @@ class RTMPServer:
                 self.process.kill()
             self.process = None
             trace_log("RTMPサーバー停止")
-    
+
     def _check_connection(self) -> bool:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(3)
-        result = sock.connect_ex(('localhost', 1935))
-        sock.close()
-        return result == 0
\ No newline at end of file
+        return tcp_port_open(*parse_rtmp_url(self.rtmp_url))
+
+class NginxRTMPServer(RTMPServer):
+    """nginx-rtmp-module 入りの nginx を conf/nginx.conf で前面起動"""
+    name = "nginx"
+
+    def __init__(self, binary: str = None, prefix: str = ".", conf: str = "conf/nginx.conf"):
+        super().__init__()
+        self.binary = binary or os.environ.get("NGINX_BIN", "nginx")
+        self.prefix = prefix
+        self.conf = conf
+
+    def command(self) -> List[str]:
+        return [self.binary, "-p", self.prefix, "-c", self.conf, "-g", "daemon off;"]
+
+    def start(self, report: Optional[StartupReport] = None, timeout: float = 15.0) -> bool:
+        # nginx.conf の logs/ と temp/client_body_temp はプレフィックス相対
+        for sub in ("logs", "temp"):
+            os.makedirs(os.path.join(self.prefix, sub), exist_ok=True)
+        return super().start(report, timeout)
+
+BACKENDS = {"node": RTMPServer, "nginx": NginxRTMPServer, "local": LocalRTMPServer}
+
+def create_server(backend: str = None, **kwargs):
+    """バックエンド名から RTMP サーバーを作る（省略時は ZUNDAMON_RTMP_BACKEND）"""
+    backend = backend or RTMP_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"未知のRTMPバックエンド: {backend}（{', '.join(BACKENDS)}）")
+    return BACKENDS[backend](**kwargs)
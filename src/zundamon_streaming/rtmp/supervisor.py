@@ -0,0 +1,174 @@
+"""エンコーダ監視 - ffmpeg の異常終了・進捗停止を検出してバックオフ付きで再起動する
+
+    supervisor = EncoderSupervisor(launch, position)
+    supervisor.attach(process)        # 最初に起動したプロセス
+    supervisor.progressed(process)    # 進捗行（frame= ...）を読むたびに呼ぶ
+    supervisor.start()
+
+launch(resume_frame) は新しいプロセスを返す（失敗なら None）。resume_frame は
+position() が返す現在のフレーム位置で、入力をフレーム 0 からやり直さないために使う。
+障害検出から新しいプロセスの最初の進捗までを復旧時間として記録し、平均を MTTR とする。
+"""
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from ..utils.metrics import FrameTimeStats, REGISTRY
+from ..utils.trace import trace_log
+from .readiness import backoff_delays
+
+
+class EncoderSupervisor:
+    def __init__(self, launch: Callable[[int], Optional[subprocess.Popen]], position: Callable[[], int],
+                 stall_timeout: float = 5.0, startup_timeout: float = 10.0, check_interval: float = 0.25,
+                 initial_delay: float = 0.5, max_delay: float = 10.0, name: str = "ffmpeg",
+                 input_stalled: Optional[Callable[[], bool]] = None):
+        """input_stalled() が真の間は入力（書き手）側が止まっている。進捗が無くてもエンコーダの停止とせず、
+        終了した場合も入力が戻るまで再起動を待つ"""
+        self.launch = launch
+        self.position = position
+        self.stall_timeout = stall_timeout
+        self.startup_timeout = startup_timeout
+        self.check_interval = check_interval
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.name = name
+        self.input_stalled = input_stalled
+        self.process: Optional[subprocess.Popen] = None
+        self.recoveries = FrameTimeStats(maxlen=1000)  # 障害検出 → 最初の進捗（秒）
+        self.stats = {"failures": 0, "exits": 0, "stalls": 0, "restarts": 0, "launch_errors": 0,
+                      "last_reason": "", "last_resume_frame": 0}
+        self._recovery_total = 0.0
+        self._launched_at = 0.0
+        self._last_progress: Optional[float] = None  # None = 起動後まだ進捗なし
+        self._outage_started: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(self, process: subprocess.Popen):
+        """監視対象のプロセスを差し替える（起動直後の進捗待ちから始める）"""
+        with self._lock:
+            self.process = process
+            self._launched_at = time.monotonic()
+            self._last_progress = None
+
+    def progressed(self, process: Optional[subprocess.Popen] = None):
+        """進捗行を読んだ。古いプロセスの残り行は無視する"""
+        now = time.monotonic()
+        with self._lock:
+            if process is not None and process is not self.process:
+                return
+            self._last_progress = now
+            if self._outage_started is None:
+                return
+            recovery = now - self._outage_started
+            self._outage_started = None
+        self.recoveries.record(recovery)
+        self._recovery_total += recovery
+        REGISTRY.observe("encoder_recovery", recovery)
+        REGISTRY.set_gauge("encoder_mttr_seconds", self.mttr())
+        trace_log(f"{self.name} 復旧: {recovery * 1000:.0f}ms")
+
+    def mttr(self) -> float:
+        count = self.recoveries.count
+        return self._recovery_total / count if count else 0.0
+
+    def _failure(self) -> Optional[str]:
+        """現在のプロセスの異常（終了 / 進捗停止）。正常なら None"""
+        with self._lock:
+            process, last_progress, launched_at = self.process, self._last_progress, self._launched_at
+        if process is None:
+            return None
+        code = process.poll()
+        if code is not None:
+            return f"exit({code})"
+        now = time.monotonic()
+        if self._starved():
+            # 書き手が止まっているだけ。入力が戻った時点から数え直す
+            with self._lock:
+                self._launched_at = now
+                if self._last_progress is not None:
+                    self._last_progress = now
+            return None
+        if last_progress is None:
+            if now - launched_at > self.startup_timeout:
+                return "stall(起動後に進捗なし)"
+        elif now - last_progress > self.stall_timeout:
+            return f"stall({now - last_progress:.1f}秒進捗なし)"
+        return None
+
+    def _starved(self) -> bool:
+        return self.input_stalled is not None and self.input_stalled()
+
+    def _kill(self, process: subprocess.Popen):
+        if process.poll() is None:
+            process.kill()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+    def _recover(self, reason: str, delays):
+        with self._lock:
+            process = self.process
+            if self._outage_started is None:
+                # 停止は最後に進捗が見えた時点から、終了は検出時点から数える
+                stalled_since = self._last_progress if reason.startswith("stall") else None
+                self._outage_started = stalled_since or time.monotonic()
+        self.stats["failures"] += 1
+        self.stats["exits" if reason.startswith("exit") else "stalls"] += 1
+        self.stats["last_reason"] = reason
+        trace_log(f"{self.name} 異常検出: {reason}", "WARN")
+        self._kill(process)
+
+        while not self._stop.is_set():
+            delay = next(delays)
+            trace_log(f"{self.name} {delay:.1f}秒後に再起動", "WARN")
+            if self._stop.wait(delay):
+                return
+            while self._starved():  # 入力が無いまま起動しても読む物が無い
+                if self._stop.wait(self.check_interval):
+                    return
+            frame = self.position()
+            try:
+                new_process = self.launch(frame)
+            except Exception as e:
+                trace_log(f"{self.name} 再起動例外: {e}", "ERROR")
+                new_process = None
+            if new_process is None:
+                self.stats["launch_errors"] += 1
+                continue
+            self.attach(new_process)
+            self.stats["restarts"] += 1
+            self.stats["last_resume_frame"] = frame
+            REGISTRY.set_gauge("encoder_restarts", self.stats["restarts"])
+            trace_log(f"{self.name} 再起動: フレーム {frame} から再開")
+            return
+
+    def _run(self):
+        delays = backoff_delays(self.initial_delay, max_delay=self.max_delay)
+        while not self._stop.wait(self.check_interval):
+            reason = self._failure()
+            if reason is not None:
+                self._recover(reason, delays)
+            elif self._outage_started is None:
+                delays = backoff_delays(self.initial_delay, max_delay=self.max_delay)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"supervisor-{self.name}")
+        self._thread.start()
+
+    def stop(self):
+        """監視だけ止める（プロセスの停止は呼び出し側）"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def summary(self) -> Dict:
+        recovering = self._outage_started is not None
+        return {**self.stats, "recovering": recovering, "mttr_seconds": self.mttr(),
+                "recovery_ms": self.recoveries.summary()}
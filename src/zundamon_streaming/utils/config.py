@@ -0,0 +1,8 @@
+"""設定値（環境変数で上書き可能）"""
+import os
+
+# VOICEVOX エンジンの URL（偽サーバーで負荷試験する時は VOICEVOX_URL=http://127.0.0.1:50121 等）
+VOICEVOX_URL = os.environ.get("VOICEVOX_URL", "http://localhost:50021").rstrip("/")
+
+# RTMP 受け口: node（rtmp_server.js）/ nginx（conf/nginx.conf）/ local（Python の受け口。Node 不要）
+RTMP_BACKEND = os.environ.get("ZUNDAMON_RTMP_BACKEND", "node")
@@ -0,0 +1,278 @@
+"""計測ユーティリティ"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Optional
+
+def percentiles(values: Iterable[float], points=(50, 95, 99)) -> Dict[str, float]:
+    """p50/p95/p99 などを最近傍法で計算"""
+    data = sorted(values)
+    if not data:
+        return {f"p{p}": 0.0 for p in points}
+    result = {}
+    for p in points:
+        idx = min(len(data) - 1, max(0, int(round(p / 100.0 * len(data))) - 1))
+        result[f"p{p}"] = data[idx]
+    return result
+
+class FrameTimeStats:
+    """フレーム間隔（秒）の直近サンプルを保持してパーセンタイルを出す"""
+
+    def __init__(self, maxlen: int = 3000):
+        self._samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def summary(self) -> Dict[str, float]:
+        """ミリ秒単位の p50/p95/p99/max"""
+        with self._lock:
+            samples = list(self._samples)
+        result = {k: v * 1000 for k, v in percentiles(samples).items()}
+        result["max"] = max(samples) * 1000 if samples else 0.0
+        result["count"] = self.count
+        return result
+
+def cpu_seconds(pid: Optional[int] = None) -> Optional[float]:
+    """CPU 時間（user + system 秒）。pid 省略時は自プロセス全スレッド。読めなければ None
+
+    子プロセス（ffmpeg など）は /proc/<pid>/stat、無ければ psutil（任意）で読む。
+    """
+    if pid is None:
+        return time.process_time()
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        import psutil
+        times = psutil.Process(pid).cpu_times()
+        return times.user + times.system
+    except Exception:
+        return None
+
+def rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """常駐メモリ（VmRSS）のバイト数。pid 省略時は自プロセス。読めなければ None"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except Exception:
+        return None
+
+class CPUMeter:
+    """区間ごとの CPU 使用率（1コア = 100%）"""
+
+    def __init__(self, pid: Optional[int] = None):
+        self.pid = pid
+        self.reset()
+
+    def reset(self):
+        self._cpu = cpu_seconds(self.pid)
+        self._wall = time.monotonic()
+
+    def percent(self) -> Optional[float]:
+        """reset() からの平均使用率。測れなければ None"""
+        cpu = cpu_seconds(self.pid)
+        wall = time.monotonic() - self._wall
+        if cpu is None or self._cpu is None or wall <= 0:
+            return None
+        return (cpu - self._cpu) / wall * 100
+
+class Histogram:
+    """HDR風の対数線形バケットによるローリングヒストグラム
+
+    値（秒）を 2 の冪ごとに SUB_BUCKETS 分割したバケットに数え、
+    window_seconds ごとに区切った直近 windows 区間分だけを分位点計算に使う。
+    相対誤差は約 1/SUB_BUCKETS に収まる。
+    区間の期限切れは読み出し時にも判定する（記録が止まったステージが最後の忙しい区間を出し続けない）。
+    """
+    SUB_BUCKETS = 16
+    MIN_VALUE = 1e-6
+
+    def __init__(self, window_seconds: float = 10.0, windows: int = 6):
+        self.window_seconds = window_seconds
+        self.span_seconds = window_seconds * windows  # 分位点に使う期間
+        self._windows = deque(maxlen=windows)  # (区間開始, {バケット: 件数})
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+
+    def _bucket(self, value: float) -> int:
+        mantissa, exponent = math.frexp(max(value, self.MIN_VALUE) / self.MIN_VALUE)
+        return exponent * self.SUB_BUCKETS + int((mantissa - 0.5) * 2 * self.SUB_BUCKETS)
+
+    def _bucket_value(self, bucket: int) -> float:
+        exponent, sub = divmod(bucket, self.SUB_BUCKETS)
+        mantissa = 0.5 + (sub + 0.5) / (2 * self.SUB_BUCKETS)
+        return math.ldexp(mantissa, exponent) * self.MIN_VALUE
+
+    def record(self, value: float):
+        bucket = self._bucket(value)
+        now = time.monotonic()
+        with self._lock:
+            if not self._windows or now - self._windows[-1][0] >= self.window_seconds:
+                self._windows.append((now, {}))
+            counts = self._windows[-1][1]
+            counts[bucket] = counts.get(bucket, 0) + 1
+            self.count += 1
+            self.sum += value
+
+    def _expire(self, now: float):
+        """span_seconds より前に終わった区間を捨てる（_lock 内で呼ぶ）"""
+        while self._windows and now - self._windows[0][0] >= self.span_seconds + self.window_seconds:
+            self._windows.popleft()
+
+    def window_count(self) -> int:
+        """直近 span_seconds の件数"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return sum(sum(counts.values()) for _, counts in self._windows)
+
+    def stale(self) -> bool:
+        """現在の区間に記録が無い（直近 window_seconds 何も来ていない）"""
+        with self._lock:
+            return not self._windows or time.monotonic() - self._windows[-1][0] >= self.window_seconds
+
+    def quantiles(self, qs=(0.5, 0.9, 0.99)) -> Dict[float, Optional[float]]:
+        """直近ウィンドウ内の分位点（秒）。期間内に記録が無ければ None"""
+        merged: Dict[int, int] = {}
+        with self._lock:
+            self._expire(time.monotonic())
+            for _, counts in self._windows:
+                for bucket, n in counts.items():
+                    merged[bucket] = merged.get(bucket, 0) + n
+        total = sum(merged.values())
+        result = {}
+        for q in qs:
+            if not total:
+                result[q] = None
+                continue
+            target = q * total
+            seen = 0
+            for bucket in sorted(merged):
+                seen += merged[bucket]
+                if seen >= target:
+                    result[q] = self._bucket_value(bucket)
+                    break
+        return result
+
+
+class MetricsRegistry:
+    """ステージ別ヒストグラムとゲージの集約（Prometheusテキスト形式で出力）"""
+
+    def __init__(self, prefix: str = "zundamon"):
+        self.prefix = prefix
+        self._histograms: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str) -> Histogram:
+        hist = self._histograms.get(stage)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(stage, Histogram())
+        return hist
+
+    def observe(self, stage: str, seconds: float):
+        self.histogram(stage).record(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        """with REGISTRY.timer("compose"): ... で所要時間を記録"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(stage).record(time.perf_counter() - start)
+
+    def set_gauge(self, name: str, value: float):
+        self._gauges[name] = value
+
+    def remove_gauge(self, name: str):
+        """対象が無くなったゲージを外す（最後の値を出し続けない）"""
+        self._gauges.pop(name, None)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            hists = dict(self._histograms)
+        result = {}
+        for stage, hist in sorted(hists.items()):
+            q = hist.quantiles()
+            # p50 などは直近の期間のみ（記録が無ければ None）。stale は現在の区間に記録が無い
+            result[stage] = {"count": hist.count, "sum": hist.sum,
+                             "p50": q[0.5], "p90": q[0.9], "p99": q[0.99],
+                             "window_count": hist.window_count(), "stale": hist.stale()}
+        return result
+
+    def render_prometheus(self) -> str:
+        name = f"{self.prefix}_stage_seconds"
+        lines = [f"# HELP {name} Hot-path stage durations (rolling window quantiles)",
+                 f"# TYPE {name} summary"]
+        for stage, s in self.snapshot().items():
+            for q, key in ((0.5, "p50"), (0.9, "p90"), (0.99, "p99")):
+                value = "NaN" if s[key] is None else f"{s[key]:.9f}"  # 直近に記録が無い
+                lines.append(f'{name}{{stage="{stage}",quantile="{q}"}} {value}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {s["sum"]:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {s["count"]}')
+        for gauge, value in sorted(dict(self._gauges).items()):
+            lines.append(f"# TYPE {self.prefix}_{gauge} gauge")
+            lines.append(f"{self.prefix}_{gauge} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class MetricsServer:
+    """/metrics をローカルで返す小さなHTTPサーバー"""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host: str = "127.0.0.1", port: int = 9464):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,164 @@
+"""共通トレース - ログ出力とスパン/インスタントイベントの記録
+
+trace_log はコンソール出力レベル（既定 INFO）未満なら何もしない。
+記録を有効にすると、イベントはスレッドごとのバッファ（自スレッドだけが
+追記する deque）に溜まり、export_chrome() で Chrome/Perfetto の
+Trace Event JSON として書き出せる。
+
+    ZUNDAMON_LOG_LEVEL=DEBUG      コンソール出力レベル
+    ZUNDAMON_TRACE=trace.json     記録を有効にし、終了時にこのファイルへ書き出す
+                                  （子プロセスは trace.<pid>.json）
+"""
+import atexit
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import List, Optional
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+DEFAULT_BUFFER_EVENTS = 100000
+
+_print_level = LEVELS.get(os.environ.get("ZUNDAMON_LOG_LEVEL", "INFO").upper(), 20)
+_record_level = None          # None = 記録しない
+_output_path = None
+_buffer_events = DEFAULT_BUFFER_EVENTS
+_local = threading.local()
+_buffers: List[tuple] = []    # (tid, スレッド名, deque)
+_buffers_lock = threading.Lock()
+
+
+def set_level(level: str):
+    """コンソール出力レベルを変更"""
+    global _print_level
+    _print_level = LEVELS[level]
+
+
+def enable(level: str = "DEBUG", output_path: Optional[str] = None,
+           buffer_events: int = DEFAULT_BUFFER_EVENTS):
+    """イベント記録を開始（output_path を渡すと終了時に書き出す）"""
+    global _record_level, _output_path, _buffer_events
+    _record_level = LEVELS[level]
+    _buffer_events = buffer_events
+    if output_path and _output_path is None:
+        atexit.register(_export_at_exit)
+    _output_path = output_path or _output_path
+
+
+def disable():
+    global _record_level
+    _record_level = None
+
+
+def is_enabled(level: str = "DEBUG") -> bool:
+    return _record_level is not None and LEVELS[level] >= _record_level
+
+
+def _buffer() -> deque:
+    buf = getattr(_local, "buffer", None)
+    if buf is None:
+        buf = _local.buffer = deque(maxlen=_buffer_events)
+        thread = threading.current_thread()
+        with _buffers_lock:
+            _buffers.append((thread.ident, thread.name, buf))
+    return buf
+
+
+def _now_us() -> float:
+    # 単調時計をそのまま使うので、親子プロセスのトレースを並べても時刻が揃う
+    return time.perf_counter_ns() / 1000
+
+
+def trace_log(message, level="INFO"):
+    """レベル付きログ（出力レベル以上なら表示、記録中ならインスタントイベントとしても残す）"""
+    severity = LEVELS.get(level, 20)
+    if severity >= _print_level:
+        print(f"[{time.time():.3f}][{threading.get_ident()}][{level}] {message}")
+    if _record_level is not None and severity >= _record_level:
+        _buffer().append(("i", str(message), _now_us(), 0.0, level, None))
+
+
+def instant(name: str, level: str = "DEBUG", **args):
+    """インスタントイベントを記録（表示はしない）"""
+    if _record_level is not None and LEVELS[level] >= _record_level:
+        _buffer().append(("i", name, _now_us(), 0.0, level, args or None))
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+
+@contextmanager
+def _recording_span(name: str, level: str, args):
+    start = _now_us()
+    try:
+        yield
+    finally:
+        _buffer().append(("X", name, start, _now_us() - start, level, args or None))
+
+
+def span(name: str, level: str = "DEBUG", **args):
+    """with span("compose"): ... で区間を記録（無効時は共有の空コンテキストを返すだけ）"""
+    if _record_level is None or LEVELS[level] < _record_level:
+        return _NULL_SPAN
+    return _recording_span(name, level, args)
+
+
+def events() -> List[dict]:
+    """記録済みイベントを Trace Event 形式の dict で返す"""
+    pid = os.getpid()
+    with _buffers_lock:
+        buffers = list(_buffers)
+    result = []
+    for tid, thread_name, buf in buffers:
+        result.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": tid,
+                       "args": {"name": thread_name}})
+        for ph, name, ts, dur, level, args in list(buf):
+            event = {"ph": ph, "name": name, "cat": level, "pid": pid, "tid": tid, "ts": ts}
+            if ph == "X":
+                event["dur"] = dur
+            else:
+                event["s"] = "t"
+            if args:
+                event["args"] = args
+            result.append(event)
+    return result
+
+
+def export_chrome(path: str) -> int:
+    """chrome://tracing / Perfetto で開ける JSON を書き出し、イベント数を返す"""
+    trace_events = events()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    return len(trace_events)
+
+
+def clear():
+    with _buffers_lock:
+        for _, _, buf in _buffers:
+            buf.clear()
+
+
+def _export_at_exit():
+    if not _output_path:
+        return
+    path = _output_path
+    if multiprocessing.parent_process() is not None:
+        # spawn した子プロセス（レンダラー等）は親のファイルを上書きしないよう pid 付きにする
+        root, ext = os.path.splitext(path)
+        path = f"{root}.{os.getpid()}{ext}"
+    count = export_chrome(path)
+    print(f"トレース出力: {path} ({count}イベント)")
+
+
+if os.environ.get("ZUNDAMON_TRACE"):
+    enable(output_path=os.environ["ZUNDAMON_TRACE"])
@@ -2,14 +2,16 @@ import json
 import subprocess
 import requests
 import os
-import socket
-import time
+from src.zundamon_streaming.utils.config import VOICEVOX_URL, RTMP_BACKEND
+from src.zundamon_streaming.rtmp.readiness import StartupReport, parse_rtmp_url, tcp_port_open
+from src.zundamon_streaming.rtmp.server import create_server
 
 class VoiceVoxStreamer:
     def __init__(self):
-        self.voicevox_url = "http://localhost:50021"
+        self.voicevox_url = VOICEVOX_URL
         self.rtmp_url = "rtmp://localhost:1935/live/test-stream"
-        self.rtmp_process = None
+        self.rtmp_server = None
+        self.startup = None  # 起動段階ごとの所要時間（StartupReport）
         self.prepared_scenes = []
         
         # 出力ディレクトリを作成
@@ -31,55 +33,33 @@ class VoiceVoxStreamer:
 
     def check_rtmp_server(self):
         """RTMPサーバーの接続確認（オプション）"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(3)
-        result = sock.connect_ex(('localhost', 1935))
-        sock.close()
-        
-        if result == 0:
+        if tcp_port_open(*parse_rtmp_url(self.rtmp_url)):
             print("RTMPサーバー接続: OK")
             return True
         else:
             print("RTMPサーバーエラー: ポート1935が開いていません")
             return False
 
-    def start_rtmp_server(self):
-        """Node Media Serverを起動"""
-        try:
-            print("🚀 RTMPサーバー起動中...")
-            self.rtmp_process = subprocess.Popen(
-                ['node', 'rtmp_server.js'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            time.sleep(3)  # サーバー起動待ち
-            
-            # 起動確認
-            if self.check_rtmp_server():
-                print("✅ RTMPサーバー起動完了")
-                return True
-            else:
-                print("❌ RTMPサーバー起動失敗")
-                self.stop_rtmp_server()
-                return False
-                
-        except FileNotFoundError:
-            print("❌ Node.jsが見つかりません。以下をインストールしてください:")
-            print("  npm install node-media-server")
-            return False
-        except Exception as e:
-            print(f"❌ RTMPサーバー起動エラー: {e}")
-            return False
+    def start_rtmp_server(self, timeout=15.0):
+        """RTMPサーバーを起動（ZUNDAMON_RTMP_BACKEND で node / nginx / local を選択）"""
+        self.startup = StartupReport()
+        print(f"🚀 RTMPサーバー起動中... ({RTMP_BACKEND})")
+        self.rtmp_server = create_server()
+        if self.rtmp_server.start(self.startup, timeout):
+            self.rtmp_url = self.rtmp_server.rtmp_url
+            print("✅ RTMPサーバー起動完了")
+            return True
+        print("❌ RTMPサーバー起動失敗")
+        if RTMP_BACKEND == "node":
+            print("  Node.js と node-media-server が必要です: npm install node-media-server")
+        self.rtmp_server = None
+        return False
 
     def stop_rtmp_server(self):
         """RTMPサーバーを停止"""
-        if self.rtmp_process:
-            self.rtmp_process.terminate()
-            try:
-                self.rtmp_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.rtmp_process.kill()
-            self.rtmp_process = None
+        if self.rtmp_server:
+            self.rtmp_server.stop()
+            self.rtmp_server = None
             print("🛑 RTMPサーバー停止")
 
     def load_script(self, json_file):
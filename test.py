@@ -4,36 +4,22 @@ import os
 import time
 import subprocess
 import threading
-import socket
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src.zundamon_streaming.image.loader import PNGLoader
 from src.zundamon_streaming.image.cache import ImageCache
+from src.zundamon_streaming.rtmp.readiness import StartupReport, wait_for_rtmp
 from PIL import Image
 
 def wait_for_rtmp_server(host='localhost', port=1935, timeout=30):
-    """RTMPサーバーへの接続を待機"""
+    """RTMPサーバーがハンドシェイクに応答するまで待機"""
     print(f"RTMPサーバー接続待機中 ({host}:{port})")
     
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(1)
-            result = sock.connect_ex((host, port))
-            sock.close()
-            
-            if result == 0:
-                print("RTMPサーバー接続確認")
-                print("5秒後にテスト開始")
-                time.sleep(5)
-                return True
-                
-        except:
-            pass
-        
-        time.sleep(1)
+    report = StartupReport()
+    if wait_for_rtmp(f"rtmp://{host}:{port}/", report, timeout):
+        print(f"RTMPサーバー接続確認 ({report.total_seconds():.2f}秒)")
+        return True
     
     print("RTMPサーバー接続タイムアウト")
     return False
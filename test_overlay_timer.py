@@ -189,13 +189,13 @@ class ZundamonLayeredRealtimeStreamer(VoiceVoxStreamer):
     def generate_voice_data(self, text, speaker_id=3):
         try:
             query_response = requests.post(
-                f"http://localhost:50021/audio_query",
+                f"{self.voicevox_url}/audio_query",
                 params={"text": text, "speaker": speaker_id}
             )
             query_response.raise_for_status()
             
             synthesis_response = requests.post(
-                f"http://localhost:50021/synthesis",
+                f"{self.voicevox_url}/synthesis",
                 params={"speaker": speaker_id},
                 json=query_response.json(),
                 headers={"Content-Type": "application/json"}
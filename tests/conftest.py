@@ -0,0 +1,5 @@
+"""リポジトリ直下を import パスに入れる（src.zundamon_streaming をトップレベルスクリプトと同じく import する）"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,209 @@
+"""RTMP まわりの結合試験 - Node・ffmpeg なしでローカル受け口相手に動かす
+
+    python -m pytest tests
+"""
+import os
+import threading
+import time
+
+import pytest
+
+from src.zundamon_streaming.rtmp.client import RTMPPublisher
+from src.zundamon_streaming.rtmp.fanout import FanOut, read_flv_tags
+from src.zundamon_streaming.rtmp.ingest import LocalRTMPServer
+from src.zundamon_streaming.rtmp.protocol import (
+    MSG_AUDIO, MSG_SET_CHUNK_SIZE, MSG_VIDEO, ChunkDecoder, RTMPMessage, amf0_decode, amf0_encode,
+    control_message, encode_chunks,
+)
+from src.zundamon_streaming.utils.metrics import REGISTRY
+
+METADATA = amf0_encode("onMetaData", {"width": 1082.0, "height": 1650.0, "framerate": 30.0})
+AVC_HEADER = bytes([0x17, 0]) + bytes(16)
+AAC_HEADER = bytes([0xAF, 0, 0x12, 0x10])
+EXTENDED_TIMESTAMP = 0x1000000 + 5
+
+
+def keyframe(size: int = 3000) -> bytes:
+    return bytes([0x17, 1]) + bytes(size)
+
+
+def interframe(size: int = 800) -> bytes:
+    return bytes([0x27, 1]) + bytes(size)
+
+
+def aac(size: int = 300) -> bytes:
+    return bytes([0xAF, 1]) + bytes(size)
+
+
+def wait_until(condition, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+class Recorder:
+    """on_tag で配信名ごとに (種別, タイムスタンプ, ペイロード先頭2バイト) を残す"""
+
+    def __init__(self):
+        self.tags = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, path, kind, timestamp, payload, arrival):
+        with self._lock:
+            self.tags.setdefault(path, []).append((kind, timestamp, payload[:2]))
+
+    def count(self, path: str) -> int:
+        with self._lock:
+            return len(self.tags.get(path, []))
+
+
+def start_server(**kwargs) -> LocalRTMPServer:
+    server = LocalRTMPServer(port=0, **kwargs)
+    assert server.start()
+    return server
+
+
+# ---------- チャンク ----------
+@pytest.mark.parametrize("chunk_size", [128, 4096])
+def test_chunk_roundtrip(chunk_size):
+    messages = [
+        RTMPMessage(MSG_VIDEO, 1, 0, keyframe(10000)),  # 複数チャンクに分かれる
+        RTMPMessage(MSG_AUDIO, 1, 33, aac(5)),
+        RTMPMessage(MSG_VIDEO, 1, 0xFFFFFE, interframe(300)),  # 拡張タイムスタンプの直前
+        RTMPMessage(MSG_VIDEO, 1, EXTENDED_TIMESTAMP, interframe(chunk_size * 3)),  # 継続チャンクにも拡張値
+        RTMPMessage(MSG_AUDIO, 1, 0xFFFFFFFF, aac(chunk_size + 1)),
+    ]
+    data = encode_chunks(control_message(MSG_SET_CHUNK_SIZE, chunk_size), 2, 128)
+    data += b"".join(encode_chunks(m, 6 if m.type_id == MSG_VIDEO else 4, chunk_size) for m in messages)
+
+    decoder = ChunkDecoder()
+    received = []
+    for offset in range(0, len(data), 97):  # 受信の切れ目はチャンク境界と無関係
+        received.extend(decoder.feed(data[offset:offset + 97]))
+
+    assert received[0].type_id == MSG_SET_CHUNK_SIZE
+    assert decoder.chunk_size == chunk_size
+    assert received[1:] == messages
+
+
+def test_amf0_roundtrip():
+    values = ["onStatus", 0.0, None, {"code": "NetStream.Publish.Start", "level": "status"}, True]
+    assert amf0_decode(amf0_encode(*values)) == values
+
+
+# ---------- publish → ローカル受け口 ----------
+def test_publisher_to_local_server():
+    server = start_server(keep_tags=100)
+    try:
+        publisher = RTMPPublisher(server.rtmp_url)
+        publisher.connect()
+        publisher.send_metadata({"width": 1082.0})
+        publisher.send_tag(MSG_VIDEO, 0, AVC_HEADER)
+        frames = 30
+        for i in range(frames):
+            publisher.send_tag(MSG_VIDEO, i * 33, keyframe() if i % 10 == 0 else interframe())
+            publisher.send_tag(MSG_AUDIO, i * 33, aac())
+        publisher.send_tag(MSG_VIDEO, EXTENDED_TIMESTAMP, interframe())
+        publisher.close()  # 受け口が全部読むまで待つ
+
+        stats = server.stats()["live/test-stream"]
+        assert stats["script_tags"] == 1
+        assert stats["video_tags"] == frames + 2
+        assert stats["audio_tags"] == frames
+        assert stats["keyframes"] == 1 + frames // 10  # シーケンスヘッダも 0x17
+        assert stats["metadata"] == {"width": 1082.0}
+        stream = server.streams["live/test-stream"]
+        assert stream.tags[-1][2] == EXTENDED_TIMESTAMP
+    finally:
+        server.stop()
+
+
+# ---------- FanOut ----------
+def test_fanout_outputs_are_independent(tmp_path):
+    recorder_a, recorder_b = Recorder(), Recorder()
+    server_a = start_server(on_tag=recorder_a)
+    server_b = start_server(on_tag=recorder_b)
+    flv_path = str(tmp_path / "archive.flv")
+    fanout = FanOut()
+    server_b_running = True
+    try:
+        outputs = {
+            "a": fanout.add_output("a", server_a.rtmp_url),
+            "b": fanout.add_output("b", server_b.rtmp_url),
+            "file": fanout.add_output("file", flv_path),
+        }
+        assert wait_until(lambda: all(o.connected for o in outputs.values()))
+
+        timestamp = [0]
+
+        def feed(frames: int):
+            for i in range(frames):
+                fanout.feed(MSG_VIDEO, timestamp[0], keyframe() if i % 10 == 0 else interframe())
+                fanout.feed(MSG_AUDIO, timestamp[0], aac())
+                timestamp[0] += 33
+                time.sleep(0.002)
+
+        fanout.feed(18, 0, METADATA)
+        fanout.feed(MSG_VIDEO, 0, AVC_HEADER)
+        fanout.feed(MSG_AUDIO, 0, AAC_HEADER)
+        feed(30)
+        assert wait_until(lambda: recorder_b.count("live/test-stream") >= 63)
+
+        # 途中で1つの配信先が落ちても他は流れ続ける
+        server_b.stop()
+        server_b_running = False
+        feed(30)
+        assert wait_until(lambda: outputs["b"].stats["reconnects"] >= 1)
+
+        # 後から足した出力はヘッダを受け取り、次のキーフレームから映像が始まる
+        late_url = server_a.rtmp_url.rsplit("/", 1)[0] + "/late"
+        outputs["late"] = fanout.add_output("late", late_url)
+        assert wait_until(lambda: outputs["late"].connected)
+        for _ in range(5):  # キーフレーム待ちで捨てられる
+            fanout.feed(MSG_VIDEO, timestamp[0], interframe())
+            fanout.feed(MSG_AUDIO, timestamp[0], aac())
+            timestamp[0] += 33
+        feed(30)
+        assert wait_until(lambda: outputs["a"].summary()["backlog_tags"] == 0
+                          and outputs["late"].summary()["backlog_tags"] == 0)
+
+        fed = fanout.tags
+        final = {name: fanout.remove_output(name) for name in ("a", "b", "file", "late")}
+    finally:
+        fanout.stop()
+        server_a.stop()
+        if server_b_running:
+            server_b.stop()
+
+    # a: 最初から最後まで全タグ、取りこぼしなし
+    assert final["a"]["sent_tags"] == fed
+    assert final["a"]["dropped_tags"] == 0
+    assert final["a"]["reconnects"] == 0
+    assert recorder_a.count("live/test-stream") == fed
+
+    # b: 切断を検出して再接続を試み続けている
+    assert final["b"]["reconnects"] >= 1
+    assert not final["b"]["connected"]
+    assert final["b"]["last_error"]
+    assert final["b"]["sent_tags"] < fed
+
+    # file: 全タグが FLV として読み戻せる
+    with open(flv_path, "rb") as f:
+        archived = list(read_flv_tags(f))
+    assert final["file"]["sent_tags"] == fed == len(archived)
+    assert archived[0] == (18, 0, METADATA)
+
+    # late: ヘッダ3つ → キーフレーム。その前の映像・音声は dropped に数える
+    late = recorder_a.tags["live/late"]
+    assert [kind for kind, _, _ in late[:3]] == ["script", "video", "audio"]
+    assert late[1][2] == AVC_HEADER[:2] and late[2][2] == AAC_HEADER[:2]
+    assert late[3][0] == "video" and late[3][2] == keyframe()[:2]
+    assert final["late"]["dropped_tags"] > 0
+    assert final["late"]["sent_tags"] == len(late) - 3  # ヘッダは接続時に直接送る
+    assert os.path.getsize(flv_path) > 0
+
+    # 外した出力のゲージは残らない
+    assert "fanout_late_backlog_bytes" not in REGISTRY.render_prometheus()
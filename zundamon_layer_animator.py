@@ -5,9 +5,9 @@ import subprocess
 import time
 import threading
 import queue
+import io
 import requests
 import tempfile
-import random
 import re
 import unicodedata
 from PIL import Image
@@ -15,6 +15,19 @@ import pygame
 
 # 依存: streamer.py に VoiceVoxStreamer （start_rtmp_server/stop_rtmp_server/rtmp_url）実装前提
 from streamer import VoiceVoxStreamer
+from src.zundamon_streaming.image.cache import ImageCache, Sprite, DEFAULT_MAX_BYTES
+from src.zundamon_streaming.expression.state import ExpressionState
+from src.zundamon_streaming.expression.timeline import Timeline
+from src.zundamon_streaming.expression.animation import BlinkAnimator
+from src.zundamon_streaming.core.pacing import FramePacer
+from src.zundamon_streaming.audio.scheduler import SpeechScheduler
+from src.zundamon_streaming.utils.metrics import FrameTimeStats, REGISTRY, MetricsServer
+from src.zundamon_streaming.rtmp.ffmpeg import (record_progress, is_first_packet, alpha_output, parse_progress,
+                                                segment_target)
+from src.zundamon_streaming.image.compositor import layer_union_bbox
+from src.zundamon_streaming.rtmp.readiness import wait_until
+from src.zundamon_streaming.rtmp.supervisor import EncoderSupervisor
+from src.zundamon_streaming.core.watchdog import StreamWatchdog, WRITER_STALLED
 
 
 # =========================
@@ -73,8 +86,12 @@ def _build_png_index(root_dir: str) -> dict:
 # 本体
 # =========================
 class ZundamonLayerAnimator(VoiceVoxStreamer):
-    def __init__(self, layer_dir="zundamon", fps=30, out_dir=None):
+    def __init__(self, layer_dir="zundamon", fps=30, out_dir=None, cache_bytes=DEFAULT_MAX_BYTES,
+                 pacing_policy="drop", metrics_port=None, voicevox_url=None, audio_player=None):
         super().__init__()
+        if voicevox_url:
+            self.voicevox_url = voicevox_url
+        self.audio_player = audio_player   # 指定時は pygame の代わりにこれで再生（負荷試験用）
         self.layer_dir = layer_dir
         self.fps = int(fps)
         self.out_dir = out_dir or os.path.join(layer_dir, "frames")
@@ -82,12 +99,26 @@ class ZundamonLayerAnimator(VoiceVoxStreamer):
 
         self.position_map = None
         self.png_index = {}
-        self.speech_queue = queue.Queue()
+        self.speech_queue = SpeechScheduler()  # 優先度・TTL・重複統合・バックログ上限
         self.stream_process = None
-        self.is_talking = False
-
-        self.current_mouth = "むふ"     # 初期：口閉じ
-        self.current_eyes  = "普通目"   # 初期：目開き
+        self.supervisor = None             # FFmpeg の終了・停止を監視して再起動
+        self.watchdog = None               # 連番の書き出しと FFmpeg の消費を突き合わせる
+        self.progress_frame = 0            # FFmpeg の進捗行の frame=
+        self.alpha_target = None           # 透過出力先（None なら背景動画に重ねて RTMP 配信）
+        self.alpha_codec = "vp9"
+        self.alpha_segment = 0             # 透過出力の起動回数（再起動後はファイルを分けて前の録画を残す）
+
+        # 表情は不変スナップショットで公開（初期：口閉じ・目開き）
+        self.expression_state = ExpressionState()
+        self.timeline = Timeline(self.expression_state, self.fps)   # レンダーのフレームクロックで進む
+        self.blink_animator = BlinkAnimator(self.expression_state, self.timeline)
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+        self._last_encoded = None          # (version, PNGバイト列)
+        self.pacer = FramePacer(self.fps, pacing_policy)  # 遅延・破棄・複製の計測
+        self.speech_latency = FrameTimeStats()            # add_speech から再生開始まで（秒）
+        self.frame_times = FrameTimeStats()               # フレーム書き出し間隔（秒）
+        self._last_write = None
 
         # 内部制御
         self._warned_once = set()          # 同じWARNは一度だけ
@@ -95,10 +126,17 @@ class ZundamonLayerAnimator(VoiceVoxStreamer):
         self._render_thread = None
         self._stop_event = threading.Event()
         self._frame_no = 0
-        self._img_cache = {}               # 画像キャッシュ（パス→PIL.Image）
+        self._img_cache = ImageCache(max_bytes=cache_bytes)  # 切り抜きスプライトのLRU
+        self._pinned_paths = {}            # 固定レイヤーのキー → 現在ピン留めしているパス
+        self.metrics_server = None
+        if metrics_port is not None:               # ステージ別ヒストグラムを /metrics で公開
+            self.metrics_server = MetricsServer(port=metrics_port)
+            self.metrics_server.start()
+            print(f"メトリクス: http://127.0.0.1:{self.metrics_server.port}/metrics")
 
         # pygame 音声
-        pygame.mixer.init()
+        if self.audio_player is None:
+            pygame.mixer.init()
 
         # 位置情報＆インデックス
         self.load_position_map()
@@ -109,6 +147,31 @@ class ZundamonLayerAnimator(VoiceVoxStreamer):
         # ワーカー
         self._start_workers()
 
+    # ---------- 表情状態（ExpressionState へ委譲） ----------
+    @property
+    def current_mouth(self):
+        return self.expression_state.current_mouth
+
+    @current_mouth.setter
+    def current_mouth(self, mouth):
+        self.expression_state.set_mouth(mouth)
+
+    @property
+    def current_eyes(self):
+        return self.expression_state.current_eyes
+
+    @current_eyes.setter
+    def current_eyes(self, eyes):
+        self.expression_state.set_eyes(eyes)
+
+    @property
+    def is_talking(self):
+        return self.expression_state.is_talking
+
+    @is_talking.setter
+    def is_talking(self, talking):
+        self.expression_state.set_talking(talking)
+
     # ---------- ユーティリティ ----------
     def _warn_once(self, key: str, msg: str):
         if key in self._warned_once:
@@ -238,11 +301,12 @@ class ZundamonLayerAnimator(VoiceVoxStreamer):
         return None
 
     # ---------- レイヤー解決（重ね順を厳密） ----------
-    def get_expression_files(self):
+    def get_expression_files(self, snap=None):
         """
         現在の表情に対応するファイルパス群を返す（dict挿入順 = 重ね順）
         座標はいじらない。PNGはすべて (0,0) で重ねる。
         """
+        snap = snap or self.expression_state.snapshot()
         files = {}
 
         # 1) 素体（最下層）
@@ -295,7 +359,7 @@ class ZundamonLayerAnimator(VoiceVoxStreamer):
             self._warn_once("missing:眉", "[WARN] 眉が見つかりません")
 
         # 6) 目（白目→黒目の順に重ねる / 閉じ目は単枚）
-        if self.current_eyes == "普通目":
+        if snap.eyes == "普通目":
             eye_white = (self.find_layer_file("目/目セット/普通白目")
                          or self._find_by_keywords_in_index("目", "普通白目")
                          or self._find_by_keywords_in_index("白目"))
@@ -315,19 +379,19 @@ class ZundamonLayerAnimator(VoiceVoxStreamer):
             else:
                 self._warn_once("missing:黒目普通目", "[WARN] 黒目(普通目)が見つかりません")
         else:
-            eyes = (self.find_layer_file(f"目/{self.current_eyes}")
-                    or (None if self.current_eyes == "UU" else self.find_layer_file("目/UU"))
-                    or self._find_by_keywords_in_index("目", self.current_eyes)
+            eyes = (self.find_layer_file(f"目/{snap.eyes}")
+                    or (None if snap.eyes == "UU" else self.find_layer_file("目/UU"))
+                    or self._find_by_keywords_in_index("目", snap.eyes)
                     or self._find_by_keywords_in_index("目", "uu")
                     or self._find_by_keywords_in_index("uu"))
             if eyes:
                 files["eyes"] = eyes
             else:
-                self._warn_once(f"missing:目/{self.current_eyes}", f"[WARN] 目ファイル未検出: 目/{self.current_eyes}")
+                self._warn_once(f"missing:目/{snap.eyes}", f"[WARN] 目ファイル未検出: 目/{snap.eyes}")
 
         # 7) 口（最後に重ねる）
-        mouth = (self.find_layer_file(f"口/{self.current_mouth}")
-                 or self._find_by_keywords_in_index("口", self.current_mouth)
+        mouth = (self.find_layer_file(f"口/{snap.mouth}")
+                 or self._find_by_keywords_in_index("口", snap.mouth)
                  or self.find_layer_file("口/むふ")
                  or self._find_by_keywords_in_index("口", "むふ")
                  or self.find_layer_file("口/ほあー")
@@ -335,94 +399,125 @@ class ZundamonLayerAnimator(VoiceVoxStreamer):
         if mouth:
             files["mouth"] = mouth
         else:
-            self._warn_once(f"missing:口/{self.current_mouth}", f"[WARN] 口ファイル未検出: 口/{self.current_mouth}")
+            self._warn_once(f"missing:口/{snap.mouth}", f"[WARN] 口ファイル未検出: 口/{snap.mouth}")
 
         self._print_files_once_on_change(files)
         return files
 
     # ---------- 画像合成（PNGそのまま重ね / 0,0） ----------
-    def _open_image_cached(self, path: str) -> Image.Image:
-        im = self._img_cache.get(path)
-        if im is None:
-            im = Image.open(path).convert("RGBA")
-            self._img_cache[path] = im
-        return im
-
-    def _compose_current_frame(self) -> Image.Image:
+    _PINNED_KEYS = ("base_body", "base_edamame", "outfit", "arm_left", "arm_right", "brow")
+
+    def _open_image_cached(self, path: str, pin: bool = False) -> Sprite:
+        if pin:
+            return self._img_cache.pin(path)
+        return self._img_cache.get_sprite(path)
+
+    def _open_layer(self, key: str, path: str) -> Sprite:
+        """固定レイヤーは現在のパスだけピン留め（差し替わったら前のパスは LRU に戻す）"""
+        if key not in self._PINNED_KEYS:
+            return self._open_image_cached(path)
+        previous = self._pinned_paths.get(key)
+        if previous != path:
+            self._pinned_paths[key] = path
+            if previous is not None and previous not in self._pinned_paths.values():  # 他のキーと共有なら残す
+                self._img_cache.unpin(previous)
+        return self._open_image_cached(path, pin=True)
+
+    def _compose_current_frame(self, snap=None) -> Image.Image:
         """
-        現在の self.current_mouth / self.current_eyes から合成。
+        表情スナップショット（省略時は最新）から合成。
         PNGを座標いじらず (0,0) で順に alpha_composite する。
         キャンバスサイズは最初に見つかったベース画像のサイズに合わせる。
         """
-        files = self.get_expression_files()
+        with REGISTRY.timer("resolve"):
+            files = self.get_expression_files(snap)
         # キャンバス基準：base_body → outfit → どれも無ければ最初の要素
         base_key_order = ["base_body", "outfit", "base_edamame", "arm_left", "arm_right", "brow",
                           "eye_white", "eye_black", "eyes", "mouth"]
         base_size = None
         for k in ["base_body", "outfit", "base_edamame"]:
             if k in files:
-                base_size = self._open_image_cached(files[k]).size
+                base_size = self._open_image_cached(files[k]).canvas_size
                 break
         if base_size is None and len(files) > 0:
             any_path = next(iter(files.values()))
-            base_size = self._open_image_cached(any_path).size
+            base_size = self._open_image_cached(any_path).canvas_size
         if base_size is None:
             # 何も無い：透明1x1
             return Image.new("RGBA", (1, 1), (0, 0, 0, 0))
 
-        canvas = Image.new("RGBA", base_size, (0, 0, 0, 0))
-        # dict挿入順（get_expression_filesの順）で重ねる
-        for key in files:
-            img = self._open_image_cached(files[key])
-            # サイズが違っても座標は動かさない。PNGのまま (0,0) に重ねる
-            if img.size != base_size:
-                # サイズが違う場合はそのまま左上に被せる（ユーザー指定：座標いじらない）
-                pass
-            canvas.alpha_composite(img, dest=(0, 0))
+        with REGISTRY.timer("compose"):
+            canvas = Image.new("RGBA", base_size, (0, 0, 0, 0))
+            # dict挿入順（get_expression_filesの順）で重ねる
+            for key in files:
+                sprite = self._open_layer(key, files[key])
+                # 切り抜き位置に戻すだけ。元PNGを (0,0) に重ねたのと同じ結果（座標いじらない）
+                canvas.alpha_composite(sprite.image, dest=sprite.offset)
         return canvas
 
     # ---------- フレーム生成/保存 ----------
-    def _save_frame(self, img: Image.Image):
+    def _write_frame_bytes(self, data: bytes):
         path = os.path.join(self.out_dir, f"current_{self._frame_no:06d}.png")
-        img.save(path)  # .png 拡張子固定（.tmp禁止）
+        with REGISTRY.timer("write"), open(path, "wb") as f:  # .png 拡張子固定（.tmp禁止）
+            f.write(data)
         self._frame_no += 1
+        now = time.perf_counter()
+        if self._last_write is not None:
+            self.frame_times.record(now - self._last_write)
+        self._last_write = now
+
+    def _render_frame(self):
+        """スナップショットが変わった時だけ 解決→合成→エンコード、同じなら前回のPNGを再利用"""
+        self.timeline.advance()
+        snap = self.expression_state.snapshot()
+        if self._last_encoded is not None and self._last_encoded[0] == snap.version:
+            self.frames_skipped += 1
+        else:
+            buf = io.BytesIO()
+            frame = self._compose_current_frame(snap)
+            with REGISTRY.timer("encode"):
+                frame.save(buf, format="PNG")
+            self._last_encoded = (snap.version, buf.getvalue())
+            self.frames_rendered += 1
+        self._write_frame_bytes(self._last_encoded[1])
 
     def _seed_frames(self, seconds: float = 1.0):
         """配信前に先行フレーム生成：FFmpegの入力安定用"""
         n = max(1, int(self.fps * seconds))
         for _ in range(n):
-            img = self._compose_current_frame()
-            self._save_frame(img)
+            self._render_frame()
 
     def _render_loop(self):
-        """常時レンダリング（blink/口はワーカーで state を更新、ここは現状を描画するだけ）"""
-        interval = 1.0 / self.fps
-        next_t = time.perf_counter()
+        """常時レンダリング（状態はタイムラインで更新、ここは現状を描画するだけ）
+        遅延時は self.pacer の方針（drop / duplicate / burst）で追いつく"""
+        self.pacer.start()
         while not self._stop_event.is_set():
-            img = self._compose_current_frame()
-            self._save_frame(img)
-            next_t += interval
-            sleep = next_t - time.perf_counter()
-            if sleep > 0:
-                time.sleep(sleep)
-            else:
-                # 間に合ってないときは次フレームへ（落ち着いたら追いつく）
-                next_t = time.perf_counter()
+            self._render_frame()
+            decision = self.pacer.wait()
+            if decision.dropped:
+                self.timeline.advance(self.timeline.frame_no + decision.dropped)
+            for _ in range(decision.duplicate):
+                self.timeline.advance()
+                self._write_frame_bytes(self._last_encoded[1])
+            for _ in range(decision.render - 1):
+                self._render_frame()
 
     # ---------- 音声（VOICEVOX） ----------
     def generate_voice_data(self, text, speaker_id=3):
         try:
-            q = requests.post(
-                "http://localhost:50021/audio_query",
-                params={"text": text, "speaker": speaker_id}
-            )
+            with REGISTRY.timer("tts_query"):
+                q = requests.post(
+                    f"{self.voicevox_url}/audio_query",
+                    params={"text": text, "speaker": speaker_id}
+                )
             q.raise_for_status()
-            syn = requests.post(
-                "http://localhost:50021/synthesis",
-                params={"speaker": speaker_id},
-                json=q.json(),
-                headers={"Content-Type": "application/json"}
-            )
+            with REGISTRY.timer("tts_synth"):
+                syn = requests.post(
+                    f"{self.voicevox_url}/synthesis",
+                    params={"speaker": speaker_id},
+                    json=q.json(),
+                    headers={"Content-Type": "application/json"}
+                )
             syn.raise_for_status()
             return syn.content
         except Exception as e:
@@ -430,6 +525,9 @@ class ZundamonLayerAnimator(VoiceVoxStreamer):
             return None
 
     def play_audio_data(self, audio_data: bytes):
+        if self.audio_player is not None:
+            self.audio_player.play_audio_data(audio_data, self._stop_event)
+            return
         try:
             tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
             tmp.write(audio_data)
@@ -437,9 +535,10 @@ class ZundamonLayerAnimator(VoiceVoxStreamer):
             p = tmp.name
             time.sleep(0.05)
             pygame.mixer.music.load(p)
-            pygame.mixer.music.play()
-            while pygame.mixer.music.get_busy() and not self._stop_event.is_set():
-                time.sleep(0.05)
+            with REGISTRY.timer("playback"):
+                pygame.mixer.music.play()
+                while pygame.mixer.music.get_busy() and not self._stop_event.is_set():
+                    time.sleep(0.05)
             pygame.mixer.music.unload()
             time.sleep(0.02)
             os.unlink(p)
@@ -448,65 +547,55 @@ class ZundamonLayerAnimator(VoiceVoxStreamer):
 
     # ---------- ワーカー ----------
     def _start_workers(self):
-        # まばたき
-        def blink_worker():
-            while not self._stop_event.is_set():
-                if not self.is_talking:
-                    original = self.current_eyes
-                    self.current_eyes = "UU"
-                    time.sleep(0.12)  # まばたき時間
-                    self.current_eyes = original
-                    time.sleep(2.0 + random.random() * 3.0)
-                else:
-                    time.sleep(0.1)
-        threading.Thread(target=blink_worker, daemon=True).start()
-
+        # まばたきはレンダーループのタイムラインで駆動（専用スレッドなし）
         # 音声（口開閉は簡易。再生中 = ほあー / 終了 = むふ）
         def speech_worker():
             while not self._stop_event.is_set():
                 try:
-                    text = self.speech_queue.get(timeout=0.5)
+                    item = self.speech_queue.get(timeout=0.5)
                 except queue.Empty:
                     continue
+                text = item.text
                 if not text.strip():
                     self.speech_queue.task_done()
                     continue
                 print(f"音声生成: {text[:30]}...")
                 wav = self.generate_voice_data(text)
                 if wav:
-                    self.current_mouth = "ほあー"
+                    latency = time.monotonic() - item.enqueued_at
+                    self.speech_latency.record(latency)
+                    REGISTRY.observe("speech_latency", latency)
+                    if item.on_start:
+                        item.on_start()
+                    self.timeline.schedule_in("mouth", "ほあー")
                     self.is_talking = True
                     self.play_audio_data(wav)
                     self.is_talking = False
-                    self.current_mouth = "むふ"
+                    self.timeline.schedule_in("mouth", "むふ")
                 self.speech_queue.task_done()
         threading.Thread(target=speech_worker, daemon=True).start()
 
     # ---------- API ----------
-    def add_speech(self, text):
-        if text.strip():
-            self.speech_queue.put(text)
-            print(f"音声追加: {text[:30]}...")
+    def add_speech(self, text, priority="chat", on_start=None):
+        """priority: operator / superchat / chat、on_start は再生開始時に呼ばれる。統合・破棄されたら False"""
+        if not text.strip():
+            return False
+        accepted = self.speech_queue.put(text, priority, on_start=on_start)
+        if accepted:
+            print(f"音声追加[{priority}]: {text[:30]}...")
+        return accepted
 
     def change_expression(self, mouth=None, eyes=None):
         if mouth:
-            self.current_mouth = mouth
+            self.timeline.schedule_in("mouth", mouth)
             print(f"口変更: {mouth}")
         if eyes:
-            self.current_eyes = eyes
+            self.timeline.schedule_in("eyes", eyes)
             print(f"目変更: {eyes}")
 
     # ---------- 配信 ----------
-    def start_layer_stream(self, background_video: str):
-        if not os.path.exists(background_video):
-            print(f"背景動画が見つかりません: {background_video}")
-            return False
-
-        if not self.start_rtmp_server():
-            return False
-
-        time.sleep(1.0)
-
+    def start_render_loop(self):
+        """先行フレームを書いてからレンダースレッドとまばたきを開始（FFmpeg なしでも動く）"""
         # 先行フレーム（1秒分）
         # ※開始前に frames をクリアしておくと安全
         for f in os.listdir(self.out_dir):
@@ -522,49 +611,141 @@ class ZundamonLayerAnimator(VoiceVoxStreamer):
         self._stop_event.clear()
         self._render_thread = threading.Thread(target=self._render_loop, daemon=True)
         self._render_thread.start()
+        self.blink_animator.start()
+
+    def start_layer_stream(self, background_video: str = None, alpha_target: str = None, alpha_codec: str = "vp9"):
+        """alpha_target を渡すと背景を使わずキャラクターだけを透過で出力（OBS 側で合成する用）
+        alpha_codec: vp9（WebM）/ qtrle（QuickTime RLE）。position_map の bbox の和で切り出す"""
+        self.alpha_target, self.alpha_codec = alpha_target, alpha_codec
+        self.alpha_segment = 0
+        if alpha_target is None:
+            if not background_video or not os.path.exists(background_video):
+                print(f"背景動画が見つかりません: {background_video}")
+                return False
+            if not self.start_rtmp_server():
+                return False
+
+        self.start_render_loop()
+
+        print("レイヤーアニメーション配信開始")
+        first_packet = threading.Event()
+        process = self._launch_encoder(background_video, 0, first_packet)
+
+        # 起動確認：最初のパケットが mux されるまで待つ
+        with self.startup.phase("ffmpeg_first_packet") as result:
+            result["ok"] = wait_until(first_packet.is_set, 10.0, abort=lambda: process.poll() is not None)
+        if not result["ok"]:
+            print("FFmpegプロセス異常終了" if process.poll() is not None else "FFmpeg出力待ちタイムアウト")
+            self.stop_stream()
+            return False
+
+        summary = self.startup.summary()
+        phases = ", ".join(f"{p['phase']}={p['seconds'] * 1000:.0f}ms" for p in summary["phases"])
+        print(f"配信開始完了 ({summary['total_seconds'] * 1000:.0f}ms: {phases})")
+
+        # 落ちたら書き出し済みの連番から再開（先行フレームと同じく1秒分手前から読ませる）
+        # 連番が書かれていないだけ（レンダー側の停止）の間は再起動しない
+        self.supervisor = EncoderSupervisor(
+            lambda frame: self._launch_encoder(background_video, max(0, frame - self.fps)),
+            lambda: self._frame_no,
+            input_stalled=lambda: self.watchdog is not None and WRITER_STALLED in self.watchdog.active
+        )
+        self.supervisor.attach(process)
+        self.supervisor.progressed()
+        self.supervisor.start()
+
+        # 連番 PNG の書き手（レンダースレッド）と読み手（FFmpeg）。ファイル書き込みは FFmpeg を待たないので
+        # 両方止まったら書き手の停止（連番が途切れて FFmpeg も止まった）
+        self.watchdog = StreamWatchdog(lambda: self._frame_no, lambda: self.progress_frame, self.fps,
+                                       action=self._on_watchdog_alert, writer_blocked=lambda: False)
+        self.watchdog.start()
+        return True
+
+    def _on_watchdog_alert(self, kind: str):
+        """書き手が止まったらレンダースレッドを立て直す（読み手は EncoderSupervisor が再起動する）"""
+        if kind != WRITER_STALLED:
+            return
+        if self._render_thread and self._render_thread.is_alive():
+            print("レンダースレッドは生存中（ブロック中）のため再起動できません")
+            return
+        print("レンダースレッド再起動")
+        self._render_thread = threading.Thread(target=self._render_loop, daemon=True)
+        self._render_thread.start()
 
-        # FFmpeg起動（BG + image2シーケンス）
+    def _launch_encoder(self, background_video: str, start_number: int, first_packet=None):
+        """FFmpeg起動（BG + image2シーケンス）。start_number の連番から読み始める"""
         # PNGは (0,0) でBGに重ねるだけ。サイズ違いでも座標はいじらない。
         pattern = os.path.join(self.out_dir, "current_%06d.png")
-        cmd = [
-            "ffmpeg",
-            "-re",
-            "-stream_loop", "-1", "-i", background_video,
-            "-framerate", str(self.fps), "-start_number", "0", "-i", pattern,
-            "-filter_complex", "[0:v][1:v]overlay[outv]",
-            "-map", "[outv]", "-map", "0:a?",
-            "-c:v", "libx264", "-preset", "ultrafast",
-            "-c:a", "aac", "-f", "flv", self.rtmp_url
-        ]
-        print("レイヤーアニメーション配信開始")
-        self.stream_process = subprocess.Popen(
+        if self.alpha_target:
+            cmd = self._alpha_cmd(pattern, start_number)
+        else:
+            cmd = [
+                "ffmpeg",
+                "-re",
+                "-stream_loop", "-1", "-i", background_video,
+                "-framerate", str(self.fps), "-start_number", str(start_number), "-i", pattern,
+                "-filter_complex", "[0:v][1:v]overlay[outv]",
+                "-map", "[outv]", "-map", "0:a?",
+                "-c:v", "libx264", "-preset", "ultrafast",
+                "-c:a", "aac",
+                *(["-output_ts_offset", f"{start_number / self.fps:.3f}"] if start_number else []),
+                "-f", "flv", self.rtmp_url
+            ]
+        process = subprocess.Popen(
             cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             universal_newlines=True,
             bufsize=1
         )
+        self.stream_process = process
 
         def monitor_ffmpeg():
             try:
-                for line in self.stream_process.stdout:
+                for line in process.stdout:
+                    if record_progress(line):  # frame= / speed= はゲージへ
+                        if process is self.stream_process:
+                            self.progress_frame = int(parse_progress(line).get("frame", self.progress_frame))
+                        if first_packet is not None and is_first_packet(line):
+                            first_packet.set()
+                        if self.supervisor is not None:
+                            self.supervisor.progressed(process)
+                        continue
                     print(f"FFmpeg: {line.strip()}")
             except:
                 pass
         threading.Thread(target=monitor_ffmpeg, daemon=True).start()
-
-        # 起動確認
-        time.sleep(2.0)
-        if self.stream_process.poll() is not None:
-            print("FFmpegプロセス異常終了")
-            self.stop_stream()
-            return False
-
-        print("配信開始完了")
-        return True
+        return process
+
+    def _alpha_cmd(self, pattern: str, start_number: int):
+        """背景なし：連番PNGをキャラクター範囲に切り出してアルファ付きで出力"""
+        target = segment_target(self.alpha_target, self.alpha_segment)
+        self.alpha_segment += 1
+        if target != self.alpha_target:
+            print(f"透過出力の続きを別ファイルへ: {target}")
+        crop = layer_union_bbox(self.position_map or {})
+        crop_filter = []
+        if crop:
+            left, top, right, bottom = crop
+            crop_filter = ["-vf", f"crop={right - left}:{bottom - top}:{left}:{top}"]
+        return [
+            "ffmpeg", "-y", "-re",
+            "-framerate", str(self.fps), "-start_number", str(start_number), "-i", pattern,
+            *crop_filter,
+            *alpha_output(self.alpha_codec, target)
+        ]
 
     def stop_stream(self):
         self._stop_event.set()
+        if self.watchdog:
+            self.watchdog.stop()
+            print(f"ウォッチドッグ: {self.watchdog.summary()}")
+            self.watchdog = None
+        if self.supervisor:
+            self.supervisor.stop()
+            print(f"エンコーダ監視: {self.supervisor.summary()}")
+            self.supervisor = None
+        self.blink_animator.stop()
         if self._render_thread:
             self._render_thread.join(timeout=2.0)
             self._render_thread = None
@@ -575,6 +756,9 @@ class ZundamonLayerAnimator(VoiceVoxStreamer):
                 pass
             self.stream_process = None
         self.stop_rtmp_server()
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
         print("配信停止")
 
 